@@ -0,0 +1,101 @@
+"""
+Benchmark da compressão do EPUB: tempo de gravação x tamanho por nível
+
+Formata as páginas uma vez, guarda os documentos XHTML em memória e grava o
+mesmo EPUB com cada combinação de nível de compressão e número de threads.
+Só a etapa de gravação (deflate + ZIP) é medida.
+
+    python -m benchmarks.compression --input paginas.jsonl --group-chapters
+    python -m benchmarks.compression --pages 10000     # páginas sintéticas
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.synthetic import iter_synthetic_pages
+from fucts import xhtml
+from fucts.epubwriter import StreamingEpubWriter, compression_level
+from vitalepub import EPUB_STYLE, MinhaBliotecaEpubExtractor, iter_pages
+
+DEFAULT_LEVELS = ['0', '1', '3', '6', '9']
+
+
+def render_documents(pages, group_chapters=False):
+    """Documentos do EPUB já serializados: [(arquivo, xhtml, toc_label, nav_id, filhos)]"""
+    extractor = MinhaBliotecaEpubExtractor()
+    rendered = extractor.render_pages(pages)
+    return [
+        (document.file_name,
+         xhtml.page_document(document.title, [m.body for m in document.members],
+                             stylesheet='style/nav.css').encode('utf-8'),
+         document.toc_label, document.nav_id, document.toc_children)
+        for document in extractor.iter_documents(rendered, group_chapters)
+    ]
+
+
+def write_epub(documents, path, level, threads):
+    """Grava os documentos num EPUB e devolve o tempo de parede em segundos"""
+    start = time.perf_counter()
+    with StreamingEpubWriter(path, 'isbn-benchmark', 'Benchmark', compresslevel=level, threads=threads) as writer:
+        writer.add_item("nav_css", "style/nav.css", "text/css", EPUB_STYLE)
+        for file_name, content, toc_label, nav_id, children in documents:
+            writer.add_document(file_name, content, toc_label, nav_id, children)
+    return time.perf_counter() - start
+
+
+def run(documents, levels, threads_options, repeat=3):
+    results = []
+    raw_size = sum(len(content) for _, content, *_ in documents)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'benchmark.epub'
+        for level in levels:
+            for threads in threads_options:
+                best = min(write_epub(documents, path, compression_level(level), threads) for _ in range(repeat))
+                size = path.stat().st_size
+                results.append({
+                    'level': level,
+                    'threads': threads,
+                    'write_s': round(best, 4),
+                    'size_bytes': size,
+                    'ratio': round(size / raw_size, 4) if raw_size else None,
+                })
+    return {'documents': len(documents), 'xhtml_bytes': raw_size, 'results': results}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tempo de gravação x tamanho do EPUB por nível de compressão")
+    parser.add_argument("--input", help="Arquivo JSON/JSONL com as páginas (padrão: páginas sintéticas)")
+    parser.add_argument("--pages", type=int, default=2000, help="Páginas sintéticas sem --input")
+    parser.add_argument("--group-chapters", action="store_true", help="Um documento por capítulo")
+    parser.add_argument("--levels", default=','.join(DEFAULT_LEVELS),
+                        help="Níveis separados por vírgula (0-9, fast, max...; padrão: %(default)s)")
+    parser.add_argument("--threads", default=f'1,{os.cpu_count() or 1}',
+                        help="Números de threads a comparar (padrão: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=3, help="Repetições por combinação (vale a melhor)")
+    parser.add_argument("--json", metavar="ARQUIVO", help="Grava os resultados em JSON")
+    args = parser.parse_args(argv)
+
+    pages = iter_pages(args.input) if args.input else iter_synthetic_pages(args.pages)
+    documents = render_documents(pages, args.group_chapters)
+    threads_options = sorted({int(t) for t in args.threads.split(',')})
+    report = run(documents, args.levels.split(','), threads_options, args.repeat)
+
+    print(f"{report['documents']} documentos, {report['xhtml_bytes'] / 1024 / 1024:.2f} MB de XHTML")
+    print(f"{'nível':>7} {'threads':>7} {'gravação (s)':>13} {'tamanho (MB)':>13} {'razão':>7}")
+    for row in report['results']:
+        print(f"{row['level']:>7} {row['threads']:>7} {row['write_s']:>13.3f} "
+              f"{row['size_bytes'] / 1024 / 1024:>13.2f} {row['ratio']:>7.3f}")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
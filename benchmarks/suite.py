@@ -0,0 +1,476 @@
+"""
+Benchmarks do pipeline de build com páginas sintéticas
+
+Mede clean_text_for_html, format_text_content, os parágrafos de páginas com
+glifos pelo motor de layout com NumPy (layout_glyphs, ~600 glifos em duas
+colunas por página) e pela quebra por '\\r' usada sem NumPy (layout_fallback),
+create_epub_from_data (de ponta a ponta, gravando o EPUB), o mesmo build com
+cabeçalhos/rodapés correntes mantidos e removidos (o tamanho da saída mostra o
+ganho de --strip-running-lines), o build com um XHTML por página e com
+--group-chapters (build_per_page e build_grouped) e a abertura desses dois
+EPUBs por um leitor, com o container, o OPF e todos os documentos do spine
+analisados (reader_open_pages e reader_open_chapters; a saída é o tamanho do
+EPUB), a reconstrução com --previous de um build anterior sem mudanças e com
+uma palavra-chave de título a mais (incremental_unchanged e
+incremental_headings, a comparar com incremental_full, o mesmo build sem
+--previous), as saídas txt, md e jsonl sem EPUB, a memória das páginas
+guardadas como lista de dicts (page_list) e em PageStore, a leitura de 100
+páginas do meio de um JSONL pelo índice (page_file_range) e lendo o arquivo
+até elas (page_file_scan), e os ordenadores de fucts/roman.py em vários
+tamanhos de livro. Para cada caso o relatório traz o tempo (melhor de N
+execuções), o pico de memória medido com tracemalloc (numa execução separada,
+porque o tracemalloc deixa o código bem mais lento) e o tamanho da saída.
+
+    python -m benchmarks.suite --sizes 100,1000,10000 --json atual.json
+    python -m benchmarks.suite --json novo.json --compare atual.json --fail-on-regression
+
+Com --compare os casos são casados por (benchmark, páginas) e o tempo ou a
+memória que piorar mais que --threshold é marcado como regressão.
+"""
+
+import argparse
+import itertools
+import json
+import platform
+import posixpath
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+from xml.etree import ElementTree
+from zipfile import ZipFile
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.synthetic import iter_synthetic_glyph_pages, iter_synthetic_pages, synthetic_labels, synthetic_pages
+from fucts import layout, roman
+from fucts.headings import DEFAULT_HEADING_RULES
+from fucts.incremental import manifest_path_for
+from fucts.pagefile import PageFile
+from fucts.pagestore import PageStore
+from fucts.runningheads import detect_running_lines
+from vitalepub import MinhaBliotecaEpubExtractor, iter_pages, save_pages
+
+REPORT_VERSION = 1
+DEFAULT_SIZES = (100, 1000, 10000, 50000)
+DEFAULT_THRESHOLD = 0.10
+
+# Páginas lidas do meio do arquivo em page_file_range e page_file_scan
+PAGE_RANGE = 100
+
+# Regras de título de incremental_headings: as padrão com uma palavra-chave a mais
+EDITED_HEADING_RULES = {**DEFAULT_HEADING_RULES, 'keywords': [*DEFAULT_HEADING_RULES['keywords'], 'Exemplo']}
+
+CONTAINER_NS = 'urn:oasis:names:tc:opendocument:xmlns:container'
+OPF_NS = 'http://www.idpf.org/2007/opf'
+
+# Pasta dos arquivos gravados na preparação (JSONL dos benchmarks de PageFile,
+# builds anteriores dos incrementais), apagada na saída
+_work_dir = None
+
+
+def _clear_caches():
+    """Esvazia os caches de rótulos para que toda execução comece fria"""
+    for function in (roman.roman_to_int, roman.parse_page_label, roman.label_value, roman.page_label_key):
+        function.cache_clear()
+
+
+def bench_clean_text(pages, options):
+    extractor = MinhaBliotecaEpubExtractor()
+    return sum(len(extractor.clean_text_for_html(page['words'])) for page in pages)
+
+
+def bench_format_text(pages, options):
+    extractor = MinhaBliotecaEpubExtractor()
+    return sum(len(extractor.format_text_content(page['words'], page_number))
+               for page_number, page in enumerate(pages, start=1))
+
+
+def _glyph_pages(size, options):
+    return list(iter_synthetic_glyph_pages(size, seed=options['pages'].get('seed', 0)))
+
+
+def bench_layout_glyphs(pages, options):
+    """Parágrafos e títulos pelas posições dos glifos (fucts/layout.py)"""
+    extractor = MinhaBliotecaEpubExtractor()
+    return sum(len(text) for page_number, page in enumerate(pages, start=1)
+               for _, text in extractor.parse_paragraphs(page['words'], page_number, page[layout.GLYPHS_KEY]))
+
+
+def bench_layout_fallback(pages, options):
+    """Referência para layout_glyphs: as mesmas páginas pela quebra por '\\r' (sem NumPy)"""
+    extractor = MinhaBliotecaEpubExtractor()
+    return sum(len(text) for page_number, page in enumerate(pages, start=1)
+               for _, text in extractor.parse_paragraphs(page['words'], page_number))
+
+
+def bench_build(size, options, running_heads=False, strip_running_lines=False, group_chapters=None):
+    extractor = MinhaBliotecaEpubExtractor()
+    if group_chapters is None:
+        group_chapters = options['group_chapters']
+    page_options = {**options['pages'], 'running_heads': running_heads}
+    running_lines = None
+    if strip_running_lines:
+        running_lines = detect_running_lines(iter_synthetic_pages(size, **page_options),
+                                             headings=extractor.heading_classifier)
+    with tempfile.TemporaryDirectory() as tmp:
+        output = Path(tmp) / 'benchmark.epub'
+        pages = iter_synthetic_pages(size, **page_options)
+        if not extractor.create_epub_from_data('benchmark', output, 'Benchmark', pages=pages,
+                                               jobs=options['jobs'], group_chapters=group_chapters,
+                                               running_lines=running_lines):
+            raise RuntimeError("create_epub_from_data falhou")
+        return output.stat().st_size
+
+
+def bench_export(size, options, output_format):
+    """create_epub_from_data com um writer de fucts/writers.py no lugar do EPUB"""
+    extractor = MinhaBliotecaEpubExtractor()
+    with tempfile.TemporaryDirectory() as tmp:
+        output = Path(tmp) / f'benchmark.{output_format}'
+        pages = iter_synthetic_pages(size, **options['pages'])
+        if not extractor.create_epub_from_data('benchmark', output, 'Benchmark', pages=pages,
+                                               output_format=output_format):
+            raise RuntimeError("exportação falhou")
+        return output.stat().st_size
+
+
+def bench_build_running_heads(size, options):
+    """Build de páginas com cabeçalho e rodapé correntes, sem removê-los"""
+    return bench_build(size, options, running_heads=True)
+
+
+def bench_build_strip_running_lines(size, options):
+    """O mesmo build com a detecção (passada extra) e a remoção"""
+    return bench_build(size, options, running_heads=True, strip_running_lines=True)
+
+
+def bench_build_per_page(size, options):
+    """Build com um XHTML por página, qualquer que seja --group-chapters"""
+    return bench_build(size, options, group_chapters=False)
+
+
+def bench_build_grouped(size, options):
+    """O mesmo build com --group-chapters (um XHTML por capítulo)"""
+    return bench_build(size, options, group_chapters=True)
+
+
+def _built_epub(size, options, group_chapters):
+    path = _work_path(f"{'chapters' if group_chapters else 'pages'}-{size}.epub")
+    extractor = MinhaBliotecaEpubExtractor()
+    if not extractor.create_epub_from_data('benchmark', path, 'Benchmark',
+                                           pages=iter_synthetic_pages(size, **options['pages']),
+                                           group_chapters=group_chapters):
+        raise RuntimeError("create_epub_from_data falhou")
+    return path
+
+
+def bench_reader_open(path, options):
+    """O que um leitor faz ao abrir o livro: o zip, o container, o OPF e todos os documentos do spine
+
+    Devolve o tamanho do EPUB.
+    """
+    with ZipFile(path) as epub:
+        container = ElementTree.fromstring(epub.read('META-INF/container.xml'))
+        opf_path = container.find(f'.//{{{CONTAINER_NS}}}rootfile').get('full-path')
+        package = ElementTree.fromstring(epub.read(opf_path))
+        base = posixpath.dirname(opf_path)
+        hrefs = {item.get('id'): item.get('href') for item in package.iter(f'{{{OPF_NS}}}item')}
+        for itemref in package.iter(f'{{{OPF_NS}}}itemref'):
+            ElementTree.fromstring(epub.read(posixpath.join(base, hrefs[itemref.get('idref')])))
+    return path.stat().st_size
+
+
+def bench_page_list(size, options):
+    """Referência para page_store: as páginas guardadas como lista de dicts"""
+    pages = list(iter_synthetic_pages(size, **options['pages']))
+    del pages
+
+
+def bench_page_store(size, options):
+    store = PageStore.from_pages(iter_synthetic_pages(size, **options['pages']))
+    store.close()
+
+
+def bench_page_store_spilled(size, options):
+    """PageStore com todos os words no arquivo mapeado"""
+    store = PageStore.from_pages(iter_synthetic_pages(size, **options['pages']), spill_threshold=0)
+    store.close()
+
+
+def _work_path(name):
+    global _work_dir
+    if _work_dir is None:
+        _work_dir = tempfile.TemporaryDirectory()
+    return Path(_work_dir.name) / name
+
+
+def _saved_pages(size, options):
+    """Grava as páginas sintéticas em JSONL com o índice (save_pages)"""
+    path = _work_path(f'pages-{size}.jsonl')
+    save_pages(iter_synthetic_pages(size, **options['pages']), path)
+    return path
+
+
+def _previous_build(size, options):
+    """(JSONL das páginas, build completo delas com manifesto), o --previous dos benchmarks incrementais
+
+    As páginas são lidas do JSONL, como no build --input, para que a geração
+    das páginas sintéticas não entre no tempo medido.
+    """
+    pages_path = _saved_pages(size, options)
+    path = _work_path(f'previous-{size}.epub')
+    extractor = MinhaBliotecaEpubExtractor()
+    if not extractor.create_epub_from_data('benchmark', path, 'Benchmark', pages=iter_pages(pages_path),
+                                           group_chapters=options['group_chapters'],
+                                           manifest_path=manifest_path_for(path)):
+        raise RuntimeError("create_epub_from_data falhou")
+    return pages_path, path
+
+
+def bench_incremental(data, options, heading_rules=None, incremental=True):
+    """Build do JSONL com --previous: só o que mudou é formatado e comprimido"""
+    pages_path, previous = data
+    extractor = MinhaBliotecaEpubExtractor(heading_rules=heading_rules)
+    with tempfile.TemporaryDirectory() as tmp:
+        output = Path(tmp) / 'benchmark.epub'
+        if not extractor.create_epub_from_data('benchmark', output, 'Benchmark', pages=iter_pages(pages_path),
+                                               jobs=options['jobs'], group_chapters=options['group_chapters'],
+                                               previous=previous if incremental else None):
+            raise RuntimeError("build incremental falhou")
+        return output.stat().st_size
+
+
+def bench_incremental_headings(data, options):
+    """Reconstrução depois de uma palavra-chave nova nas regras de título: só a classificação roda de novo"""
+    return bench_incremental(data, options, EDITED_HEADING_RULES)
+
+
+def bench_incremental_full(data, options):
+    """Referência para incremental_headings: o mesmo build sem --previous"""
+    return bench_incremental(data, options, EDITED_HEADING_RULES, incremental=False)
+
+
+def _middle_range(size):
+    start = max(1, size // 2 - PAGE_RANGE // 2)
+    return start, min(size, start + PAGE_RANGE - 1)
+
+
+def bench_page_file_range(path, options):
+    """Abre o JSONL indexado e decodifica só as páginas do meio"""
+    with PageFile(path) as page_file:
+        start, end = _middle_range(len(page_file))
+        return sum(len(page['words']) for page in page_file.pages(start, end))
+
+
+def bench_page_file_scan(path, options):
+    """Referência para page_file_range: as mesmas páginas lidas com iter_pages"""
+    size = int(path.stem.rpartition('-')[2])
+    start, end = _middle_range(size)
+    return sum(len(page['words']) for page in itertools.islice(iter_pages(path), start - 1, end))
+
+
+def bench_sort_labels(labels, options):
+    roman.sort_labels(labels)
+
+
+def bench_roman_sort_with_ints(labels, options):
+    roman.roman_sort_with_ints(labels)
+
+
+# nome -> (preparação dos dados a partir de (tamanho, opções), função medida)
+BENCHMARKS = {
+    'clean_text_for_html': (lambda size, options: synthetic_pages(size, **options['pages']), bench_clean_text),
+    'format_text_content': (lambda size, options: synthetic_pages(size, **options['pages']), bench_format_text),
+    'create_epub_from_data': (lambda size, options: size, bench_build),
+    'build_running_heads': (lambda size, options: size, bench_build_running_heads),
+    'build_strip_running_lines': (lambda size, options: size, bench_build_strip_running_lines),
+    'build_per_page': (lambda size, options: size, bench_build_per_page),
+    'build_grouped': (lambda size, options: size, bench_build_grouped),
+    'reader_open_pages': (lambda size, options: _built_epub(size, options, False), bench_reader_open),
+    'reader_open_chapters': (lambda size, options: _built_epub(size, options, True), bench_reader_open),
+    'incremental_full': (_previous_build, bench_incremental_full),
+    'incremental_unchanged': (_previous_build, bench_incremental),
+    'incremental_headings': (_previous_build, bench_incremental_headings),
+    'export_txt': (lambda size, options: size, lambda size, options: bench_export(size, options, 'txt')),
+    'export_md': (lambda size, options: size, lambda size, options: bench_export(size, options, 'md')),
+    'export_jsonl': (lambda size, options: size, lambda size, options: bench_export(size, options, 'jsonl')),
+    'page_list': (lambda size, options: size, bench_page_list),
+    'page_store': (lambda size, options: size, bench_page_store),
+    'page_store_spilled': (lambda size, options: size, bench_page_store_spilled),
+    'page_file_range': (_saved_pages, bench_page_file_range),
+    'page_file_scan': (_saved_pages, bench_page_file_scan),
+    'sort_labels': (lambda size, options: synthetic_labels(size), bench_sort_labels),
+    'roman_sort_with_ints': (lambda size, options: synthetic_labels(size), bench_roman_sort_with_ints),
+}
+
+# O motor de layout só roda com NumPy instalado
+if layout.available():
+    BENCHMARKS['layout_glyphs'] = (_glyph_pages, bench_layout_glyphs)
+    BENCHMARKS['layout_fallback'] = (_glyph_pages, bench_layout_fallback)
+
+
+def default_repeat(size):
+    return 5 if size < 1000 else 3 if size < 10000 else 1
+
+
+def measure(name, size, options, repeat=None, memory=True):
+    """Roda um benchmark e devolve o registro do relatório"""
+    setup, function = BENCHMARKS[name]
+    data = setup(size, options)
+    repeat = repeat or default_repeat(size)
+
+    times = []
+    output = None
+    for _ in range(repeat):
+        _clear_caches()
+        start = time.perf_counter()
+        output = function(data, options)
+        times.append(time.perf_counter() - start)
+
+    peak = None
+    if memory:
+        _clear_caches()
+        tracemalloc.start()
+        try:
+            tracemalloc.reset_peak()
+            function(data, options)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    best = min(times)
+    return {
+        'benchmark': name,
+        'pages': size,
+        'repeat': repeat,
+        'time_s': round(best, 6),
+        'time_per_page_us': round(best / size * 1e6, 3),
+        'peak_memory_bytes': peak,
+        'output_bytes': output,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=Path(__file__).resolve().parent, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(sizes=DEFAULT_SIZES, names=None, options=None, repeat=None, memory=True, progress=None):
+    options = options or default_options()
+    results = []
+    for name in names or BENCHMARKS:
+        for size in sizes:
+            result = measure(name, size, options, repeat, memory)
+            results.append(result)
+            if progress:
+                progress(result)
+    return {
+        'version': REPORT_VERSION,
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'commit': _git_commit(),
+        'options': options,
+        'results': results,
+    }
+
+
+def default_options(**pages):
+    return {'pages': pages, 'jobs': 1, 'group_chapters': False}
+
+
+def compare(report, baseline, threshold=DEFAULT_THRESHOLD):
+    """Casa os resultados com os do baseline: [(novo, antigo, razão de tempo, razão de memória, regressão)]"""
+    previous = {(r['benchmark'], r['pages']): r for r in baseline.get('results', [])}
+    rows = []
+    for result in report['results']:
+        old = previous.get((result['benchmark'], result['pages']))
+        if old is None:
+            continue
+        time_ratio = result['time_s'] / old['time_s'] if old['time_s'] else None
+        memory_ratio = None
+        if result['peak_memory_bytes'] and old.get('peak_memory_bytes'):
+            memory_ratio = result['peak_memory_bytes'] / old['peak_memory_bytes']
+        regression = any(ratio is not None and ratio > 1 + threshold for ratio in (time_ratio, memory_ratio))
+        rows.append((result, old, time_ratio, memory_ratio, regression))
+    return rows
+
+
+def _format_bytes(value):
+    if value is None:
+        return '-'
+    return f'{value / 1024 / 1024:.2f} MB' if value >= 1024 * 1024 else f'{value / 1024:.1f} KB'
+
+
+def _format_ratio(value):
+    return '-' if value is None else f'{value:.2f}x'
+
+
+def print_result(result):
+    print(f"{result['benchmark']:<24} {result['pages']:>7} {result['time_s']:>10.4f} s "
+          f"{result['time_per_page_us']:>10.1f} µs/pág {_format_bytes(result['peak_memory_bytes']):>10} "
+          f"{_format_bytes(result['output_bytes']):>10}", flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks do build do EPUB com páginas sintéticas")
+    parser.add_argument("--sizes", default=','.join(map(str, DEFAULT_SIZES)),
+                        help="Números de páginas separados por vírgula (padrão: %(default)s)")
+    parser.add_argument("--only", help="Benchmarks a rodar, separados por vírgula: " + ', '.join(BENCHMARKS))
+    parser.add_argument("--repeat", type=int, help="Execuções por caso (padrão: 5, 3 ou 1 conforme o tamanho)")
+    parser.add_argument("--no-memory", action="store_true", help="Não mede o pico de memória (tracemalloc)")
+    parser.add_argument("--paragraphs", type=int, default=6, help="Parágrafos por página")
+    parser.add_argument("--heading-ratio", type=float, default=0.1, help="Fração de parágrafos que são títulos")
+    parser.add_argument("--unicode-mix", type=float, default=0.02,
+                        help="Fração de palavras com caracteres fora do ASCII")
+    parser.add_argument("--seed", type=int, default=0, help="Semente do gerador de páginas")
+    parser.add_argument("--jobs", type=int, default=1, help="--jobs do build de ponta a ponta")
+    parser.add_argument("--group-chapters", action="store_true", help="--group-chapters no build de ponta a ponta")
+    parser.add_argument("--json", metavar="ARQUIVO", help="Grava o relatório em JSON")
+    parser.add_argument("--compare", metavar="ARQUIVO", help="Relatório JSON anterior para comparar")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Piora relativa que conta como regressão (padrão: %(default)s)")
+    parser.add_argument("--fail-on-regression", action="store_true",
+                        help="Sai com código 1 se houver regressão em relação a --compare")
+    args = parser.parse_args(argv)
+
+    names = args.only.split(',') if args.only else list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"benchmark desconhecido: {', '.join(unknown)}")
+    sizes = [int(size) for size in args.sizes.split(',')]
+
+    options = default_options(paragraphs_per_page=args.paragraphs, heading_ratio=args.heading_ratio,
+                              unicode_mix=args.unicode_mix, seed=args.seed)
+    options.update(jobs=args.jobs, group_chapters=args.group_chapters)
+
+    print(f"{'benchmark':<24} {'páginas':>7} {'tempo':>12} {'por página':>17} {'memória':>10} {'saída':>10}")
+    report = run_suite(sizes, names, options, args.repeat, not args.no_memory, progress=print_result)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Relatório salvo em {args.json}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            rows = compare(report, json.load(f), args.threshold)
+        print(f"\nComparação com {args.compare} (regressão: piora > {args.threshold:.0%})")
+        print(f"{'benchmark':<24} {'páginas':>7} {'tempo':>8} {'memória':>8}")
+        for result, _, time_ratio, memory_ratio, regression in rows:
+            flag = '  ⚠️ REGRESSÃO' if regression else ''
+            print(f"{result['benchmark']:<24} {result['pages']:>7} {_format_ratio(time_ratio):>8} "
+                  f"{_format_ratio(memory_ratio):>8}{flag}")
+        if args.fail_on_regression and any(row[-1] for row in rows):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+"""
+Gerador de páginas sintéticas no formato do innerPageData
+
+Cada página é um dict {"words", "chapterTitle", "page"} como os que
+extract_vst_data_from_page devolve: parágrafos separados por '\\r', alguns
+títulos (linhas em maiúsculas ou com "Capítulo") e, opcionalmente, uma mistura
+de caracteres fora do ASCII (acentos, ligaduras, hífen suave, emoji, CJK,
+\\x00 e \\ufffd que o clean_text remove) e cabeçalhos/rodapés correntes. O
+gerador é determinístico para uma mesma semente, então as mesmas páginas podem
+ser comparadas entre execuções.
+
+iter_synthetic_glyph_pages gera páginas com glifos (campo GLYPHS_KEY, arrays
+paralelos) diagramadas em colunas: um título com glifos mais altos e
+parágrafos com recuo na primeira linha e espaço entre eles. O words das mesmas
+páginas tem os parágrafos separados por '\\r', para comparar o motor de
+layout (fucts/layout.py) com a quebra por '\\r'.
+"""
+
+import random
+from itertools import islice
+
+from fucts.layout import GLYPHS_KEY
+from fucts.roman import int_to_roman
+
+WORDS = (
+    'a o de que e do da em um para com não uma os no se na por mais as dos como mas ao ele '
+    'das seu sua ou quando muito nos já eu também só pelo pela até isso entre depois sem mesmo '
+    'aos seus quem nas me esse eles você essa num nem suas meu às minha numa pelos elas qual '
+    'livro página capítulo exercício função número resultado equação problema exemplo método '
+    'sistema valor tempo forma parte caso ponto análise processo estudo teoria prática'
+).split()
+
+# Caracteres misturados ao texto conforme unicode_mix
+UNICODE_EXTRAS = (
+    'ação', 'coração', 'pão', '\ufb01m', '\ufb02or', 'e\ufb00eito',   # ligaduras fi, fl, ff
+    'com\u00adputador', 'não\u00a0quebra', 'espaço\u2009fino',      # hífen suave, nbsp, espaço fino
+    '«citação»', '“aspas”', '—', '…', '€', '½', 'α', 'β', 'π', '∑', '√',
+    '中文', '日本語', '\U0001f600', '\U0001f4da', '\ufffd', 'nul\x00o',
+)
+
+HEADING_KEYWORDS = ('Capítulo', 'PROBLEMAS', 'Dicas de', 'Básica')
+
+
+def _sentence(rng, unicode_mix, min_words=6, max_words=18):
+    words = []
+    for _ in range(rng.randint(min_words, max_words)):
+        if unicode_mix and rng.random() < unicode_mix:
+            words.append(rng.choice(UNICODE_EXTRAS))
+        else:
+            words.append(rng.choice(WORDS))
+    words[0] = words[0].capitalize()
+    return ' '.join(words) + rng.choice('..!?;')
+
+
+def _paragraph(rng, unicode_mix):
+    return ' '.join(_sentence(rng, unicode_mix) for _ in range(rng.randint(2, 6)))
+
+
+def _heading(rng, chapter_number):
+    if rng.random() < 0.5:
+        return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 5))).upper()
+    return f'{rng.choice(HEADING_KEYWORDS)} {chapter_number}: {rng.choice(WORDS)} {rng.choice(WORDS)}'
+
+
+def page_label(page_number, front_matter):
+    """Rótulo impresso: romanos minúsculos na parte pré-textual, depois arábicos"""
+    if page_number <= front_matter:
+        return int_to_roman(page_number, lowercase=True)
+    return str(page_number - front_matter)
+
+
+def iter_synthetic_pages(pages=1000, paragraphs_per_page=6, heading_ratio=0.1, unicode_mix=0.02,
+                         pages_per_chapter=20, front_matter=12, failure_ratio=0.0, running_heads=False, seed=0):
+    """Gera `pages` registros de página sob demanda (memória constante)
+
+    heading_ratio: fração dos parágrafos que são títulos;
+    unicode_mix: fração das palavras trocadas por UNICODE_EXTRAS;
+    failure_ratio: fração de páginas None (falha de extração);
+    running_heads: cada página começa com o título do livro (páginas pares) ou
+    do capítulo (ímpares) e termina com o número da página.
+    """
+    rng = random.Random(seed)
+    for page_number in range(1, pages + 1):
+        if failure_ratio and rng.random() < failure_ratio:
+            yield None
+            continue
+        chapter_number = (page_number - 1) // pages_per_chapter + 1
+        paragraphs = []
+        for _ in range(paragraphs_per_page):
+            if rng.random() < heading_ratio:
+                paragraphs.append(_heading(rng, chapter_number))
+            else:
+                paragraphs.append(_paragraph(rng, unicode_mix))
+        label = page_label(page_number, front_matter)
+        if running_heads:
+            head = 'LIVRO SINTÉTICO DE BENCHMARK' if page_number % 2 == 0 else f'Capítulo {chapter_number}'
+            paragraphs = [head, *paragraphs, label]
+        yield {
+            'words': '\r'.join(paragraphs),
+            'chapterTitle': f'Capítulo {chapter_number}',
+            'page': label,
+        }
+
+
+# Medidas dos glifos sintéticos (pixels, y cresce para baixo)
+GLYPH_WIDTH = 5
+GLYPH_HEIGHT = 10
+HEADING_GLYPH_HEIGHT = 16
+LINE_STEP = 12            # de uma linha de texto à seguinte
+PARAGRAPH_SPACING = 10    # espaço extra entre parágrafos
+COLUMN_SPACING = 40       # faixa vazia entre colunas
+
+
+def _wrap(text, width):
+    """Quebra o texto em linhas de até `width` caracteres"""
+    lines, line = [], ''
+    for word in text.split():
+        if line and len(line) + 1 + len(word) > width:
+            lines.append(line)
+            line = word
+        else:
+            line = f'{line} {word}' if line else word
+    if line:
+        lines.append(line)
+    return lines
+
+
+def _glyph_page(blocks, columns, line_chars, column_lines):
+    """Glifos em arrays paralelos para os blocos (altura, texto, recuo) diagramados em colunas"""
+    x, y, w, h, chars = [], [], [], [], []
+    column_width = line_chars * GLYPH_WIDTH + COLUMN_SPACING
+    column, line_number, top = 0, 0, 0
+    for height, text, indent in blocks:
+        for i, line in enumerate(_wrap(text, line_chars - indent)):
+            if line_number >= column_lines and column < columns - 1:
+                column, line_number, top = column + 1, 0, 0
+            left = column * column_width + (indent * GLYPH_WIDTH if i == 0 else 0)
+            for offset, char in enumerate(line):
+                if char != ' ':
+                    x.append(left + offset * height // 2)
+                    y.append(top)
+                    w.append(height // 2)
+                    h.append(height)
+                    chars.append(char)
+            top += height + LINE_STEP - GLYPH_HEIGHT
+            line_number += 1
+        top += PARAGRAPH_SPACING
+    return {'x': x, 'y': y, 'w': w, 'h': h, 'text': ''.join(chars)}
+
+
+def iter_synthetic_glyph_pages(pages=1000, paragraphs_per_page=6, sentences_per_paragraph=2, columns=2,
+                               line_chars=40, column_lines=12, pages_per_chapter=20, seed=0):
+    """Gera páginas com glifos (cerca de 600 por página com os valores padrão)
+
+    Cada página começa com um título e tem paragraphs_per_page parágrafos
+    diagramados em `columns` colunas de column_lines linhas de line_chars
+    caracteres.
+    """
+    rng = random.Random(seed)
+    for page_number in range(1, pages + 1):
+        chapter_number = (page_number - 1) // pages_per_chapter + 1
+        heading = _heading(rng, chapter_number)
+        paragraphs = [' '.join(_sentence(rng, 0) for _ in range(sentences_per_paragraph))
+                      for _ in range(paragraphs_per_page)]
+        blocks = [(HEADING_GLYPH_HEIGHT, heading, 0), *((GLYPH_HEIGHT, para, 4) for para in paragraphs)]
+        yield {
+            'words': '\r'.join([heading, *paragraphs]),
+            'chapterTitle': f'Capítulo {chapter_number}',
+            'page': str(page_number),
+            GLYPHS_KEY: _glyph_page(blocks, columns, line_chars, column_lines),
+        }
+
+
+def synthetic_pages(pages=1000, **options):
+    """Lista com as páginas de iter_synthetic_pages"""
+    return list(iter_synthetic_pages(pages, **options))
+
+
+def synthetic_labels(count, front_matter_ratio=0.05, duplicates_ratio=0.1, seed=0):
+    """Rótulos de página embaralhados (romanos, arábicos e repetidos) para os ordenadores"""
+    rng = random.Random(seed)
+    front_matter = max(1, min(4999, int(count * front_matter_ratio)))
+    labels = [page_label(n, front_matter) for n in range(1, count + 1)]
+    labels.extend(rng.choice(labels) for _ in range(int(count * duplicates_ratio)))
+    rng.shuffle(labels)
+    return list(islice(labels, count))
@@ -0,0 +1,337 @@
+"""
+Escritor de EPUB em streaming
+
+Cada documento é gravado no ZIP assim que fica pronto; só metadados pequenos
+(id, arquivo, título do sumário) ficam em memória até o fechamento, quando o
+manifesto OPF, o spine, o toc.ncx e o nav.xhtml são gerados.
+O layout segue o que o ebooklib grava (pasta EPUB/, ids chapter_N, nav no spine).
+O ZIP é gravado em SAÍDA.tmp e só vai para o caminho final em close(); se o
+build falha no meio, o arquivo temporário é apagado e a saída anterior fica.
+
+A compressão é feita aqui mesmo (deflate cru, como o zipfile faz), com nível
+configurável e, opcionalmente, em threads: o zlib solta o GIL enquanto
+comprime, então vários documentos são comprimidos ao mesmo tempo enquanto
+as entradas continuam sendo gravadas no ZIP na ordem de chegada.
+"""
+
+import html
+import os
+import re
+import time
+import zlib
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timezone
+from zipfile import ZipFile, ZipInfo, ZIP_DEFLATED, ZIP_STORED
+
+from fucts.pageindex import PAGE_INDEX_HREF, order_page_targets, page_index_document
+
+CONTAINER_XML = '''<?xml version="1.0" encoding="utf-8"?>
+<container xmlns="urn:oasis:names:tc:opendocument:xmlns:container" version="1.0">
+  <rootfiles>
+    <rootfile media-type="application/oebps-package+xml" full-path="EPUB/content.opf"/>
+  </rootfiles>
+</container>
+'''
+
+XHTML_MEDIA_TYPE = "application/xhtml+xml"
+
+_CONTROL_CHARS = re.compile(r'[\x00-\x1f\x7f]+')
+
+
+# Partes internas do ZipFile usadas para gravar entradas já comprimidas (_write_entry).
+# Conferidas no zipfile do CPython 3.11; se alguma sumir, as entradas passam pela API
+# pública (writestr), recomprimindo no thread principal.
+_ZIPFILE_INTERNALS = ('_lock', '_writecheck', '_didModify', 'start_dir', 'fp', 'filelist', 'NameToInfo')
+
+# Níveis de compressão nomeados (--compress-level); 0 grava sem compressão
+COMPRESSION_LEVELS = {'store': 0, 'fast': 1, 'default': zlib.Z_DEFAULT_COMPRESSION, 'max': 9}
+
+
+def xml_text(value):
+    """Escapa texto para XML, trocando caracteres de controle por espaço"""
+    return html.escape(_CONTROL_CHARS.sub(' ', str(value)), quote=True)
+
+
+def compression_level(value):
+    """Converte 'fast', 'max', '6'... no nível do zlib (-1 = padrão, 0..9)"""
+    if value is None:
+        return zlib.Z_DEFAULT_COMPRESSION
+    if isinstance(value, str) and value in COMPRESSION_LEVELS:
+        return COMPRESSION_LEVELS[value]
+    level = int(value)
+    if not -1 <= level <= 9:
+        raise ValueError(f"Nível de compressão inválido: {value!r} (use 0-9 ou {', '.join(COMPRESSION_LEVELS)})")
+    return level
+
+
+def deflate_entry(content, level=zlib.Z_DEFAULT_COMPRESSION):
+    """(tipo de compressão, CRC, tamanho, bytes gravados) de uma entrada do ZIP
+    
+    Roda nas threads de compressão; com nível 0 a entrada fica sem compressão.
+    """
+    crc = zlib.crc32(content)
+    if level == 0:
+        return ZIP_STORED, crc, len(content), content
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    return ZIP_DEFLATED, crc, len(content), compressor.compress(content) + compressor.flush()
+
+
+class StreamingEpubWriter:
+    """Grava um EPUB3 documento a documento, com memória constante por página"""
+
+    def __init__(self, path, identifier, title, language='pt-br', author=None, description=None,
+                 compresslevel=None, threads=1):
+        self.path = str(path)
+        self.identifier = identifier
+        self.title = title
+        self.language = language
+        self.author = author
+        self.description = description
+
+        self._items = []      # (uid, href, media_type, properties)
+        self._spine = ['nav']
+        self._toc = []        # (nav_id, href, label, filhos) - filhos na mesma forma
+        self._page_targets = []  # (rótulo impresso, href com âncora)
+        self._documents = 0
+        self.bytes_written = 0
+
+        self.compresslevel = compression_level(compresslevel)
+        # Entradas na ordem de gravação: Future da compressão ou entrada já pronta
+        self._pending = deque()
+        self._pool = ThreadPoolExecutor(threads, thread_name_prefix='epub-deflate') if threads > 1 else None
+        self._max_pending = 4 * threads
+        self._date_time = time.localtime()[:6]
+
+        self._tmp_path = self.path + '.tmp'
+        self._zip = ZipFile(self._tmp_path, 'w', ZIP_DEFLATED)
+        # mimetype precisa ser a primeira entrada e sem compressão
+        self._zip.writestr('mimetype', 'application/epub+zip', compress_type=ZIP_STORED)
+        self._raw_writes = all(hasattr(self._zip, name) for name in _ZIPFILE_INTERNALS)
+        self._write_entry('META-INF/container.xml', deflate_entry(CONTAINER_XML.encode('utf-8'), self.compresslevel))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            if self._pool is not None:
+                self._pool.shutdown(cancel_futures=True)
+            self._zip.close()
+            # ZIP incompleto: não substitui a saída anterior
+            try:
+                os.remove(self._tmp_path)
+            except FileNotFoundError:
+                pass
+
+    @property
+    def document_count(self):
+        return self._documents
+
+    def _write(self, href, content):
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        self.bytes_written += len(content)
+        if self._pool is None:
+            self._write_entry(f'EPUB/{href}', deflate_entry(content, self.compresslevel))
+            return
+        self._queue(f'EPUB/{href}', self._pool.submit(deflate_entry, content, self.compresslevel))
+
+    def _queue(self, name, entry):
+        """Enfileira uma entrada (Future ou pronta) e grava as mais antigas além de _max_pending"""
+        self._pending.append((name, entry))
+        if len(self._pending) > self._max_pending:
+            self._flush(len(self._pending) - self._max_pending)
+
+    def add_item(self, uid, href, media_type, content):
+        """Adiciona um recurso fora do spine (CSS, imagens)"""
+        self._write(href, content)
+        self._items.append((uid, href, media_type, None))
+
+    def _write_raw(self, href, source_info, raw):
+        """Grava uma entrada já comprimida (de outro ZIP) sem descomprimir nem recomprimir"""
+        entry = (source_info.compress_type, source_info.CRC, source_info.file_size, raw)
+        self.bytes_written += source_info.file_size
+        if self._pool is None:
+            self._write_entry(f'EPUB/{href}', entry)
+        else:
+            # Na fila para manter a ordem de gravação, com o mesmo limite das comprimidas
+            self._queue(f'EPUB/{href}', entry)
+
+    def _flush(self, count=None):
+        """Grava no ZIP, em ordem, as `count` primeiras entradas pendentes (todas se None)"""
+        count = len(self._pending) if count is None else count
+        for _ in range(count):
+            name, entry = self._pending.popleft()
+            self._write_entry(name, entry.result() if isinstance(entry, Future) else entry)
+
+    def _write_entry(self, name, entry):
+        """Grava uma entrada já comprimida: cabeçalho local + dados, como o zipfile faria"""
+        compress_type, crc, file_size, data = entry
+        zf = self._zip
+        if not self._raw_writes:
+            self._write_entry_public(name, compress_type, data)
+            return
+        zinfo = ZipInfo(name, date_time=self._date_time)
+        zinfo.compress_type = compress_type
+        zinfo.external_attr = 0o600 << 16
+        zinfo.CRC = crc
+        zinfo.file_size = file_size
+        zinfo.compress_size = len(data)
+        with zf._lock:
+            zf._writecheck(zinfo)
+            zinfo.header_offset = zf.fp.tell()
+            zf._didModify = True
+            zf.fp.write(zinfo.FileHeader())
+            zf.fp.write(data)
+            zf.filelist.append(zinfo)
+            zf.NameToInfo[zinfo.filename] = zinfo
+            zf.start_dir = zf.fp.tell()
+
+    def _write_entry_public(self, name, compress_type, data):
+        """Sem as partes internas do ZipFile: descomprime e deixa o writestr comprimir de novo"""
+        if compress_type == ZIP_DEFLATED:
+            data = zlib.decompress(data, -15)
+        zinfo = ZipInfo(name, date_time=self._date_time)
+        zinfo.external_attr = 0o600 << 16
+        level = None if self.compresslevel == zlib.Z_DEFAULT_COMPRESSION else self.compresslevel
+        self._zip.writestr(zinfo, data, compress_type=ZIP_STORED if self.compresslevel == 0 else ZIP_DEFLATED,
+                           compresslevel=level)
+
+    def add_document(self, href, content, toc_label=None, nav_id=None, toc_children=(), raw=None):
+        """Grava um documento XHTML no ZIP e o registra no spine e no sumário
+
+        toc_children: entradas (nav_id, href, label) aninhadas sob o documento,
+        normalmente âncoras de página dentro de um capítulo.
+        raw: (ZipInfo, bytes comprimidos) de um EPUB anterior; quando dado, a
+        entrada é copiada como está e `content` é ignorado.
+        """
+        uid = f'chapter_{self._documents}'
+        self._documents += 1
+        if raw is not None:
+            self._write_raw(href, *raw)
+        else:
+            self._write(href, content)
+        self._items.append((uid, href, XHTML_MEDIA_TYPE, None))
+        self._spine.append(uid)
+        if toc_label is not None:
+            children = [(child_id, child_href, label, ()) for child_id, child_href, label in toc_children]
+            self._toc.append((nav_id or uid, href, toc_label, children))
+        return uid
+
+    def add_page_target(self, label, href):
+        """Registra onde começa a página impressa `label` (para o page-list e o índice)"""
+        self._page_targets.append((label, href))
+
+    def _content_opf(self):
+        modified = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+        parts = [
+            "<?xml version='1.0' encoding='utf-8'?>\n",
+            '<package xmlns="http://www.idpf.org/2007/opf" unique-identifier="id" version="3.0" '
+            'prefix="rendition: http://www.idpf.org/vocab/rendition/#">\n',
+            '  <metadata xmlns:dc="http://purl.org/dc/elements/1.1/" xmlns:opf="http://www.idpf.org/2007/opf">\n',
+            f'    <meta property="dcterms:modified">{modified}</meta>\n',
+            f'    <dc:identifier id="id">{xml_text(self.identifier)}</dc:identifier>\n',
+            f'    <dc:title>{xml_text(self.title)}</dc:title>\n',
+            f'    <dc:language>{xml_text(self.language)}</dc:language>\n',
+        ]
+        if self.author:
+            parts.append(f'    <dc:creator id="creator">{xml_text(self.author)}</dc:creator>\n')
+        if self.description:
+            parts.append(f'    <dc:description>{xml_text(self.description)}</dc:description>\n')
+        parts.append('  </metadata>\n  <manifest>\n')
+        for uid, href, media_type, properties in self._items:
+            props = f' properties="{properties}"' if properties else ''
+            parts.append(f'    <item href="{xml_text(href)}" id="{uid}" media-type="{media_type}"{props}/>\n')
+        parts.append('  </manifest>\n  <spine toc="ncx">\n')
+        for uid in self._spine:
+            parts.append(f'    <itemref idref="{uid}"/>\n')
+        parts.append('  </spine>\n</package>\n')
+        return ''.join(parts)
+
+    def _toc_depth(self):
+        return 2 if any(children for *_, children in self._toc) else 1
+
+    def _toc_ncx(self):
+        order = 0
+
+        def nav_points(entries, indent):
+            nonlocal order
+            pad = ' ' * indent
+            for nav_id, href, label, children in entries:
+                order += 1
+                parts.append(
+                    f'{pad}<navPoint id="{xml_text(nav_id)}" playOrder="{order}">\n'
+                    f'{pad}  <navLabel>\n{pad}    <text>{xml_text(label)}</text>\n{pad}  </navLabel>\n'
+                    f'{pad}  <content src="{xml_text(href)}"/>\n'
+                )
+                nav_points(children, indent + 2)
+                parts.append(f'{pad}</navPoint>\n')
+
+        parts = [
+            "<?xml version='1.0' encoding='utf-8'?>\n",
+            '<ncx xmlns="http://www.daisy.org/z3986/2005/ncx/" version="2005-1">\n',
+            '  <head>\n',
+            f'    <meta content="{xml_text(self.identifier)}" name="dtb:uid"/>\n',
+            f'    <meta content="{self._toc_depth()}" name="dtb:depth"/>\n',
+            '    <meta content="0" name="dtb:totalPageCount"/>\n',
+            '    <meta content="0" name="dtb:maxPageNumber"/>\n',
+            '  </head>\n',
+            f'  <docTitle>\n    <text>{xml_text(self.title)}</text>\n  </docTitle>\n',
+            '  <navMap>\n',
+        ]
+        nav_points(self._toc, 4)
+        parts.append('  </navMap>\n</ncx>\n')
+        return ''.join(parts)
+
+    def _nav_xhtml(self, page_targets=()):
+        def nav_list(entries, indent):
+            pad = ' ' * indent
+            parts.append(f'{pad}<ol>\n')
+            for _, href, label, children in entries:
+                parts.append(f'{pad}  <li>\n{pad}    <a href="{xml_text(href)}">{xml_text(label)}</a>\n')
+                if children:
+                    nav_list(children, indent + 4)
+                parts.append(f'{pad}  </li>\n')
+            parts.append(f'{pad}</ol>\n')
+
+        lang = xml_text(self.language)
+        parts = [
+            "<?xml version='1.0' encoding='utf-8'?>\n<!DOCTYPE html>\n",
+            f'<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops" '
+            f'lang="{lang}" xml:lang="{lang}">\n',
+            f'  <head>\n    <title>{xml_text(self.title)}</title>\n  </head>\n',
+            '  <body>\n',
+            '    <nav epub:type="toc" id="id" role="doc-toc">\n',
+            f'      <h2>{xml_text(self.title)}</h2>\n',
+        ]
+        nav_list(self._toc, 6)
+        parts.append('    </nav>\n')
+        if page_targets:
+            parts.append('    <nav epub:type="page-list" id="page-list" hidden="hidden">\n      <ol>\n')
+            for label, href in page_targets:
+                parts.append(f'        <li><a href="{xml_text(href)}">{xml_text(label)}</a></li>\n')
+            parts.append('      </ol>\n    </nav>\n')
+        parts.append('  </body>\n</html>\n')
+        return ''.join(parts)
+
+    def close(self):
+        """Gera OPF, NCX e nav a partir dos metadados acumulados, fecha o ZIP e o move para o caminho final"""
+        if self._zip.fp is None:
+            return
+        self._write('toc.ncx', self._toc_ncx())
+        self._items.append(('ncx', 'toc.ncx', 'application/x-dtbncx+xml', None))
+        page_targets = order_page_targets(self._page_targets)
+        self._write('nav.xhtml', self._nav_xhtml(page_targets))
+        self._items.append(('nav', 'nav.xhtml', XHTML_MEDIA_TYPE, 'nav'))
+        if page_targets:
+            self._write(PAGE_INDEX_HREF, page_index_document(page_targets))
+            self._items.append(('page-index', PAGE_INDEX_HREF, 'application/json', None))
+        self._write('content.opf', self._content_opf())
+        self._flush()
+        if self._pool is not None:
+            self._pool.shutdown()
+        self._zip.close()
+        os.replace(self._tmp_path, self.path)
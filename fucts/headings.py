@@ -0,0 +1,122 @@
+"""
+Classificador de títulos para format_text_content
+
+As regras vêm de um arquivo JSON, por exemplo:
+
+    {
+        "keywords": ["Capítulo", "PROBLEMAS", "Para Leigos"],
+        "uppercase_max_length": 100
+    }
+
+Um parágrafo é título se estiver todo em maiúsculas e for curto, ou se contiver
+alguma das palavras-chave. As palavras-chave são compiladas numa única
+expressão regular em forma de trie (prefixos comuns fatorados), então o custo
+por parágrafo praticamente não cresce com o número de regras.
+"""
+
+import bisect
+import json
+import re
+from functools import lru_cache
+from pathlib import Path
+
+DEFAULT_HEADING_RULES = {
+    'keywords': ['Dicas de', 'Para Leigos', 'Capítulo', 'Básica', 'PROBLEMAS', 'MATEMÁTICA'],
+    'uppercase_max_length': 100,
+}
+
+
+def load_heading_rules(path):
+    """Lê regras de título de um arquivo JSON, completando com os valores padrão"""
+    with open(Path(path), encoding='utf-8') as f:
+        rules = json.load(f)
+    if not isinstance(rules, dict) or not isinstance(rules.get('keywords', []), list):
+        raise ValueError(f"Regras de título inválidas em {path}")
+    return {**DEFAULT_HEADING_RULES, **rules}
+
+
+def _trie_pattern(words):
+    """Monta uma alternância com prefixos fatorados a partir de uma lista de palavras"""
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node):
+        end = '' in node
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        if len(branches) == 1 and not end:
+            return branches[0]
+        pattern = '(?:' + '|'.join(branches) + ')'
+        return pattern + '?' if end else pattern
+
+    return build(trie)
+
+
+# Parágrafos até este tamanho são classificados individualmente com cache
+CACHED_PARAGRAPH_LENGTH = 200
+
+
+class HeadingClassifier:
+    """Decide se um parágrafo é título; resultados repetidos vêm do cache"""
+
+    def __init__(self, keywords=(), uppercase_max_length=100, cache_size=4096):
+        self.keywords = [k for k in dict.fromkeys(keywords) if k and '\n' not in k]
+        self.uppercase_max_length = uppercase_max_length
+        self._regex = re.compile(_trie_pattern(self.keywords)) if self.keywords else None
+        self.is_heading = lru_cache(maxsize=cache_size)(self._is_heading)
+
+    @classmethod
+    def from_rules(cls, rules=None):
+        """Cria o classificador a partir de um dicionário de regras ou caminho de arquivo JSON"""
+        if rules is None:
+            rules = DEFAULT_HEADING_RULES
+        elif not isinstance(rules, dict):
+            rules = load_heading_rules(rules)
+        return cls(rules.get('keywords', ()), rules.get('uppercase_max_length', 100))
+
+    def __reduce__(self):
+        # O cache (lru_cache) não é serializável; o processo do pool recria o classificador
+        return (HeadingClassifier, (self.keywords, self.uppercase_max_length))
+
+    def _is_uppercase_heading(self, para):
+        return len(para) < self.uppercase_max_length and para.isupper()
+
+    def _is_heading(self, para):
+        if self._is_uppercase_heading(para):
+            return True
+        return self._regex is not None and self._regex.search(para) is not None
+
+    def classify_many(self, paragraphs):
+        """Classifica todos os parágrafos de uma página com uma única varredura de regex"""
+        result = [self._is_uppercase_heading(para) for para in paragraphs]
+        if self._regex is None:
+            return result
+
+        # Linhas curtas se repetem (cabeçalhos, rótulos) e passam pelo cache
+        pending = []
+        for i, heading in enumerate(result):
+            if heading:
+                continue
+            if len(paragraphs[i]) <= CACHED_PARAGRAPH_LENGTH:
+                result[i] = self.is_heading(paragraphs[i])
+            else:
+                pending.append(i)
+        if not pending:
+            return result
+
+        # As palavras-chave não contêm '\n', então nenhum casamento cruza a junção
+        starts = []
+        offset = 0
+        for i in pending:
+            starts.append(offset)
+            offset += len(paragraphs[i]) + 1
+        text = '\n'.join(paragraphs[i] for i in pending)
+
+        for match in self._regex.finditer(text):
+            result[pending[bisect.bisect_right(starts, match.start()) - 1]] = True
+        return result
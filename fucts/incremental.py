@@ -0,0 +1,189 @@
+"""
+Reconstrução incremental do EPUB
+
+Ao lado de cada EPUB pode ser gravado um manifesto de build (book.epub.build.json)
+com o hash da entrada de cada página e o hash de entrada e de saída de cada
+documento. A formatação de uma página tem duas etapas, cada uma com a sua
+fingerprint (hash das regras de que depende):
+
+- 'text': linhas correntes, normalização e quebra em blocos. O resultado
+  (PageText, os blocos já limpos) fica no manifesto;
+- 'headings': classificação dos blocos em título ou parágrafo, guardada no
+  campo 'tags' da página.
+
+A primeira linha do arquivo é o manifesto (JSON) e cada linha seguinte é o
+PageText de uma página, na ordem de 'pages'. As linhas só são decodificadas
+quando a página precisa ser reclassificada; a de uma página reaproveitada
+passa para o manifesto novo como está.
+
+Na reconstrução:
+
+- página com a mesma entrada e a mesma fingerprint 'text' não passa de novo
+  pela primeira etapa; se as regras de título mudaram, só os blocos salvos são
+  reclassificados, e a página com as mesmas tags não é formatada;
+- documento com a mesma entrada (hash das chaves de renderização das páginas:
+  entrada, fingerprint 'text' e tags) tem os bytes já comprimidos copiados do
+  EPUB anterior, sem novo deflate;
+- documento re-formatado cujo XHTML saiu igual ao anterior também é copiado.
+
+Bytes comprimidos só são copiados quando o nível de compressão (compresslevel)
+é o mesmo do build anterior; com outro nível tudo é recomprimido, mas as páginas
+continuam sendo reaproveitadas.
+
+A reconstrução pode gravar sobre o próprio EPUB anterior: o StreamingEpubWriter
+grava em SAÍDA.tmp e só troca o arquivo no fim. O PreviousBuild tem que ser
+fechado antes disso (no Windows um arquivo aberto não pode ser substituído).
+"""
+
+import hashlib
+import json
+import os
+import struct
+from pathlib import Path
+from zipfile import ZipFile, sizeFileHeader, structFileHeader
+
+MANIFEST_VERSION = 2
+MANIFEST_SUFFIX = '.build.json'
+
+# Campos do registro de página copiados para o manifesto (o suficiente para
+# registrar a página no sumário e no page-list sem formatá-la), mais as tags
+# da etapa 'headings'
+PAGE_FIELDS = ('title', 'toc_title', 'chapter', 'label', 'paragraphs', 'tags')
+
+
+def content_hash(data):
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def page_hash(page_number, page_data):
+    """Hash da entrada de uma página (número + registro completo)"""
+    return content_hash(json.dumps([page_number, page_data], sort_keys=True, ensure_ascii=False))
+
+
+def document_hash(file_name, title, page_keys):
+    """Hash da entrada de um documento: nome, título e chaves de renderização das páginas"""
+    return content_hash(json.dumps([file_name, title, list(page_keys)], ensure_ascii=False))
+
+
+def manifest_path_for(epub_path):
+    return Path(str(epub_path) + MANIFEST_SUFFIX)
+
+
+def read_raw_entry(zf, zinfo):
+    """Lê os bytes comprimidos de uma entrada do ZIP, sem descomprimir"""
+    zf.fp.seek(zinfo.header_offset)
+    header = struct.unpack(structFileHeader, zf.fp.read(sizeFileHeader))
+    name_length, extra_length = header[10], header[11]
+    zf.fp.seek(zinfo.header_offset + sizeFileHeader + name_length + extra_length)
+    return zf.fp.read(zinfo.compress_size)
+
+
+class BuildManifest:
+    """Hashes de páginas e documentos de um build, gravados ao lado do EPUB"""
+
+    def __init__(self, fingerprints, pages=None, documents=None, compresslevel=None, texts=None):
+        self.fingerprints = fingerprints                         # etapa -> hash das regras
+        self.pages = pages if pages is not None else {}          # âncora -> {hash, campos}
+        self.documents = documents if documents is not None else {}  # arquivo -> {input, output}
+        self.compresslevel = compresslevel
+        self.texts = texts if texts is not None else {}          # âncora -> PageText em JSON (uma linha)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding='utf-8') as f:
+            data = json.loads(f.readline())
+            if data.get('version') != MANIFEST_VERSION:
+                raise ValueError(f"Manifesto de build com versão incompatível: {path}")
+            pages = data.get('pages', {})
+            texts = dict(zip(pages, (line.rstrip('\n') for line in f)))
+        if len(texts) != len(pages):
+            raise ValueError(f"Manifesto de build incompleto: {path}")
+        return cls(data.get('fingerprints', {}), pages, data.get('documents', {}), data.get('compresslevel'), texts)
+
+    def save(self, path):
+        data = {
+            'version': MANIFEST_VERSION,
+            'fingerprints': self.fingerprints,
+            'compresslevel': self.compresslevel,
+            'pages': self.pages,
+            'documents': self.documents,
+        }
+        tmp_path = f'{path}.tmp'
+        # json.dumps e não json.dump: só o primeiro usa o encoder em C
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(data, ensure_ascii=False, separators=(',', ':')))
+            f.write('\n')
+            f.writelines(f'{self.texts.get(anchor, "null")}\n' for anchor in self.pages)
+        os.replace(tmp_path, path)
+
+    def add_page(self, anchor, page_hash_value, text=None, **fields):
+        """Registra uma página; text é o PageText ou a linha já em JSON de um manifesto anterior"""
+        self.pages[anchor] = {'hash': page_hash_value, **{k: fields.get(k) for k in PAGE_FIELDS}}
+        if not isinstance(text, str):
+            text = json.dumps(text, ensure_ascii=False, separators=(',', ':'))
+        self.texts[anchor] = text
+
+    def add_document(self, file_name, input_hash, output_hash):
+        self.documents[file_name] = {'input': input_hash, 'output': output_hash}
+
+
+class PreviousBuild:
+    """EPUB anterior + manifesto, de onde saem páginas e entradas reaproveitadas"""
+
+    def __init__(self, epub_path, manifest, fingerprints, compresslevel=None):
+        self.manifest = manifest
+        previous = manifest.fingerprints
+        self.same_text = previous.get('text') == fingerprints['text']
+        self.same_headings = self.same_text and previous.get('headings') == fingerprints['headings']
+        self.same_compression = manifest.compresslevel == compresslevel
+        self._zip = ZipFile(epub_path)
+        self._names = set(self._zip.namelist())
+
+    @classmethod
+    def open(cls, epub_path, fingerprints, compresslevel=None, manifest_path=None):
+        manifest = BuildManifest.load(manifest_path or manifest_path_for(epub_path))
+        return cls(epub_path, manifest, fingerprints, compresslevel)
+
+    def reusable_page(self, anchor, page_hash_value):
+        """Campos salvos da página, se ela não mudou e a etapa 'text' é a mesma"""
+        if not self.same_text:
+            return None
+        entry = self.manifest.pages.get(anchor)
+        if entry is None or entry.get('hash') != page_hash_value:
+            return None
+        return entry
+
+    def page_text(self, anchor):
+        """PageText salvo da página (decodificado agora, como lista) ou None"""
+        line = self.manifest.texts.get(anchor)
+        return json.loads(line) if line is not None else None
+
+    def text_line(self, anchor, page_hash_value):
+        """Linha do PageText no manifesto anterior, se ainda vale para a página (sem decodificar)"""
+        entry = self.reusable_page(anchor, page_hash_value)
+        if entry is None or entry.get('tags') is None:
+            return None
+        return self.manifest.texts.get(anchor)
+
+    def raw_document(self, file_name, input_hash=None, output_hash=None):
+        """(ZipInfo, bytes comprimidos) do documento anterior, se a entrada ou a saída bater
+
+        Nunca com outro compresslevel: os bytes copiados sairiam no nível antigo.
+        """
+        arcname = f'EPUB/{file_name}'  # mesma pasta usada pelo StreamingEpubWriter
+        entry = self.manifest.documents.get(file_name)
+        if (not self.same_compression or entry is None or arcname not in self._names
+                or not (input_hash is not None and entry.get('input') == input_hash
+                        or output_hash is not None and entry.get('output') == output_hash)):
+            return None
+        zinfo = self._zip.getinfo(arcname)
+        return zinfo, read_raw_entry(self._zip, zinfo)
+
+    def output_hash(self, file_name):
+        entry = self.manifest.documents.get(file_name)
+        return entry.get('output') if entry else None
+
+    def close(self):
+        self._zip.close()
@@ -0,0 +1,175 @@
+"""
+Reconstrução de layout a partir das posições dos glifos (glyphs_data)
+
+Os glifos viram arrays NumPy e são agrupados em colunas, linhas e parágrafos
+só com operações vetorizadas (ordenação, diferenças, reduceat). Títulos são
+detectados pela altura dos glifos. NumPy é opcional: sem ele (ou sem dados de
+glifos) format_text_content continua usando a quebra por '\\r'.
+
+Formatos aceitos para glyphs_data (y cresce para baixo, como na tela):
+
+    {"x": [...], "y": [...], "w": [...], "h": [...], "text": "..."}   # arrays paralelos
+    [{"x": 0, "y": 0, "w": 5, "h": 10, "c": "A"}, ...]                 # um dict por glifo
+
+Larguras/alturas também podem vir como "width"/"height" e o caractere como "char".
+Os arrays paralelos são o formato rápido: com um dict por glifo cada campo
+precisa ser lido glifo a glifo em Python (cerca de 25% mais lento por página).
+
+NumPy só é importado na primeira página com glifos; available() apenas
+procura o pacote, para o import do vitalepub não pagar o custo do NumPy.
+"""
+
+import importlib.util
+from functools import lru_cache
+from operator import itemgetter
+
+np = None   # numpy, importado por _numpy()
+
+# Campo do registro de página (innerPageData) com as posições dos glifos
+GLYPHS_KEY = 'glyphs'
+
+# Frações da altura mediana dos glifos usadas pelas heurísticas
+LINE_TOLERANCE = 0.5      # diferença de centro vertical que ainda é a mesma linha
+WORD_GAP = 0.25           # espaço horizontal que separa palavras
+COLUMN_GAP = 2.0          # faixa vertical vazia que separa colunas
+PARAGRAPH_GAP = 0.8       # espaço entre linhas que inicia novo parágrafo
+INDENT = 1.5              # recuo da primeira linha de um parágrafo
+HEADING_SCALE = 1.3       # linha mais alta que isso em relação à mediana é título
+
+_BLANK_GLYPHS = ['', ' ', '\t', '\n', '\r', '\xa0']
+
+_ALIASES = {
+    'x': ('x', 'left'),
+    'y': ('y', 'top'),
+    'w': ('w', 'width'),
+    'h': ('h', 'height'),
+    'c': ('c', 'char', 'text', 'chars'),
+}
+
+
+@lru_cache(maxsize=None)
+def available():
+    """Indica se o motor de layout pode ser usado (NumPy instalado), sem importá-lo"""
+    return importlib.util.find_spec('numpy') is not None
+
+
+def _numpy():
+    global np
+    if np is None:
+        import numpy
+        np = numpy
+    return np
+
+
+def _field(source, name):
+    for key in _ALIASES[name]:
+        if key in source:
+            return source[key]
+    raise ValueError(f"Glifos sem o campo '{name}'")
+
+
+def load_glyphs(glyphs_data):
+    """Converte glyphs_data em arrays (x, y, w, h, chars)"""
+    _numpy()
+    if isinstance(glyphs_data, dict):
+        columns = {name: _field(glyphs_data, name) for name in _ALIASES}
+        chars = columns.pop('c')
+        x, y, w, h = (np.asarray(columns[name], dtype=np.float64) for name in 'xywh')
+    else:
+        records = list(glyphs_data)
+        if not records:
+            raise ValueError("Lista de glifos vazia")
+        keys = {name: next(k for k in _ALIASES[name] if k in records[0]) for name in _ALIASES}
+        # fromiter preenche o array direto, sem a lista intermediária de cada campo
+        x, y, w, h = (np.fromiter(map(itemgetter(keys[name]), records), dtype=np.float64, count=len(records))
+                      for name in 'xywh')
+        chars = list(map(itemgetter(keys['c']), records))
+
+    chars = np.array(list(chars) if isinstance(chars, str) else chars, dtype=str)
+    if not (len(x) == len(y) == len(w) == len(h) == len(chars)):
+        raise ValueError("Campos de glifos com tamanhos diferentes")
+    if not len(x):
+        raise ValueError("Lista de glifos vazia")
+    return x, y, w, h, chars
+
+
+def _median(values):
+    """Mediana (elemento central) sem o custo de np.median em arrays pequenos"""
+    k = len(values) // 2
+    return float(np.partition(values, k)[k])
+
+
+def _columns(x, w, h_median):
+    """Rótulo de coluna por glifo, a partir das faixas verticais sem nenhum glifo"""
+    order = np.argsort(x, kind='stable')
+    starts = x[order]
+    ends = np.maximum.accumulate(x[order] + w[order])
+    gaps = starts[1:] - ends[:-1]
+    cuts = starts[1:][gaps > COLUMN_GAP * h_median]
+    return np.searchsorted(cuts, x + w / 2)
+
+
+def reconstruct_blocks(glyphs_data):
+    """Agrupa os glifos de uma página em blocos (tag, texto) - tag é 'h2' ou 'p'"""
+    x, y, w, h, chars = load_glyphs(glyphs_data)
+
+    visible = ~np.isin(chars, _BLANK_GLYPHS)
+    if not visible.any():
+        return []
+    x, y, w, h, chars = x[visible], y[visible], w[visible], h[visible], chars[visible]
+    h_median = _median(h) or 1.0
+
+    # Colunas, depois linhas: ordena por (coluna, centro vertical) e quebra em saltos de y
+    column = _columns(x, w, h_median)
+    center = y + h / 2
+    order = np.lexsort((center, column))
+    breaks = np.ones(len(order), dtype=bool)
+    breaks[1:] = (np.diff(column[order]) != 0) | (np.diff(center[order]) > LINE_TOLERANCE * h_median)
+    line_id = np.cumsum(breaks) - 1
+    line_starts = np.flatnonzero(breaks)
+
+    # Dentro de cada linha, ordem horizontal (line_id já é crescente, os inícios não mudam)
+    order = order[np.lexsort((x[order], line_id))]
+    x, y, w, h, chars, column = x[order], y[order], w[order], h[order], chars[order], column[order]
+
+    # Espaços entre palavras: lacuna horizontal maior que WORD_GAP da altura
+    gap_before = np.zeros(len(x))
+    gap_before[1:] = x[1:] - (x[:-1] + w[:-1])
+    space = gap_before > WORD_GAP * h_median
+    space[line_starts] = False
+    pieces = np.where(space, np.char.add(' ', chars), chars)
+
+    # Métricas por linha
+    line_top = np.minimum.reduceat(y, line_starts)
+    line_bottom = np.maximum.reduceat(y + h, line_starts)
+    line_left = np.minimum.reduceat(x, line_starts)
+    line_height = np.maximum.reduceat(h, line_starts)
+    line_column = column[line_starts]
+    body_height = _median(line_height)
+
+    is_heading = line_height > HEADING_SCALE * body_height
+    column_change = np.r_[True, np.diff(line_column) != 0]
+    column_left = np.minimum.reduceat(line_left, np.flatnonzero(column_change))
+    column_left = column_left[np.cumsum(column_change) - 1]
+
+    # Novo parágrafo: mudança de coluna, espaço vertical grande, recuo ou troca título/texto
+    new_block = np.ones(len(line_starts), dtype=bool)
+    new_block[1:] = (
+        (np.diff(line_column) != 0)
+        | (line_top[1:] - line_bottom[:-1] > PARAGRAPH_GAP * body_height)
+        | (line_left[1:] - column_left[1:] > INDENT * h_median)
+        | (is_heading[1:] != is_heading[:-1])
+    )
+
+    # Texto: cada linha vira uma string; linhas do mesmo bloco são unidas por espaço
+    line_ends = np.r_[line_starts[1:], len(pieces)]
+    flat = pieces.tolist()
+    lines = [''.join(flat[start:end]) for start, end in zip(line_starts.tolist(), line_ends.tolist())]
+    block_starts = np.flatnonzero(new_block).tolist() + [len(lines)]
+
+    blocks = []
+    for start, end in zip(block_starts[:-1], block_starts[1:]):
+        text = ' '.join(lines[start:end]).strip()
+        if text:
+            blocks.append(('h2' if is_heading[start] else 'p', text))
+    return blocks
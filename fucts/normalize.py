@@ -0,0 +1,226 @@
+"""
+Normalização do texto extraído (usada por clean_text e clean_text_for_html)
+
+Os artefatos comuns da extração são resolvidos numa única passada: uma tabela
+de caracteres removidos ou trocados (\\x00, \\ufffd, hífen suave, caracteres de
+largura zero, ligaduras e espaços incomuns) e a junção de palavras quebradas
+por hifenização no fim da linha ("compu-\\ntador" -> "computador") viram uma
+só expressão regular pré-compilada. As regras podem vir de um arquivo JSON:
+
+    {
+        "remove": ["\\u00ad", "\\u200b"],
+        "replace": {"\\ufb01": "fi", "\\u00a0": " "},
+        "dehyphenate": true,
+        "hyphenated_words": ["bem-vindo", "guarda-chuva"]
+    }
+
+"remove" e "replace" substituem os padrões inteiros; ausentes, valem os padrões.
+As chaves de "remove" e "replace" são caracteres únicos (ValueError para as
+outras).
+
+Na junção, o hífen no fim da linha é mantido (só a quebra de linha sai) quando
+a palavra é composta de verdade: o trecho seguinte começa com maiúscula
+("guarda-\\nChuva"), é um pronome oblíquo depois de vogal acentuada ("fazê-\\nlo")
+ou é "lhe"/"lhes", a palavra já tem hífen antes da quebra ("bem-te-\\nvi") ou
+a palavra inteira está em "hyphenated_words" ("bem-\\nvindo"). Sem dicionário, outras ênclises e compostos ("disse-\\nme")
+ainda perdem o hífen; a lista serve para os compostos de cada livro.
+
+O separador de parágrafos '\\r' e as quebras de linha nunca são trocados; os
+caracteres proibidos em XML são sempre removidos, então o texto normalizado
+pode ir para xhtml.escape_valid sem nova varredura.
+
+normalize_html faz a mesma limpeza já escapando para XHTML (&, <, > e aspas
+entram na mesma tabela), no lugar de limpar e depois chamar xhtml.escape.
+
+A tabela não é aplicada com str.translate: em texto com acentos o translate
+consulta o dicionário caractere a caractere e ficou dezenas de vezes mais
+lento que a varredura da regex, que só chama Python nos trechos encontrados.
+"""
+
+import html
+import json
+import re
+from functools import lru_cache
+from pathlib import Path
+
+DEFAULT_NORMALIZATION_RULES = {
+    # Nulos, caractere de substituição, hífen suave e caracteres de largura zero
+    'remove': ['\x00', '\ufffd', '\u00ad', '\u200b', '\u200c', '\u200d', '\u2060', '\ufeff'],
+    'replace': {
+        # Ligaduras tipográficas
+        '\ufb00': 'ff', '\ufb01': 'fi', '\ufb02': 'fl', '\ufb03': 'ffi', '\ufb04': 'ffl',
+        '\ufb05': 'st', '\ufb06': 'st',
+        # Espaços incomuns (tabulação, nbsp, espaços tipográficos) viram espaço simples
+        '\t': ' ', '\x0b': ' ', '\x0c': ' ', '\u00a0': ' ', '\u1680': ' ',
+        '\u2000': ' ', '\u2001': ' ', '\u2002': ' ', '\u2003': ' ', '\u2004': ' ', '\u2005': ' ',
+        '\u2006': ' ', '\u2007': ' ', '\u2008': ' ', '\u2009': ' ', '\u200a': ' ',
+        '\u202f': ' ', '\u205f': ' ', '\u3000': ' ',
+    },
+    'dehyphenate': True,
+    # Compostos que mantêm o hífen quando quebrados no fim da linha
+    'hyphenated_words': [
+        'bem-vindo', 'bem-vinda', 'bem-vindos', 'bem-vindas', 'bem-estar', 'bem-sucedido', 'bem-sucedida',
+        'mal-estar', 'guarda-chuva', 'guarda-roupa', 'arco-íris', 'couve-flor', 'beija-flor',
+        'segunda-feira', 'terça-feira', 'quarta-feira', 'quinta-feira', 'sexta-feira',
+        'pré-história', 'pós-graduação', 'ex-presidente', 'vice-presidente', 'recém-nascido',
+    ],
+}
+
+# Hífens que podem quebrar uma palavra no fim da linha (hífen, hífen Unicode, hífen suave)
+HYPHENS = '-\u2010\u00ad'
+
+# Continuação da quebra: depois de um hífen precedido por letra, espaços, a quebra
+# de linha e a palavra seguinte (capturada, sem consumir). Fica opcional logo depois
+# da classe de caracteres, então a regex inteira começa por uma única classe, que o
+# motor procura sem backtracking (com uma alternância o mesmo texto levava três
+# vezes mais tempo).
+HYPHENATION_TAIL = r'(?:(?<=[^\W\d_][' + HYPHENS + r'])[ \t]*\n[ \t]*(?=([^\W\d_]+)))?'
+
+# Pronomes oblíquos que seguem o verbo com hífen (ênclise): fazê-lo, dá-me, vê-se
+CLITICS = frozenset(['lo', 'la', 'los', 'las', 'me', 'te', 'se', 'lhe', 'lhes', 'nos', 'vos'])
+
+# Clíticos que não são sílaba comum de palavra: mantêm o hífen depois de qualquer verbo
+UNAMBIGUOUS_CLITICS = frozenset(['lhe', 'lhes'])
+
+# Vogais acentuadas no fim do verbo antes do pronome (fazê-lo, amá-la, pô-lo)
+ACCENTED_VOWELS = 'áéíóúâêô'
+
+# Palavra (ou composto com hífens) que termina logo antes do hífen da quebra
+_PREVIOUS_WORD_RE = re.compile(r'(?:[^\W\d_]+-)*[^\W\d_]+\Z')
+
+# Escape para XHTML, igual ao html.escape(quote=True) usado por xhtml.escape
+HTML_ESCAPES = {'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#x27;'}
+
+# Caracteres proibidos em XML 1.0 (os mesmos de fucts/xhtml.py)
+INVALID_XML_CHARS = (
+    [chr(code) for code in range(0x20) if chr(code) not in '\t\n\r']
+    + [chr(code) for code in range(0xd800, 0xe000)] + ['\ufffe', '\uffff']
+)
+
+# Textos até este tamanho (títulos, rótulos, linhas repetidas) passam pelo cache
+CACHED_TEXT_LENGTH = 200
+
+
+def _single_chars(chars, field):
+    """Confere que as chaves de remove/replace são caracteres únicos"""
+    invalid = [char for char in chars if not isinstance(char, str) or len(char) != 1]
+    if invalid:
+        raise ValueError(f"'{field}' só aceita caracteres únicos: {invalid!r}")
+
+
+def load_normalization_rules(path):
+    """Lê regras de normalização de um arquivo JSON, completando com os valores padrão"""
+    with open(Path(path), encoding='utf-8') as f:
+        rules = json.load(f)
+    if (not isinstance(rules, dict) or not isinstance(rules.get('remove', []), list)
+            or not isinstance(rules.get('replace', {}), dict)
+            or not isinstance(rules.get('hyphenated_words', []), list)):
+        raise ValueError(f"Regras de normalização inválidas em {path}")
+    try:
+        _single_chars(rules.get('remove', []), 'remove')
+        _single_chars(rules.get('replace', {}), 'replace')
+    except ValueError as e:
+        raise ValueError(f"Regras de normalização inválidas em {path}: {e}") from None
+    return {**DEFAULT_NORMALIZATION_RULES, **rules}
+
+
+class TextNormalizer:
+    """Limpa o texto extraído numa só passada de regex; textos curtos vêm do cache"""
+
+    def __init__(self, remove=(), replace=None, dehyphenate=True, hyphenated_words=(), cache_size=4096):
+        replace = replace or {}
+        _single_chars(remove, 'remove')
+        _single_chars(replace, 'replace')
+        table = {char: '' for char in INVALID_XML_CHARS}
+        table.update((char, '') for char in remove)
+        table.update(replace.items())
+        # '\r' separa parágrafos e '\n' é usado pela hifenização: nunca entram na tabela
+        table.pop('\r', None)
+        table.pop('\n', None)
+        self.table = table
+        self.hyphenated_words = frozenset(word.casefold() for word in hyphenated_words)
+
+        html_table = {char: html.escape(value, quote=True) for char, value in table.items()}
+        html_table.update(HTML_ESCAPES)
+
+        self._regex, self._replace = self._compile(table, dehyphenate)
+        self._html_regex, self._html_replace = self._compile(html_table, dehyphenate)
+        self._cached = lru_cache(maxsize=cache_size)(self._normalize)
+        self._cached_html = lru_cache(maxsize=cache_size)(self._normalize_html)
+
+    def keeps_hyphen(self, text, position, following):
+        """Se o hífen em text[position], no fim da linha, é de uma palavra composta"""
+        if text[position] == '\u00ad':
+            return False    # hífen suave só marca onde a palavra pode ser quebrada
+        if following[0].isupper():
+            return True
+        following = following.casefold()
+        if following in UNAMBIGUOUS_CLITICS:
+            return True
+        match = _PREVIOUS_WORD_RE.search(text, max(0, position - 64), position)
+        previous = match.group().casefold() if match else ''
+        if following in CLITICS and previous[-1:] in ACCENTED_VOWELS:
+            return True
+        if '-' in previous:
+            return True     # composto já hifenizado antes da quebra (bem-te-\nvi)
+        return f'{previous}-{following}' in self.hyphenated_words
+
+    def _compile(self, table, dehyphenate):
+        """Regex de uma classe de caracteres (tabela e hífens) e a função de troca"""
+        chars = set(table)
+        if dehyphenate:
+            chars.update(HYPHENS)
+        if not chars:
+            return None, None
+        pattern = '[' + ''.join(re.escape(char) for char in sorted(chars)) + ']'
+        regex = re.compile(pattern + HYPHENATION_TAIL if dehyphenate else pattern)
+
+        def replace_match(match, lookup=table.get, keeps_hyphen=self.keeps_hyphen):
+            text = match.group()
+            if len(text) > 1:
+                # hífen + quebra de linha: junta a palavra, com o hífen só nos compostos
+                hyphen = text[0]
+                if keeps_hyphen(match.string, match.start(), match.group(1)):
+                    return lookup(hyphen, hyphen)
+                return ''
+            return lookup(text, text)
+
+        return regex, replace_match
+
+    @classmethod
+    def from_rules(cls, rules=None):
+        """Cria o normalizador a partir de um dicionário de regras ou caminho de arquivo JSON"""
+        if rules is None:
+            rules = DEFAULT_NORMALIZATION_RULES
+        elif not isinstance(rules, dict):
+            rules = load_normalization_rules(rules)
+        defaults = DEFAULT_NORMALIZATION_RULES
+        return cls(rules.get('remove', defaults['remove']), rules.get('replace', defaults['replace']),
+                   rules.get('dehyphenate', defaults['dehyphenate']),
+                   rules.get('hyphenated_words', defaults['hyphenated_words']))
+
+    def _normalize(self, text):
+        if self._regex is not None:
+            text = self._regex.sub(self._replace, text)
+        return text.strip()
+
+    def _normalize_html(self, text):
+        if self._html_regex is not None:
+            text = self._html_regex.sub(self._html_replace, text)
+        return text.strip()
+
+    def normalize(self, text):
+        """Texto limpo e sem espaços nas pontas ('' para vazio ou None)"""
+        if not text:
+            return ''
+        if len(text) <= CACHED_TEXT_LENGTH:
+            return self._cached(text)
+        return self._normalize(text)
+
+    def normalize_html(self, text):
+        """Como normalize, mas já escapado para XHTML"""
+        if not text:
+            return ''
+        if len(text) <= CACHED_TEXT_LENGTH:
+            return self._cached_html(text)
+        return self._normalize_html(text)
@@ -0,0 +1,222 @@
+"""
+Arquivo de páginas com acesso aleatório: JSONL + índice binário de offsets
+
+O dump de páginas (uma página por linha, ver save_pages) ganha ao lado um
+índice PÁGINAS.jsonl.idx:
+
+    cabeçalho   <8sQQQQ: MAGIC, páginas, tamanho e mtime_ns do JSONL, bytes da tabela de capítulos
+    offsets     páginas + 1 inteiros <Q (início de cada linha; o último é o fim do arquivo)
+    capítulos   JSON [[índice da primeira página, chapterTitle], ...] (uma entrada por
+                sequência; páginas sem chapterTitle ficam na sequência anterior)
+
+PageFile abre o JSONL e o índice com mmap e decodifica só as linhas pedidas,
+então montar as páginas 4000-4100 de um dump enorme, ou um capítulo só, não
+passa pelo resto do arquivo. Abrir lê só o cabeçalho; cada página custa um
+struct.unpack_from e um json.loads da linha.
+
+O índice é gravado junto com o JSONL por save_pages e recriado (uma varredura
+das linhas, sem json.loads das páginas) quando falta ou quando o JSONL mudou.
+"""
+
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+from array import array
+from pathlib import Path
+
+MAGIC = b'VEPIDX1\x00'
+INDEX_SUFFIX = '.idx'
+
+_HEADER = struct.Struct('<8sQQQQ')
+_OFFSET = struct.Struct('<Q')
+
+# chapterTitle da linha, lido sem decodificar a página inteira
+_CHAPTER_RE = re.compile(rb'"chapterTitle"\s*:\s*("(?:[^"\\]|\\.)*"|null)')
+
+
+def index_path_for(path):
+    """Caminho do índice de um arquivo de páginas (livro.jsonl -> livro.jsonl.idx)"""
+    path = Path(path)
+    return path.with_name(path.name + INDEX_SUFFIX)
+
+
+def _line_chapter(line):
+    match = _CHAPTER_RE.search(line)
+    return json.loads(match.group(1)) if match else None
+
+
+class IndexBuilder:
+    """Acumula os offsets e capítulos das linhas conforme o JSONL é gravado ou lido"""
+
+    def __init__(self):
+        self.offsets = array('Q')
+        self.chapters = []
+        self._chapter = object()
+
+    def add(self, offset, line):
+        chapter = _line_chapter(line)
+        # Páginas que falharam (null) ou sem capítulo ficam na sequência corrente
+        if chapter is not None and chapter != self._chapter:
+            self.chapters.append([len(self.offsets), chapter])
+            self._chapter = chapter
+        self.offsets.append(offset)
+
+    def write(self, path, end):
+        """Grava o índice do JSONL `path` (end: tamanho do JSONL)"""
+        path = Path(path)
+        stat = path.stat()
+        chapters = json.dumps(self.chapters, ensure_ascii=False).encode('utf-8')
+        index_path = index_path_for(path)
+        tmp_path = index_path.with_name(index_path.name + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(_HEADER.pack(MAGIC, len(self.offsets), stat.st_size, stat.st_mtime_ns, len(chapters)))
+            offsets = array('Q', self.offsets)
+            offsets.append(end)
+            if sys.byteorder != 'little':
+                offsets.byteswap()
+            f.write(offsets.tobytes())
+            f.write(chapters)
+        os.replace(tmp_path, index_path)
+
+
+def build_index(path):
+    """Varre o JSONL e grava o índice; linhas em branco não contam como página"""
+    builder = IndexBuilder()
+    offset = 0
+    with open(path, 'rb') as f:
+        for line in f:
+            if line.strip():
+                builder.add(offset, line)
+            offset += len(line)
+    builder.write(path, offset)
+    return index_path_for(path)
+
+
+class PageFile:
+    """Páginas de um JSONL indexado, lidas sob demanda por mmap
+
+    Índices são de 0 (como numa lista); pages(start_page, end_page) usa a
+    numeração de páginas do builder, a partir de 1.
+    """
+
+    def __init__(self, path, rebuild=True):
+        self.path = Path(path)
+        if self.path.suffix.lower() != '.jsonl':
+            raise ValueError(f"Só arquivos JSONL têm índice de páginas: {self.path}")
+        self._file = open(self.path, 'rb')
+        self._index_file = None
+        self._map = self._index = None
+        try:
+            if not self._open_index() and rebuild:
+                build_index(self.path)
+                if not self._open_index():
+                    raise ValueError(f"Índice de páginas inválido: {index_path_for(self.path)}")
+            elif self._index is None:
+                raise ValueError(f"Índice de páginas ausente ou desatualizado: {index_path_for(self.path)}")
+            # mmap não aceita arquivo vazio
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self._size else None
+        except BaseException:
+            self.close()
+            raise
+
+    def _open_index(self):
+        """Mapeia o índice; False se ele falta ou não corresponde ao JSONL"""
+        if self._index is not None:
+            self._index.close()
+            self._index_file.close()
+            self._index = self._index_file = None
+        try:
+            index_file = open(index_path_for(self.path), 'rb')
+        except FileNotFoundError:
+            return False
+        try:
+            index = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            index_file.close()
+            return False
+        stat = os.fstat(self._file.fileno())
+        if len(index) >= _HEADER.size:
+            magic, count, size, mtime_ns, chapters_length = _HEADER.unpack_from(index)
+            expected = _HEADER.size + (count + 1) * _OFFSET.size + chapters_length
+            if (magic == MAGIC and size == stat.st_size and mtime_ns == stat.st_mtime_ns
+                    and len(index) == expected):
+                self._index_file, self._index = index_file, index
+                self._count, self._size, self._chapters_length = count, size, chapters_length
+                self._chapters = None
+                return True
+        index.close()
+        index_file.close()
+        return False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __len__(self):
+        return self._count
+
+    def _offset(self, i):
+        return _OFFSET.unpack_from(self._index, _HEADER.size + i * _OFFSET.size)[0]
+
+    def raw(self, i):
+        """Bytes da linha da página i (sem decodificar)"""
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError("página fora do arquivo")
+        return self._map[self._offset(i):self._offset(i + 1)]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._count))]
+        return json.loads(self.raw(index))
+
+    def __iter__(self):
+        return (json.loads(self.raw(i)) for i in range(self._count))
+
+    def page_range(self, start_page=1, end_page=None):
+        """(start_page, end_page) conferidos, com end_page limitado à última página
+
+        IndexError se o intervalo é vazio ou começa depois da última página.
+        """
+        if start_page < 1 or (end_page is not None and end_page < start_page):
+            raise IndexError(f"intervalo de páginas inválido: {start_page}-{end_page}")
+        if start_page > self._count:
+            raise IndexError(f"a página {start_page} não existe em {self.path.name} "
+                             f"({self._count} páginas)")
+        return start_page, self._count if end_page is None else min(end_page, self._count)
+
+    def pages(self, start_page=1, end_page=None):
+        """Registros das páginas start_page..end_page (de 1, inclusivo), lidos sob demanda
+
+        O intervalo é conferido na chamada (ver page_range), não na primeira página.
+        """
+        start_page, end_page = self.page_range(start_page, end_page)
+        return (json.loads(self.raw(i)) for i in range(start_page - 1, end_page))
+
+    def chapters(self):
+        """[(chapterTitle, primeira página, última página)] com a numeração de 1"""
+        if self._chapters is None:
+            start = _HEADER.size + (self._count + 1) * _OFFSET.size
+            runs = json.loads(self._index[start:start + self._chapters_length] or b'[]')
+            bounds = [first for first, _ in runs[1:]] + [self._count]
+            self._chapters = [(title, first + 1, end) for (first, title), end in zip(runs, bounds)]
+        return self._chapters
+
+    def chapter_range(self, title):
+        """(primeira, última) página da primeira sequência com o chapterTitle `title`"""
+        for chapter, first, last in self.chapters():
+            if chapter == title:
+                return first, last
+        raise KeyError(title)
+
+    def close(self):
+        for handle in (self._map, self._index, self._index_file, self._file):
+            if handle is not None:
+                handle.close()
+        self._map = self._index = self._index_file = None
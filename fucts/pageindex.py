@@ -0,0 +1,92 @@
+"""
+Índice de páginas impressas do EPUB
+
+Cada página tem um rótulo impresso (page_data['page'], que pode ser romano
+como "xii"). O builder grava no EPUB um page-list EPUB3 e um page-index.json
+com rótulo -> (documento, âncora), e PageIndex carrega esse índice para que
+"ir para a página N" seja uma consulta O(1) em dicionário.
+"""
+
+import json
+from zipfile import ZipFile
+
+from fucts.roman import InvalidPageLabel, page_label_key
+
+PAGE_INDEX_HREF = 'page-index.json'
+PAGE_INDEX_VERSION = 1
+
+
+def normalize_label(label):
+    """Forma canônica de um rótulo para consulta (romanos em minúsculas)"""
+    return str(label).strip().lower()
+
+
+def order_page_targets(targets):
+    """Ordena (rótulo, href) em ordem de leitura: romanos antes dos arábicos
+
+    Rótulos que não são números herdam a chave da página anterior, ficando
+    logo depois dela; a ordenação é estável.
+    """
+    keyed = []
+    previous = None
+    for position, (label, href) in enumerate(targets):
+        try:
+            key = page_label_key(label)
+        except (InvalidPageLabel, TypeError):
+            key = previous
+        previous = key
+        keyed.append(((key is not None, key if key is not None else 0, position), label, href))
+    keyed.sort(key=lambda item: item[0])
+    return [(label, href) for _, label, href in keyed]
+
+
+def page_index_document(targets):
+    """Monta o JSON do índice a partir de (rótulo, href) já ordenados"""
+    pages = {}
+    order = []
+    for label, href in targets:
+        key = normalize_label(label)
+        if key in pages:
+            continue
+        document, _, anchor = href.partition('#')
+        pages[key] = [document, anchor]
+        order.append(str(label))
+    return json.dumps({'version': PAGE_INDEX_VERSION, 'order': order, 'pages': pages},
+                      ensure_ascii=False, separators=(',', ':'))
+
+
+class PageIndex:
+    """Consulta rótulo impresso -> (documento, âncora) de um EPUB gerado"""
+
+    def __init__(self, pages, order=()):
+        self._pages = {key: tuple(value) for key, value in pages.items()}
+        self.order = list(order)
+
+    @classmethod
+    def from_json(cls, data):
+        if isinstance(data, (bytes, str)):
+            data = json.loads(data)
+        return cls(data.get('pages', {}), data.get('order', ()))
+
+    @classmethod
+    def from_epub(cls, path):
+        """Lê o page-index.json de um EPUB criado pelo vitalepub"""
+        with ZipFile(path) as zf:
+            for name in zf.namelist():
+                if name == PAGE_INDEX_HREF or name.endswith('/' + PAGE_INDEX_HREF):
+                    return cls.from_json(zf.read(name))
+        raise KeyError(f"{path} não tem {PAGE_INDEX_HREF}")
+
+    def __len__(self):
+        return len(self._pages)
+
+    def __contains__(self, label):
+        return normalize_label(label) in self._pages
+
+    def locate(self, label):
+        """(documento, âncora) da página impressa `label`; KeyError se não existir"""
+        return self._pages[normalize_label(label)]
+
+    def href(self, label):
+        document, anchor = self.locate(label)
+        return f'{document}#{anchor}' if anchor else document
@@ -0,0 +1,160 @@
+"""
+Armazenamento compacto dos registros de página extraídos
+
+O innerPageData de cada página traz vários campos, mas o builder só usa
+words, chapterTitle, page e (se houver) glyphs. PageStore guarda apenas esses
+campos em objetos PageRecord com __slots__, com os títulos de capítulo
+internados (o mesmo título repetido em centenas de páginas vira um só objeto).
+Páginas que falharam ocupam um único marcador compartilhado.
+
+O grosso da memória é o texto, não os dicts: basta um travessão, aspas curvas
+ou emoji na página para o CPython guardar a str inteira com 2 ou 4 bytes por
+caractere. Por isso os words ficam em memória codificados em UTF-8 (1 byte por
+caractere no texto em português) e só são decodificados quando a página é lida.
+
+Quando os words acumulados passam de spill_threshold bytes (UTF-8), eles passam
+a ser gravados num arquivo temporário e lidos de volta por mmap, então um livro
+grande não precisa manter todo o texto na memória. A iteração é preguiçosa:
+cada página volta como um dict novo (o formato do innerPageData), um por vez.
+"""
+
+import mmap
+import os
+import sys
+import tempfile
+
+from fucts.layout import GLYPHS_KEY
+
+# Texto acumulado em memória antes de passar os words para o arquivo mapeado
+DEFAULT_SPILL_THRESHOLD = 64 * 1024 * 1024
+
+
+class PageRecord:
+    """Campos de uma página usados pelo builder; words (UTF-8) fica em memória ou no arquivo"""
+
+    __slots__ = ('chapter', 'label', 'glyphs', 'words', 'offset', 'length')
+
+    def __init__(self, chapter, label, words, glyphs=None):
+        self.chapter = chapter
+        self.label = label
+        self.glyphs = glyphs
+        self.words = words
+        self.offset = -1    # >= 0 quando words foi para o arquivo
+        self.length = 0
+
+
+# Marcador único para páginas cuja extração falhou (None no innerPageData)
+_FAILED = object()
+
+
+class PageStore:
+    """Sequência de registros de página, com words opcionalmente em arquivo mapeado"""
+
+    def __init__(self, spill_threshold=DEFAULT_SPILL_THRESHOLD, spill_dir=None):
+        self.spill_threshold = spill_threshold
+        self.spill_dir = spill_dir
+        self._records = []
+        self._memory_bytes = 0   # bytes UTF-8 dos words ainda em memória
+        self._file = None
+        self._map = None
+
+    @classmethod
+    def from_pages(cls, pages, **options):
+        store = cls(**options)
+        store.extend(pages)
+        return store
+
+    def __len__(self):
+        return len(self._records)
+
+    def __bool__(self):
+        return bool(self._records)
+
+    @property
+    def spilled(self):
+        return self._file is not None
+
+    def append(self, page_data):
+        """Guarda um registro de página (dict do innerPageData ou None)"""
+        if not page_data:
+            self._records.append(_FAILED)
+            return
+        chapter = page_data.get('chapterTitle')
+        if isinstance(chapter, str):
+            chapter = sys.intern(chapter)
+        words = page_data.get('words')
+        if isinstance(words, str):
+            words = words.encode('utf-8')
+        record = PageRecord(chapter, page_data.get('page'), words, page_data.get(GLYPHS_KEY))
+        self._records.append(record)
+
+        if isinstance(words, bytes) and words:
+            if self._file is not None:
+                self._spill(record)
+            else:
+                self._memory_bytes += len(words)
+                if self._memory_bytes > self.spill_threshold:
+                    self._spill_all()
+
+    def extend(self, pages):
+        for page_data in pages:
+            self.append(page_data)
+
+    def _spill(self, record):
+        data = record.words
+        record.offset = self._file.seek(0, os.SEEK_END)
+        record.length = len(data)
+        record.words = None
+        self._file.write(data)
+
+    def _spill_all(self):
+        """Passa todos os words em memória para o arquivo temporário"""
+        self._file = tempfile.TemporaryFile(prefix='vitalepub-words-', dir=self.spill_dir)
+        for record in self._records:
+            if record is not _FAILED and isinstance(record.words, bytes) and record.words:
+                self._spill(record)
+        self._memory_bytes = 0
+
+    def _words(self, record):
+        if record.offset < 0:
+            if isinstance(record.words, bytes):
+                return record.words.decode('utf-8')
+            return record.words
+        end = record.offset + record.length
+        if self._map is None or len(self._map) < end:
+            # O arquivo cresceu desde o último mapeamento
+            if self._map is not None:
+                self._map.close()
+            self._file.flush()
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map[record.offset:end].decode('utf-8')
+
+    def _page(self, record):
+        if record is _FAILED:
+            return None
+        page = {}
+        words = self._words(record)
+        # Campos ausentes no registro original continuam ausentes (o builder usa .get com padrão)
+        for key, value in (('words', words), ('chapterTitle', record.chapter), ('page', record.label),
+                           (GLYPHS_KEY, record.glyphs)):
+            if value is not None:
+                page[key] = value
+        return page
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._page(record) for record in self._records[index]]
+        return self._page(self._records[index])
+
+    def __iter__(self):
+        for record in self._records:
+            yield self._page(record)
+
+    def close(self):
+        """Libera o arquivo temporário; os words gravados nele deixam de estar disponíveis"""
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,110 @@
+"""
+Relatório de desempenho do build (--profile)
+
+Acumula tempo de parede e de CPU por etapa, contagens de páginas e
+parágrafos, bytes gerados e as páginas mais lentas, e grava tudo em JSON.
+"""
+
+import heapq
+import json
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+
+class BuildProfile:
+    """Coletor de métricas por etapa do build"""
+
+    def __init__(self, slowest=10):
+        self.stages = {}
+        self.page_stages = {}
+        self.pages = 0
+        self.paragraphs = 0
+        self.bytes_produced = 0
+        self.output_size = 0
+        self.extra = {}
+        self._slowest_limit = slowest
+        self._slowest = []   # heap de (segundos, página, rótulo)
+        self._stack = []     # tempo das etapas aninhadas, descontado da etapa externa
+        self._started = time.perf_counter()
+
+    def _add(self, table, name, wall, cpu):
+        entry = table.setdefault(name, {'wall_s': 0.0, 'cpu_s': 0.0, 'calls': 0})
+        entry['wall_s'] += wall
+        entry['cpu_s'] += cpu
+        entry['calls'] += 1
+
+    @contextmanager
+    def stage(self, name):
+        """Mede um trecho do processo principal (tempo exclusivo das etapas aninhadas)"""
+        children = [0.0, 0.0]
+        self._stack.append(children)
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall
+            cpu = time.process_time() - cpu
+            self._stack.pop()
+            if self._stack:
+                self._stack[-1][0] += wall
+                self._stack[-1][1] += cpu
+            self._add(self.stages, name, wall - children[0], cpu - children[1])
+
+    def timed_iter(self, name, iterable):
+        """Repassa os itens de `iterable` medindo o tempo gasto para produzi-los"""
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def add_page(self, page_number, label, paragraphs, timings):
+        """Registra as métricas de uma página (timings: etapa -> (parede, cpu))"""
+        self.pages += 1
+        self.paragraphs += paragraphs
+        total = 0.0
+        for name, (wall, cpu) in timings.items():
+            self._add(self.page_stages, name, wall, cpu)
+            total += wall
+        item = (total, page_number, str(label))
+        if len(self._slowest) < self._slowest_limit:
+            heapq.heappush(self._slowest, item)
+        else:
+            heapq.heappushpop(self._slowest, item)
+
+    def report(self):
+        return {
+            'wall_s': time.perf_counter() - self._started,
+            'stages': self.stages,
+            'page_stages': self.page_stages,
+            'pages': self.pages,
+            'paragraphs': self.paragraphs,
+            'bytes_produced': self.bytes_produced,
+            'output_size': self.output_size,
+            'slowest_pages': [
+                {'page': page_number, 'label': label, 'wall_s': seconds}
+                for seconds, page_number, label in sorted(self._slowest, reverse=True)
+            ],
+            **self.extra,
+        }
+
+    def write(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, ensure_ascii=False, indent=2)
+
+
+@contextmanager
+def page_timer(timings, name):
+    """Acumula (parede, cpu) de um trecho no dicionário `timings` de uma página"""
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        yield
+    finally:
+        prev_wall, prev_cpu = timings.get(name, (0.0, 0.0))
+        timings[name] = (prev_wall + time.perf_counter() - wall, prev_cpu + time.process_time() - cpu)
@@ -0,0 +1,109 @@
+"""
+Junção de parágrafos cortados na virada de página
+
+Cada página é formatada sozinha, então um parágrafo que continua na página
+seguinte virava dois <p> em dois documentos. reflow_pages fica entre a leitura
+das páginas e o builder: olha uma página à frente e, quando o último parágrafo
+de uma página termina sem pontuação final e o primeiro da seguinte começa com
+letra minúscula (no mesmo capítulo), move esse primeiro parágrafo para o fim
+da página anterior, no campo CONTINUATION_KEY:
+
+    {"words": "...", "page": "46", "separator": " "}
+
+O builder emenda o trecho no último parágrafo, com uma âncora (break_anchor)
+no ponto em que a página impressa seguinte começa, e o page-list aponta para
+essa âncora. Uma palavra hifenizada na virada ("compu-" / "tador") é juntada
+sem o hífen, que fica em "hyphen": se o último bloco da página não for um
+parágrafo (um título, por exemplo), o builder não emenda o trecho e devolve o
+hífen ao fim do bloco. Só duas páginas ficam na memória de cada vez.
+
+Páginas com glifos (layout por posição, ver fucts/layout.py) não são juntadas,
+porque lá os parágrafos não vêm do words.
+"""
+
+from fucts.layout import GLYPHS_KEY
+
+# Campo do registro de página com o trecho vindo do início da página seguinte
+CONTINUATION_KEY = 'continuation'
+
+# Pontuação que encerra um parágrafo (aspas e parênteses de fechamento incluídos)
+SENTENCE_END = '.!?…:;"\'”’»)]'
+
+# Hífen, hífen Unicode e hífen suave no fim da página: a palavra continua na seguinte
+HYPHENS = '-\u2010\u00ad'
+
+
+def break_anchor(page_number):
+    """Id da âncora deixada no ponto em que a página `page_number` começa"""
+    return f'page_{page_number:03d}_start'
+
+
+def _edge_paragraphs(paragraphs, running_lines):
+    """Índices do primeiro e do último parágrafo de texto (sem linhas correntes)"""
+    skip = running_lines.running_indexes(paragraphs) if running_lines else ()
+    filled = [i for i, para in enumerate(paragraphs) if para.strip() and i not in skip]
+    if not filled:
+        return None, None
+    return filled[0], filled[-1]
+
+
+def _join(current, following, running_lines):
+    """Move o início de `following` para o fim de `current`, se o parágrafo foi cortado"""
+    if (current.get(GLYPHS_KEY) or following.get(GLYPHS_KEY) or CONTINUATION_KEY in current
+            or current.get('chapterTitle') != following.get('chapterTitle')):
+        return current, following, False
+    words = current.get('words')
+    next_words = following.get('words')
+    if not isinstance(words, str) or not isinstance(next_words, str):
+        return current, following, False
+
+    paragraphs = words.split('\r')
+    next_paragraphs = next_words.split('\r')
+    _, last = _edge_paragraphs(paragraphs, running_lines)
+    first, next_last = _edge_paragraphs(next_paragraphs, running_lines)
+    # A página seguinte precisa ter outro parágrafo além do movido
+    if last is None or first is None or first == next_last:
+        return current, following, False
+
+    tail = paragraphs[last].rstrip()
+    head = next_paragraphs[first].lstrip()
+    if not tail or tail[-1] in SENTENCE_END or not head[:1].islower():
+        return current, following, False
+
+    continuation = {'words': head, 'page': following.get('page'), 'separator': ' '}
+    if tail[-1] in HYPHENS and tail[-2:-1].isalpha():
+        # O hífen suave aparecia como '-' na quebra de linha impressa
+        continuation.update(separator='', hyphen='-' if tail[-1] == '\u00ad' else tail[-1])
+        tail = tail[:-1]
+    paragraphs[last] = tail
+    del next_paragraphs[first]
+
+    current = {**current, 'words': '\r'.join(paragraphs), CONTINUATION_KEY: continuation}
+    following = {**following, 'words': '\r'.join(next_paragraphs)}
+    return current, following, True
+
+
+def reflow_pages(pages, running_lines=None, stats=None):
+    """Gera os registros de página com os parágrafos cortados na virada já juntados
+
+    running_lines (ver fucts/runningheads.py) faz cabeçalhos e rodapés correntes
+    serem ignorados ao procurar o último e o primeiro parágrafo. Em `stats`
+    (dict) o número de junções fica em 'joined'.
+    """
+    joined = 0
+    current = None
+    started = False
+    try:
+        for page_data in pages:
+            # Páginas que falharam (None) passam adiante na mesma posição
+            if started:
+                if current and page_data:
+                    current, page_data, did_join = _join(current, page_data, running_lines)
+                    joined += did_join
+                yield current
+            current, started = page_data, True
+        if started:
+            yield current
+    finally:
+        if stats is not None:
+            stats['joined'] = stats.get('joined', 0) + joined
@@ -1,30 +1,138 @@
-from typing import List
+import re
+from array import array
+from functools import lru_cache
 
-def roman_sort_with_ints(arr):
-    """
-    Contributed by ChatGPT, who didn't know how to use .upper()
+ROMAN_VALUES = {'I': 1, 'V': 5, 'X': 10, 'L': 50, 'C': 100, 'D': 500, 'M': 1000}
+
+_ROMAN_NUMERALS = [
+    (1000, 'M'), (900, 'CM'), (500, 'D'), (400, 'CD'), (100, 'C'), (90, 'XC'),
+    (50, 'L'), (40, 'XL'), (10, 'X'), (9, 'IX'), (5, 'V'), (4, 'IV'), (1, 'I'),
+]
+
+# Canonical numerals only (1..4999): "IIII" or "IC" are rejected instead of guessed
+_ROMAN_RE = re.compile(r'M{0,4}(CM|CD|D?C{0,3})(XC|XL|L?X{0,3})(IX|IV|V?I{0,3})', re.IGNORECASE)
+
+# Roman labels sort before every arabic label when front matter goes first
+FRONT_MATTER_OFFSET = 1 << 32
+
+# Cache of the single-label helpers (repeated lookups of the same labels). The
+# sort path does not go through it: on a book of distinct labels every key would
+# be a miss, and three stacked caches made sorting slower than parsing directly.
+LABEL_CACHE_SIZE = 1 << 16
+
+
+class InvalidPageLabel(ValueError, KeyError):
+    """Label is neither an integer nor a canonical Roman numeral.
+
+    Subclasses KeyError because the old roman_sort_with_ints raised a bare
+    KeyError on bad input.
     """
-    roman_dict = {'I': 1, 'V': 5, 'X': 10, 'L': 50, 'C': 100, 'D': 500, 'M': 1000}
-
-    def roman_to_int(num):
-        if isinstance(num, str):
-            num = num.upper()
-        result = 0
-        for i in range(len(num)):
-            if i > 0 and roman_dict[num[i]] > roman_dict[num[i - 1]]:
-                result += roman_dict[num[i]] - 2 * roman_dict[num[i - 1]]
-            else:
-                result += roman_dict[num[i]]
-        return result
-
-    def int_or_roman(elem):
+
+    def __str__(self):
+        return ValueError.__str__(self)
+
+
+def _roman_to_int(num):
+    if not isinstance(num, str):
+        raise InvalidPageLabel(f"Not a Roman numeral: {num!r}")
+    text = num.strip()
+    if not text or not _ROMAN_RE.fullmatch(text):
+        raise InvalidPageLabel(f"Not a Roman numeral: {num!r}")
+    text = text.upper()
+    result = 0
+    previous = 0
+    for char in reversed(text):
+        value = ROMAN_VALUES[char]
+        result += -value if value < previous else value
+        previous = max(previous, value)
+    return result
+
+
+@lru_cache(maxsize=LABEL_CACHE_SIZE)
+def roman_to_int(num):
+    """Convert a Roman numeral ("xii", "XII") to an int."""
+    return _roman_to_int(num)
+
+
+def int_to_roman(number, lowercase=False):
+    """Convert 1..4999 to a Roman numeral; lowercase for front-matter style labels."""
+    if isinstance(number, bool) or not isinstance(number, int) or not 0 < number < 5000:
+        raise InvalidPageLabel(f"Cannot write {number!r} as a Roman numeral")
+    parts = []
+    for value, numeral in _ROMAN_NUMERALS:
+        count, number = divmod(number, value)
+        parts.append(numeral * count)
+    result = ''.join(parts)
+    return result.lower() if lowercase else result
+
+
+def _parse_label(label):
+    if isinstance(label, str):
+        try:
+            return False, int(label)    # int() already ignores surrounding whitespace
+        except ValueError:
+            return True, _roman_to_int(label)
+    if isinstance(label, int) and not isinstance(label, bool):
+        return False, label
+    raise InvalidPageLabel(f"Invalid page label: {label!r}")
+
+
+# Sort keys: plain str labels (nearly all of them) skip the (is_roman, value) tuple
+def _reading_key(label):
+    if type(label) is str:
+        try:
+            return int(label)
+        except ValueError:
+            return _roman_to_int(label) - FRONT_MATTER_OFFSET
+    is_roman, value = _parse_label(label)
+    return value - FRONT_MATTER_OFFSET if is_roman else value
+
+
+def _value_key(label):
+    if type(label) is str:
         try:
-            return int(elem)
+            return int(label)
         except ValueError:
-            return roman_to_int(elem)
+            return _roman_to_int(label)
+    return _parse_label(label)[1]
+
+
+@lru_cache(maxsize=LABEL_CACHE_SIZE)
+def parse_page_label(label):
+    """Parse a page label (int, "12", "xii") into (is_roman, value)."""
+    return _parse_label(label)
+
+
+@lru_cache(maxsize=LABEL_CACHE_SIZE)
+def label_value(label):
+    """Numeric value of a label, ignoring whether it is Roman or arabic."""
+    return _value_key(label)
+
+
+@lru_cache(maxsize=LABEL_CACHE_SIZE)
+def page_label_key(label):
+    """Reading-order key: Roman front matter first, then arabic pages."""
+    return _reading_key(label)
 
-    sorted_arr = sorted(arr, key=int_or_roman)
-    return sorted_arr
+
+def label_keys(labels, front_matter_first=True):
+    """Convert a whole list of labels into an array of integer sort keys (uncached, one parse each)."""
+    return array('q', map(_reading_key if front_matter_first else _value_key, labels))
+
+
+def sort_labels(labels, front_matter_first=True):
+    """Sort labels (stable); sorted() computes each uncached key once, like label_keys."""
+    return sorted(labels, key=_reading_key if front_matter_first else _value_key)
+
+
+def roman_sort_with_ints(arr):
+    """
+    Contributed by ChatGPT, who didn't know how to use .upper()
+
+    Sorts by numeric value, mixing Roman and arabic labels ("x" next to 10).
+    Kept for compatibility; see sort_labels for front-matter-first ordering.
+    """
+    return sort_labels(arr, front_matter_first=False)
 
 
 def try_convert_int(item):
@@ -46,6 +154,10 @@ def move_integers_to_end(lst):
 
 
 def move_romans_to_front(arr):
-    arr_sorted = sorted(arr, key=lambda x: isinstance(x, int))
-    arr_sorted.insert(0, arr_sorted.pop(arr_sorted.index(0)))
-    return arr_sorted
+    non_integers = [elem for elem in arr if not isinstance(elem, int)]
+    integers = [elem for elem in arr if isinstance(elem, int)]
+    # Page 0 (cover) leads when present
+    if 0 in integers:
+        integers.remove(0)
+        return [0] + non_integers + integers
+    return non_integers + integers
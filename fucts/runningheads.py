@@ -0,0 +1,221 @@
+"""
+Detecção e remoção de cabeçalhos e rodapés correntes
+
+Muitas páginas do innerPageData começam ou terminam com a mesma linha: o
+título do livro, o do capítulo, o número da página. Essas linhas iam para
+todos os XHTML e para os trechos do sumário.
+
+A detecção é uma passada linear pelas páginas: os primeiros e os últimos
+edge_lines parágrafos (separados por '\\r') de cada página viram uma chave de
+8 bytes (blake2b do texto em minúsculas, com espaços colapsados e números
+trocados por '#', para que "Capítulo 3 | 45" e "Capítulo 3 | 46" coincidam) e
+as chaves são contadas com o algoritmo de Misra-Gries, que guarda no máximo
+`capacity` contadores qualquer que seja o tamanho do livro. Uma linha que
+aparece em mais de 1/capacity das bordas nunca é perdida, e a contagem de
+cada chave fica no máximo (bordas - soma dos contadores)/(capacity + 1) abaixo
+da real; result() soma essa margem antes de comparar com o limiar, para que
+um cabeçalho um pouco acima de min_ratio não fique de fora.
+
+As chaves que passam de min_ratio das páginas formam um RunningLines, que
+remove essas linhas só das bordas de cada página (uma linha igual no meio do
+texto fica). As chaves usam blake2b e não hash() porque a remoção também roda
+nos processos do pool de formatação, onde o hash de str é outro.
+
+Com um HeadingClassifier (headings), as linhas que ele marca como título usam
+o texto exato, sem trocar números por '#': um cabeçalho "Capítulo 3" não leva
+junto a abertura "Capítulo 5" de outro capítulo, e um título só sai da página
+se a mesma linha, idêntica, se repete em min_ratio das páginas (o título do
+livro em maiúsculas, por exemplo).
+"""
+
+import re
+from hashlib import blake2b
+
+# Parágrafos examinados no início e no fim de cada página
+DEFAULT_EDGE_LINES = 2
+
+# Contadores do Misra-Gries (memória fixa da detecção)
+DEFAULT_CAPACITY = 64
+
+# Fração das páginas em que a linha tem que aparecer para ser removida
+DEFAULT_MIN_RATIO = 0.2
+
+# Livros muito curtos: mínimo absoluto de repetições
+DEFAULT_MIN_PAGES = 4
+
+# Linhas mais longas que isto são texto corrido, nunca cabeçalho
+MAX_LINE_LENGTH = 120
+
+_DIGITS_RE = re.compile(r'\d+')
+
+
+def line_key(line, exact=False):
+    """Chave estável (int de 8 bytes) de uma linha de borda, ou None se não pode ser cabeçalho
+
+    Com exact os números não são trocados por '#'.
+    """
+    line = line.strip()
+    if not line or len(line) > MAX_LINE_LENGTH:
+        return None
+    normalized = ' '.join(line.casefold().split())
+    if not exact:
+        normalized = _DIGITS_RE.sub('#', normalized)
+    return int.from_bytes(blake2b(normalized.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def _heading_key(line, headings):
+    """line_key, exata para as linhas que `headings` (HeadingClassifier) marca como título"""
+    return line_key(line, exact=headings is not None and headings.is_heading(line.strip()))
+
+
+def _edge_indexes(count, edge_lines):
+    """Índices dos parágrafos de borda (início e fim, sem repetir)"""
+    head = range(min(edge_lines, count))
+    tail = range(max(count - edge_lines, len(head)), count)
+    return [*head, *tail]
+
+
+class MisraGries:
+    """Itens frequentes de um fluxo com no máximo `capacity` contadores"""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.counts = {}
+        self.total = 0
+
+    def add(self, item):
+        self.total += 1
+        counts = self.counts
+        if item in counts:
+            counts[item] += 1
+        elif len(counts) < self.capacity:
+            counts[item] = 1
+        else:
+            # Desconta um de todos os contadores (o item novo também é descartado)
+            for key in list(counts):
+                counts[key] -= 1
+                if not counts[key]:
+                    del counts[key]
+
+    def __len__(self):
+        return len(self.counts)
+
+    @property
+    def error(self):
+        """Quanto uma contagem pode estar abaixo da real
+
+        Cada rodada de desconto tira 1 de `capacity` contadores e descarta o
+        item novo, então o fluxo perdeu (capacity + 1) por rodada.
+        """
+        return (self.total - sum(self.counts.values())) // (self.capacity + 1)
+
+    def frequent(self, min_count):
+        """Itens cuja contagem real pode chegar a min_count (contagem aproximada + error)"""
+        error = self.error
+        return {item: count for item, count in self.counts.items() if count + error >= min_count}
+
+
+class RunningLines:
+    """Conjunto de linhas correntes detectadas; remove-as das bordas das páginas"""
+
+    __slots__ = ('keys', 'edge_lines', 'pages', 'counts', 'headings')
+
+    def __init__(self, keys=(), edge_lines=DEFAULT_EDGE_LINES, pages=0, counts=None, headings=None):
+        self.keys = frozenset(keys)
+        self.edge_lines = edge_lines
+        self.pages = pages
+        self.counts = counts or {}
+        self.headings = headings
+
+    def __bool__(self):
+        return bool(self.keys)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __reduce__(self):
+        # Só as chaves (e o classificador) vão para os processos do pool
+        return (RunningLines, (self.keys, self.edge_lines, 0, None, self.headings))
+
+    def fingerprint(self):
+        """Valor estável para o hash do build (ver build_fingerprints)
+
+        Inclui as regras do classificador: com headings, quais linhas saem da
+        página depende delas.
+        """
+        headings = self.headings
+        return [self.edge_lines, sorted(self.keys),
+                [headings.keywords, headings.uppercase_max_length] if headings is not None else None]
+
+    def running_indexes(self, blocks):
+        """Índices dos blocos (lista de textos) que são linhas correntes
+
+        Só os edge_lines primeiros e últimos blocos não vazios são examinados.
+        """
+        if not self.keys or not blocks:
+            return set()
+        filled = [i for i, block in enumerate(blocks) if block.strip()]
+        return {filled[i] for i in _edge_indexes(len(filled), self.edge_lines)
+                if _heading_key(blocks[filled[i]], self.headings) in self.keys}
+
+    def strip_blocks(self, blocks):
+        """(blocos sem as linhas correntes das bordas, bytes removidos)"""
+        drop = self.running_indexes(blocks)
+        if not drop:
+            return blocks, 0
+        removed = sum(len(blocks[i].encode('utf-8')) for i in drop)
+        return [block for i, block in enumerate(blocks) if i not in drop], removed
+
+    def strip(self, words):
+        """(words sem as linhas correntes das bordas, bytes removidos)"""
+        if not self.keys or not words:
+            return words, 0
+        paragraphs, removed = self.strip_blocks(words.split('\r'))
+        if not removed:
+            return words, 0
+        return '\r'.join(paragraphs), removed
+
+
+class RunningLineDetector:
+    """Conta as linhas de borda das páginas numa passada, com memória fixa"""
+
+    def __init__(self, edge_lines=DEFAULT_EDGE_LINES, capacity=DEFAULT_CAPACITY, min_ratio=DEFAULT_MIN_RATIO,
+                 min_pages=DEFAULT_MIN_PAGES, headings=None):
+        self.edge_lines = edge_lines
+        self.min_ratio = min_ratio
+        self.min_pages = min_pages
+        self.headings = headings
+        self.pages = 0
+        self._counter = MisraGries(capacity)
+
+    def observe(self, words):
+        """Conta as linhas de borda de uma página (texto do words)"""
+        if not words:
+            return
+        self.pages += 1
+        paragraphs = [para for para in words.split('\r') if para.strip()]
+        seen = set()
+        for i in _edge_indexes(len(paragraphs), self.edge_lines):
+            key = _heading_key(paragraphs[i], self.headings)
+            # A mesma linha duas vezes na borda da página conta uma vez só
+            if key is not None and key not in seen:
+                seen.add(key)
+                self._counter.add(key)
+
+    def observe_pages(self, pages):
+        for page_data in pages:
+            if page_data:
+                self.observe(page_data.get('words'))
+
+    def result(self):
+        """RunningLines com as linhas que passaram do limiar"""
+        min_count = max(self.min_pages, self.min_ratio * self.pages)
+        counts = self._counter.frequent(min_count)
+        return RunningLines(counts, self.edge_lines, self.pages, counts, self.headings)
+
+
+def detect_running_lines(pages, **options):
+    """Detecta as linhas correntes de uma sequência de registros de página"""
+    detector = RunningLineDetector(**options)
+    detector.observe_pages(pages)
+    return detector.result()
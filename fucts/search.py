@@ -0,0 +1,185 @@
+"""
+Índice de busca em texto completo (SQLite FTS5) dos livros convertidos
+
+Um único arquivo .sqlite pode guardar muitos livros: o build com --index
+acrescenta (ou substitui) as páginas do livro, identificadas por ISBN, rótulo
+impresso e capítulo, no mesmo passo em que as páginas são formatadas. A busca
+(subcomando search) consulta só o índice, sem abrir os EPUBs.
+
+    vitalepub.py build --input paginas.jsonl --output livro.epub --isbn 978... --index livros.sqlite
+    vitalepub.py search --index livros.sqlite "equação do segundo grau"
+"""
+
+import re
+import sqlite3
+from collections import namedtuple
+from datetime import datetime, timezone
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS books (
+    isbn TEXT PRIMARY KEY,
+    title TEXT,
+    epub TEXT,
+    page_count INTEGER,
+    indexed_at TEXT,
+    first_rowid INTEGER,
+    last_rowid INTEGER
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS pages USING fts5(
+    text,
+    isbn UNINDEXED,
+    label UNINDEXED,
+    chapter UNINDEXED,
+    page_number UNINDEXED,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+'''
+
+# Linhas acumuladas antes de cada executemany
+BATCH_SIZE = 500
+
+SearchHit = namedtuple('SearchHit', 'isbn title label chapter page_number snippet')
+
+_TOKEN_RE = re.compile(r'\w+')
+
+
+def _quoted_query(query):
+    """Consulta FTS5 segura: cada palavra vira uma frase entre aspas (todas obrigatórias)"""
+    return ' '.join(f'"{token}"' for token in _TOKEN_RE.findall(query))
+
+
+class SearchIndex:
+    """Índice FTS5 de páginas, compartilhado entre vários livros"""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._db = sqlite3.connect(self.path)
+        self._db.executescript(SCHEMA)
+        self._batch = []
+        self._isbn = None
+        self._count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._db.rollback()
+            self._db.close()
+
+    def begin_book(self, isbn, title=None, epub=None):
+        """Começa (ou recomeça) a indexação de um livro, apagando as páginas antigas dele
+        
+        As páginas de um livro são gravadas em sequência, então ocupam uma faixa
+        contínua de rowids e podem ser apagadas sem varrer o índice inteiro.
+        """
+        self._flush()
+        self._isbn = str(isbn)
+        self._count = 0
+        previous = self._db.execute('SELECT first_rowid, last_rowid FROM books WHERE isbn = ?',
+                                    (self._isbn,)).fetchone()
+        if previous and previous[0] is not None:
+            self._db.execute('DELETE FROM pages WHERE rowid BETWEEN ? AND ?', previous)
+        first_rowid = self._db.execute('SELECT coalesce(max(rowid), 0) + 1 FROM pages').fetchone()[0]
+        self._db.execute(
+            'INSERT OR REPLACE INTO books (isbn, title, epub, page_count, indexed_at, first_rowid) '
+            'VALUES (?, ?, ?, 0, ?, ?)',
+            (self._isbn, title, epub, datetime.now(timezone.utc).isoformat(timespec='seconds'), first_rowid)
+        )
+
+    def add_page(self, page_number, label, chapter, text):
+        """Acrescenta uma página do livro corrente (gravada em lotes)"""
+        if not text:
+            return
+        self._batch.append((text, self._isbn, str(label), chapter, page_number))
+        self._count += 1
+        if len(self._batch) >= BATCH_SIZE:
+            self._flush()
+
+    def _flush(self):
+        if self._batch:
+            self._db.executemany(
+                'INSERT INTO pages (text, isbn, label, chapter, page_number) VALUES (?, ?, ?, ?, ?)', self._batch
+            )
+            self._batch = []
+
+    def abort_book(self):
+        """Descarta o livro corrente (build que falhou no meio)"""
+        self._batch = []
+        self._isbn = None
+        self._db.rollback()
+
+    def end_book(self):
+        """Grava as páginas pendentes e confirma o livro corrente"""
+        self._flush()
+        if self._isbn is not None:
+            self._db.execute(
+                'UPDATE books SET page_count = ?, last_rowid = (SELECT max(rowid) FROM pages) WHERE isbn = ?',
+                (self._count, self._isbn)
+            )
+        self._db.commit()
+        self._isbn = None
+        return self._count
+
+    def merge(self, path):
+        """Copia para este índice os livros de outro arquivo de índice
+
+        Usado pelo batch: cada processo indexa o seu livro num arquivo próprio
+        (o SQLite só aceita um escritor por vez) e o processo principal junta.
+        """
+        self._flush()
+        self._db.commit()
+        self._db.execute('ATTACH DATABASE ? AS other', (str(path),))
+        try:
+            books = self._db.execute('SELECT isbn, title, epub, first_rowid, last_rowid FROM other.books').fetchall()
+            for isbn, title, epub, first_rowid, last_rowid in books:
+                self.begin_book(isbn, title, epub)
+                cursor = self._db.execute(
+                    'INSERT INTO pages (text, isbn, label, chapter, page_number) '
+                    'SELECT text, isbn, label, chapter, page_number FROM other.pages '
+                    'WHERE rowid BETWEEN ? AND ? ORDER BY rowid', (first_rowid or 0, last_rowid or -1)
+                )
+                self._count = cursor.rowcount
+                self.end_book()
+        finally:
+            self._db.execute('DETACH DATABASE other')
+        return len(books)
+
+    def optimize(self):
+        """Junta os segmentos do índice (vale a pena depois de indexar muitos livros)"""
+        self._db.execute("INSERT INTO pages (pages) VALUES ('optimize')")
+        self._db.commit()
+
+    def search(self, query, limit=20, isbn=None):
+        """Páginas que contêm `query` (sintaxe FTS5), das mais relevantes para as menos"""
+        sql = (
+            "SELECT pages.isbn, books.title, pages.label, pages.chapter, pages.page_number, "
+            "snippet(pages, 0, '[', ']', '…', 12) "
+            "FROM pages LEFT JOIN books ON books.isbn = pages.isbn "
+            "WHERE pages MATCH ?"
+        )
+        params = [query]
+        if isbn is not None:
+            sql += ' AND pages.isbn = ?'
+            params.append(str(isbn))
+        sql += ' ORDER BY rank LIMIT ?'
+        params.append(limit)
+        try:
+            rows = self._db.execute(sql, params).fetchall()
+        except sqlite3.OperationalError:
+            # Aspas, parênteses ou operadores soltos na consulta: busca pelas palavras
+            params[0] = _quoted_query(query)
+            if not params[0]:
+                return []
+            rows = self._db.execute(sql, params).fetchall()
+        return [SearchHit(*row) for row in rows]
+
+    def books(self):
+        return self._db.execute('SELECT isbn, title, page_count, indexed_at FROM books ORDER BY isbn').fetchall()
+
+    def close(self):
+        self._flush()
+        self._db.commit()
+        self._db.close()
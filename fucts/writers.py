@@ -0,0 +1,191 @@
+"""
+Saídas sem EPUB: texto puro, Markdown e JSONL
+
+O builder do EPUB serializa cada página em XHTML e monta o ZIP; para indexar
+ou comparar versões de um livro isso é trabalho jogado fora. Estes writers
+recebem o mesmo fluxo de páginas já quebradas em parágrafos (ParsedPage, ver
+MinhaBliotecaEpubExtractor.parse_page) e gravam cada página assim que ela
+chega, então a memória não cresce com o livro:
+
+    txt               parágrafos separados por linha em branco, páginas por \\f
+    md                # título, ## capítulo, ### títulos, âncoras <a id> das páginas
+    jsonl             um objeto por página: page_number, label, chapter, blocks
+    jsonl-paragraphs  um objeto por parágrafo: page_number, label, chapter, index, tag, text
+
+    vitalepub.py build --input paginas.jsonl --output livro.md --isbn 978...
+
+O formato sai da extensão da saída ou de --format. Como no EPUB, o arquivo é
+gravado em SAÍDA.tmp e só substitui a saída no fim; um erro no meio não deixa
+um arquivo truncado no lugar dela.
+"""
+
+import json
+import os
+import re
+from abc import ABC, abstractmethod
+from collections import namedtuple
+from pathlib import Path
+
+# Página quebrada em blocos (tag, texto), sem XHTML. break_at é (índice do bloco,
+# posição no texto) onde a página seguinte começa, quando o último parágrafo
+# continua nela (--reflow); stripped conta os bytes de linhas correntes removidas.
+ParsedPage = namedtuple('ParsedPage', 'page_number label chapter blocks stripped break_at',
+                        defaults=(0, None))
+
+# Buffer dos arquivos de saída
+BUFFER_SIZE = 1024 * 1024
+
+# Início de linha que o Markdown leria como título, citação, lista ou bloco de código
+_MARKDOWN_BLOCK_RE = re.compile(r'^(\s*)([#>+*-]|\d+[.)]|=+$|`{3})')
+
+
+def page_anchor(page_number):
+    """Id da âncora de uma página (o mesmo do <div> da página no EPUB)"""
+    return f'page_{page_number:03d}'
+
+
+class PageWriter(ABC):
+    """Grava páginas em ordem num arquivo, uma a uma; subclasses definem format_page"""
+
+    def __init__(self, path, title=None):
+        self.path = Path(path)
+        self.title = title
+        self.pages = 0
+        self.paragraphs = 0
+        self._tmp_path = self.path.with_name(self.path.name + '.tmp')
+        self._file = open(self._tmp_path, 'w', encoding='utf-8', newline='\n', buffering=BUFFER_SIZE)
+        self.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+            # Saída incompleta: não substitui a anterior
+            try:
+                os.remove(self._tmp_path)
+            except FileNotFoundError:
+                pass
+
+    def start(self):
+        """Cabeçalho do arquivo (antes da primeira página)"""
+
+    def write_page(self, page):
+        self.pages += 1
+        self.paragraphs += len(page.blocks)
+        self._file.write(self.format_page(page))
+
+    @abstractmethod
+    def format_page(self, page):
+        """Texto de uma ParsedPage no formato do writer"""
+
+    def close(self):
+        """Fecha o arquivo e o move para o caminho final"""
+        if not self._file.closed:
+            self._file.close()
+            os.replace(self._tmp_path, self.path)
+
+
+class TextWriter(PageWriter):
+    """Texto puro: um parágrafo por linha, separados por linha em branco; \\f entre páginas"""
+
+    def start(self):
+        if self.title:
+            self._file.write(f'{self.title}\n\n')
+
+    def format_page(self, page):
+        text = '\n\n'.join(text for _, text in page.blocks)
+        return f'{text}\n\f\n' if text else '\f\n'
+
+
+def _markdown_inline(text):
+    """Escapa & e < para o texto não virar entidade nem tag HTML no Markdown"""
+    return text.replace('&', '&amp;').replace('<', '&lt;')
+
+
+def _markdown_text(text):
+    return _MARKDOWN_BLOCK_RE.sub(r'\1\\\2', _markdown_inline(text))
+
+
+class MarkdownWriter(PageWriter):
+    """Markdown: ## a cada novo capítulo, ### para títulos e âncoras HTML das páginas"""
+
+    def __init__(self, path, title=None):
+        self._chapter = None
+        super().__init__(path, title)
+
+    def start(self):
+        if self.title:
+            self._file.write(f'# {_markdown_text(self.title)}\n\n')
+
+    def format_page(self, page):
+        parts = []
+        if page.chapter and page.chapter != self._chapter:
+            self._chapter = page.chapter
+            parts.append(f'## {_markdown_text(page.chapter)}')
+        parts.append(f'<a id="{page_anchor(page.page_number)}"></a>')
+        for i, (tag, text) in enumerate(page.blocks):
+            if page.break_at is not None and page.break_at[0] == i:
+                # Âncora no ponto em que a página seguinte começa (--reflow)
+                offset = page.break_at[1]
+                anchor = f'<a id="{page_anchor(page.page_number + 1)}_start"></a>'
+                text = _markdown_text(text[:offset]) + anchor + _markdown_inline(text[offset:])
+            else:
+                text = _markdown_text(text)
+            parts.append(f'### {text}' if tag == 'h2' else text)
+        return '\n\n'.join(parts) + '\n\n'
+
+
+class JsonlWriter(PageWriter):
+    """JSONL: um objeto por página, ou por parágrafo com per_paragraph"""
+
+    def __init__(self, path, title=None, per_paragraph=False):
+        self.per_paragraph = per_paragraph
+        super().__init__(path, title)
+
+    def format_page(self, page):
+        if not self.per_paragraph:
+            record = {'page_number': page.page_number, 'label': page.label, 'chapter': page.chapter,
+                      'blocks': page.blocks}
+            return json.dumps(record, ensure_ascii=False) + '\n'
+        return ''.join(
+            json.dumps({'page_number': page.page_number, 'label': page.label, 'chapter': page.chapter,
+                        'index': i, 'tag': tag, 'text': text}, ensure_ascii=False) + '\n'
+            for i, (tag, text) in enumerate(page.blocks)
+        )
+
+
+# Formato -> (classe, opções)
+WRITERS = {
+    'txt': (TextWriter, {}),
+    'md': (MarkdownWriter, {}),
+    'jsonl': (JsonlWriter, {}),
+    'jsonl-paragraphs': (JsonlWriter, {'per_paragraph': True}),
+}
+
+# Todos os formatos aceitos em --format (epub é o builder de sempre)
+OUTPUT_FORMATS = ('epub', *WRITERS)
+
+_EXTENSIONS = {'.epub': 'epub', '.txt': 'txt', '.md': 'md', '.markdown': 'md', '.jsonl': 'jsonl'}
+
+# Sufixo das saídas geradas a partir do nome do dump (batch); os JSONL levam um
+# sufixo próprio para não sobrescrever nem serem lidos como dumps de páginas
+OUTPUT_SUFFIXES = {'epub': '.epub', 'txt': '.txt', 'md': '.md', 'jsonl': '.text.jsonl',
+                   'jsonl-paragraphs': '.paragraphs.jsonl'}
+
+
+def format_for_path(path, default='epub'):
+    """Formato deduzido da extensão do arquivo de saída"""
+    return _EXTENSIONS.get(Path(path).suffix.lower(), default)
+
+
+def open_writer(output_format, path, title=None):
+    """Cria o writer do formato (ValueError para formato desconhecido ou epub)"""
+    try:
+        writer_class, options = WRITERS[output_format]
+    except KeyError:
+        raise ValueError(f"Formato de saída sem writer: {output_format}") from None
+    return writer_class(path, title, **options)
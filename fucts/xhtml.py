@@ -0,0 +1,75 @@
+"""
+Serializador XHTML mínimo
+
+Todo valor de texto passa por escape() e todo trecho já serializado é Markup,
+então o documento sai bem-formado por construção e não precisa ser
+re-parseado (a validação com lxml fica opcional, ver validate_document).
+"""
+
+import html
+import re
+
+# Caracteres proibidos em XML 1.0 (controles exceto \t \n \r, surrogates, U+FFFE/U+FFFF)
+_INVALID_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ud800-\udfff\ufffe\uffff]')
+
+
+class Markup(str):
+    """Trecho XHTML já serializado, inserido sem novo escape"""
+    __slots__ = ()
+
+
+def escape(value):
+    """Escapa texto para XHTML, removendo caracteres inválidos em XML"""
+    if isinstance(value, Markup):
+        return value
+    value = _INVALID_XML_CHARS.sub('', str(value))
+    return Markup(html.escape(value, quote=True))
+
+
+def escape_valid(value):
+    """Escapa texto que já não tem caracteres inválidos em XML (saída de clean_text)"""
+    if isinstance(value, Markup):
+        return value
+    return Markup(html.escape(value, quote=True))
+
+
+def join(parts, separator='\n'):
+    """Junta trechos (texto é escapado, Markup é mantido)"""
+    return Markup(separator.join(escape(part) for part in parts))
+
+
+def element(tag, *children, **attrs):
+    """Serializa <tag attrs>children</tag>; use class_ para o atributo class"""
+    attributes = ''.join(
+        f' {name.rstrip("_").replace("_", "-")}="{escape(value)}"'
+        for name, value in attrs.items() if value is not None
+    )
+    if not children:
+        return Markup(f'<{tag}{attributes}/>')
+    return Markup(f'<{tag}{attributes}>{join(children, "")}</{tag}>')
+
+
+def page_document(title, body, lang='pt-br', stylesheet=None):
+    """Monta um documento XHTML completo para o EPUB"""
+    link = ''
+    if stylesheet:
+        link = '\n    ' + element('link', rel='stylesheet', type='text/css', href=stylesheet)
+    lang = escape(lang)
+    return (
+        "<?xml version='1.0' encoding='utf-8'?>\n"
+        '<!DOCTYPE html>\n'
+        f'<html xmlns="http://www.w3.org/1999/xhtml" lang="{lang}" xml:lang="{lang}">\n'
+        '<head>\n'
+        f'    <title>{escape(title)}</title>{link}\n'
+        '</head>\n'
+        '<body>\n'
+        f'{join(body)}\n'
+        '</body>\n'
+        '</html>'
+    )
+
+
+def validate_document(document):
+    """Confere com lxml que o documento é XML bem-formado (levanta erro se não for)"""
+    from lxml import etree
+    etree.fromstring(document.encode('utf-8'))
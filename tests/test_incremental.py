@@ -0,0 +1,75 @@
+"""
+Testes do build incremental (--previous): fingerprints por etapa e reaproveitamento
+"""
+
+from zipfile import ZipFile
+
+import pytest
+
+from fucts.epubwriter import compression_level
+from fucts.headings import DEFAULT_HEADING_RULES
+from fucts.incremental import BuildManifest, PreviousBuild, manifest_path_for
+from vitalepub import MinhaBliotecaEpubExtractor
+
+PAGES = [{'words': f'Texto corrido da página {n}.\rExemplo {n} de parágrafo com texto suficiente.\rFim.',
+          'chapterTitle': f'Cap {(n - 1) // 5 + 1}', 'page': str(n)} for n in range(1, 21)]
+PAGES[3]['words'] = 'Texto corrido da página 4, sem o parágrafo de exemplo.\rFim.'
+
+EDITED_RULES = {**DEFAULT_HEADING_RULES, 'keywords': [*DEFAULT_HEADING_RULES['keywords'], 'Exemplo']}
+
+
+def _build(output, heading_rules=None, **options):
+    extractor = MinhaBliotecaEpubExtractor(heading_rules=heading_rules)
+    assert extractor.create_epub_from_data('1', output, 'Livro', pages=iter(PAGES), **options)
+
+
+def _documents(path):
+    with ZipFile(path) as epub:
+        return {name: epub.read(name) for name in epub.namelist() if name.endswith('.xhtml')}
+
+
+@pytest.fixture
+def previous(tmp_path):
+    path = tmp_path / 'anterior.epub'
+    _build(path, manifest_path=manifest_path_for(path))
+    return path
+
+
+def test_heading_rule_edit_only_reclassifies(tmp_path, previous):
+    extractor = MinhaBliotecaEpubExtractor(heading_rules=EDITED_RULES)
+    build = PreviousBuild.open(previous, extractor.build_fingerprints(), compression_level(None))
+    try:
+        assert build.same_text and not build.same_headings
+        # A página sem "Exemplo" sai igual e é reaproveitada inteira
+        _, reused, _, _ = extractor._cached_page(4, PAGES[3], build)
+        assert reused is not None and reused.body is None
+        # Nas outras o parágrafo vira título: formatada de novo, a partir do PageText salvo
+        _, reused, page_text, tags = extractor._cached_page(1, PAGES[0], build)
+        assert reused is None and page_text is not None and 'h2' in tags
+    finally:
+        build.close()
+
+    _build(tmp_path / 'completo.epub', EDITED_RULES)
+    _build(tmp_path / 'incremental.epub', EDITED_RULES, previous=previous)
+    assert _documents(tmp_path / 'incremental.epub') == _documents(tmp_path / 'completo.epub')
+
+
+def test_unchanged_rebuild_copies_every_document(tmp_path, previous):
+    output = tmp_path / 'novo.epub'
+    _build(output, previous=previous)
+    assert _documents(output) == _documents(previous)
+    manifest = BuildManifest.load(manifest_path_for(output))
+    assert manifest.texts == BuildManifest.load(manifest_path_for(previous)).texts
+
+
+def test_other_compresslevel_is_not_copied(previous):
+    extractor = MinhaBliotecaEpubExtractor()
+    manifest = BuildManifest.load(manifest_path_for(previous))
+    input_hash = manifest.documents['page_001.xhtml']['input']
+    for level, copied in ((manifest.compresslevel, True), (1, False)):
+        build = PreviousBuild(previous, manifest, extractor.build_fingerprints(), level)
+        try:
+            assert (build.raw_document('page_001.xhtml', input_hash=input_hash) is not None) == copied
+            assert build.raw_document('page_001.xhtml', input_hash='outro') is None
+        finally:
+            build.close()
@@ -0,0 +1,31 @@
+"""
+Testes do motor de layout por glifos (fucts/layout.py) com as páginas sintéticas
+"""
+
+import pytest
+
+pytest.importorskip('numpy')
+
+from benchmarks.synthetic import iter_synthetic_glyph_pages
+from fucts import layout
+from vitalepub import MinhaBliotecaEpubExtractor
+
+
+def test_blocks_follow_the_glyph_layout():
+    page = next(iter_synthetic_glyph_pages(1, columns=1, column_lines=100))
+    heading, *paragraphs = page['words'].split('\r')
+    assert layout.reconstruct_blocks(page[layout.GLYPHS_KEY]) == [('h2', heading), *(('p', p) for p in paragraphs)]
+
+
+def test_second_column_starts_a_new_block():
+    page = next(iter_synthetic_glyph_pages(1, paragraphs_per_page=1, sentences_per_paragraph=12, column_lines=5))
+    glyphs = page[layout.GLYPHS_KEY]
+    assert max(glyphs['x']) > 40 * 5        # o parágrafo passa para a segunda coluna
+    assert [tag for tag, _ in layout.reconstruct_blocks(glyphs)] == ['h2', 'p', 'p']
+
+
+def test_invalid_glyphs_fall_back_to_the_text():
+    page = next(iter_synthetic_glyph_pages(1))
+    glyphs = {**page[layout.GLYPHS_KEY], 'x': page[layout.GLYPHS_KEY]['x'][:-1]}
+    blocks = MinhaBliotecaEpubExtractor().parse_paragraphs(page['words'], 1, glyphs)
+    assert [text for _, text in blocks] == page['words'].split('\r')
@@ -0,0 +1,222 @@
+"""
+Testes da lógica de parsing: hifenização, rótulos de página, intervalos do
+PageFile e a âncora deixada pelo --reflow
+
+    python -m pytest -q
+"""
+
+import random
+import re
+from zipfile import ZipFile
+
+import pytest
+
+from fucts import roman
+from fucts.headings import HeadingClassifier
+from fucts.normalize import TextNormalizer
+from fucts.pagefile import PageFile
+from fucts.reflow import CONTINUATION_KEY, break_anchor, reflow_pages
+from fucts.runningheads import RunningLineDetector, detect_running_lines, line_key
+from vitalepub import MinhaBliotecaEpubExtractor, save_pages
+
+
+# TextNormalizer: hífen no fim da linha
+
+@pytest.fixture
+def normalizer():
+    return TextNormalizer.from_rules()
+
+
+def test_line_break_hyphen_is_removed(normalizer):
+    assert normalizer.normalize('compu-\ntador') == 'computador'
+
+
+def test_soft_hyphen_is_removed(normalizer):
+    assert normalizer.normalize('compu\u00ad\ntador') == 'computador'
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('guarda-\nchuva', 'guarda-chuva'),     # composto da lista hyphenated_words
+    ('dá-\nlhe', 'dá-lhe'),                 # clítico
+    ('bem-te-\nvi', 'bem-te-vi'),           # composto já hifenizado antes da quebra
+    ('Rio-\nGrande', 'Rio-Grande'),         # fragmento seguinte em maiúscula
+])
+def test_real_hyphen_is_kept(normalizer, text, expected):
+    assert normalizer.normalize(text) == expected
+
+
+def test_hyphen_inside_a_line_is_untouched(normalizer):
+    assert normalizer.normalize('guarda-chuva e compu-tador') == 'guarda-chuva e compu-tador'
+
+
+def test_dehyphenate_off_keeps_the_break():
+    assert TextNormalizer(dehyphenate=False).normalize('compu-\ntador') == 'compu-\ntador'
+
+
+def test_multi_char_rule_key_is_rejected():
+    with pytest.raises(ValueError):
+        TextNormalizer(replace={'ab': 'x'})
+
+
+# roman: rótulos de página
+
+@pytest.mark.parametrize('numeral, value', [('i', 1), ('IV', 4), ('xii', 12), ('MCMXCIV', 1994), (' xl ', 40)])
+def test_roman_to_int(numeral, value):
+    assert roman.roman_to_int(numeral) == value
+
+
+@pytest.mark.parametrize('numeral', ['', 'IIII', 'IC', 'VX', 'abc', '12', None, 3])
+def test_roman_to_int_rejects_invalid(numeral):
+    with pytest.raises(roman.InvalidPageLabel):
+        roman.roman_to_int(numeral)
+
+
+def test_invalid_label_is_value_and_key_error():
+    for error in (ValueError, KeyError):
+        with pytest.raises(error):
+            roman.parse_page_label('p. 3')
+
+
+def test_int_to_roman_round_trip():
+    for number in (1, 4, 9, 14, 40, 90, 400, 1994, 4999):
+        assert roman.roman_to_int(roman.int_to_roman(number)) == number
+    assert roman.int_to_roman(12, lowercase=True) == 'xii'
+    with pytest.raises(roman.InvalidPageLabel):
+        roman.int_to_roman(0)
+
+
+def test_parse_page_label():
+    assert roman.parse_page_label('12') == (False, 12)
+    assert roman.parse_page_label('xii') == (True, 12)
+    assert roman.parse_page_label(7) == (False, 7)
+    with pytest.raises(roman.InvalidPageLabel):
+        roman.parse_page_label(True)
+
+
+def test_sort_labels():
+    labels = ['3', 'ii', '1', 'x', '2', 'i']
+    assert roman.sort_labels(labels) == ['i', 'ii', 'x', '1', '2', '3']
+    assert roman.sort_labels(labels, front_matter_first=False) == ['1', 'i', 'ii', '2', '3', 'x']
+    assert list(roman.label_keys(labels)) == [roman.page_label_key(label) for label in labels]
+
+
+# PageFile: limites de --pages
+
+@pytest.fixture
+def page_file(tmp_path):
+    path = tmp_path / 'pages.jsonl'
+    save_pages(({'words': f'Texto da página {n}.', 'chapterTitle': f'Cap {(n - 1) // 4 + 1}', 'page': str(n)}
+                for n in range(1, 11)), path)
+    with PageFile(path) as pages:
+        yield pages
+
+
+def test_page_range_clamps_the_end(page_file):
+    assert page_file.page_range(8, 400) == (8, 10)
+    assert page_file.page_range(3) == (3, 10)
+    assert [page['page'] for page in page_file.pages(8, 400)] == ['8', '9', '10']
+
+
+def test_page_range_rejects_start_past_the_end(page_file):
+    with pytest.raises(IndexError):
+        page_file.page_range(11, 20)
+    with pytest.raises(IndexError):
+        page_file.pages(11)
+
+
+@pytest.mark.parametrize('start, end', [(0, 5), (5, 4)])
+def test_page_range_rejects_invalid_ranges(page_file, start, end):
+    with pytest.raises(IndexError):
+        page_file.page_range(start, end)
+
+
+def test_chapter_range(page_file):
+    assert page_file.chapter_range('Cap 2') == (5, 8)
+    with pytest.raises(KeyError):
+        page_file.chapter_range('Cap 9')
+
+
+# reflow: âncora da virada e page-list
+
+CUT_PAGES = [
+    {'words': 'Primeiro parágrafo completo.\rO texto continua na compu-', 'chapterTitle': 'Cap 1', 'page': '1'},
+    {'words': 'tador seguinte e termina aqui.\rOutro parágrafo.', 'chapterTitle': 'Cap 1', 'page': '2'},
+]
+
+
+def test_reflow_moves_the_cut_paragraph():
+    stats = {}
+    first, second = reflow_pages(iter(CUT_PAGES), stats=stats)
+    assert first['words'].endswith('O texto continua na compu')
+    assert first[CONTINUATION_KEY] == {'words': 'tador seguinte e termina aqui.', 'page': '2', 'separator': '',
+                                       'hyphen': '-'}
+    assert second['words'] == 'Outro parágrafo.'
+
+
+def test_reflow_leaves_finished_paragraphs_alone():
+    pages = [{**CUT_PAGES[0], 'words': 'Parágrafo terminado.'}, CUT_PAGES[1]]
+    assert list(reflow_pages(iter(pages))) == pages
+
+
+def test_reflow_restores_the_hyphen_after_a_heading():
+    # O último bloco da página é um título: o trecho não entra nele e o hífen volta
+    pages = [{**CUT_PAGES[0], 'words': 'Primeiro parágrafo completo.\rO ESTUDO DA COMPU-'}, CUT_PAGES[1]]
+    first, _ = reflow_pages(iter(pages))
+    parsed = MinhaBliotecaEpubExtractor().parse_page(1, first)
+    assert parsed.blocks[-2:] == [('h2', 'O ESTUDO DA COMPU-'), ('p', 'tador seguinte e termina aqui.')]
+    assert parsed.break_at == (len(parsed.blocks) - 1, 0)
+
+
+def test_reflow_soft_hyphen_comes_back_as_a_hyphen():
+    pages = [{**CUT_PAGES[0], 'words': 'O ESTUDO DA COMPU\u00ad'}, CUT_PAGES[1]]
+    first, _ = reflow_pages(iter(pages))
+    assert first[CONTINUATION_KEY]['hyphen'] == '-'
+
+
+def test_reflow_anchor_in_page_list(tmp_path):
+    output = tmp_path / 'reflow.epub'
+    extractor = MinhaBliotecaEpubExtractor()
+    assert extractor.create_epub_from_data('1', output, 'Livro', pages=iter(CUT_PAGES), reflow=True)
+    with ZipFile(output) as epub:
+        page = epub.read('EPUB/page_001.xhtml').decode('utf-8')
+        nav = epub.read('EPUB/nav.xhtml').decode('utf-8')
+    anchor = break_anchor(2)
+    assert re.search(rf'compu<span id="{anchor}" class="page-break" title="Página 2"/>tador seguinte', page)
+    page_list = nav[nav.index('epub:type="page-list"'):]
+    assert f'href="page_001.xhtml#{anchor}">2<' in page_list
+    assert 'href="page_001.xhtml#page_001">1<' in page_list
+
+
+# runningheads: detecção das linhas correntes
+
+def _noisy_pages(count, ratio, header, seed):
+    """Páginas com bordas únicas e `header` no topo de cerca de `ratio` delas"""
+    rng = random.Random(seed)
+    for _ in range(count):
+        lines = [''.join(rng.choice('abcdefghijklmnop') for _ in range(8)) for _ in range(4)]
+        if rng.random() < ratio:
+            lines[0] = header
+        yield {'words': '\r'.join([*lines[:2], 'corpo da página', *lines[2:]])}
+
+
+def test_header_just_above_min_ratio_is_detected():
+    header = 'Introdução à Física Moderna'
+    pages = list(_noisy_pages(1000, 0.22, header, seed=3))
+    assert sum(page['words'].startswith(header) for page in pages) > 200
+    detector = RunningLineDetector()
+    detector.observe_pages(pages)
+    # A contagem do Misra-Gries fica abaixo do limiar; a margem de erro o alcança
+    assert detector._counter.counts[line_key(header)] < 0.2 * detector.pages
+    assert line_key(header) in detector.result().keys
+
+
+def test_chapter_opener_is_not_stripped_as_running_head():
+    pages = [{'words': f'Capítulo {1 + i // 20}\rTexto da página.\rFim da página {i}.'} for i in range(200)]
+    opener = 'Capítulo 5\rComeça o capítulo.\rFim.'
+    assert detect_running_lines(pages).strip(opener)[0] == 'Começa o capítulo.\rFim.'
+    running_lines = detect_running_lines(pages, headings=HeadingClassifier.from_rules())
+    assert running_lines.strip(opener) == (opener, 0)
+    # Um título idêntico em muitas páginas (o do livro) continua sendo removido
+    pages = [{'words': f'LIVRO DE TESTE\rTexto da página {i}.\rFim.'} for i in range(50)]
+    running_lines = detect_running_lines(pages, headings=HeadingClassifier.from_rules())
+    assert running_lines.strip('LIVRO DE TESTE\rCorpo.\rFim.')[0] == 'Corpo.'
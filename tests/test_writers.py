@@ -0,0 +1,35 @@
+"""
+Testes dos writers de fucts/writers.py (saídas txt, md e jsonl)
+"""
+
+import pytest
+
+from fucts.writers import ParsedPage, open_writer
+
+PAGE = ParsedPage(1, '1', 'Cap 1', [('h2', 'Título'), ('p', 'A & <b> texto.')])
+
+
+@pytest.mark.parametrize('output_format, name', [('txt', 'livro.txt'), ('md', 'livro.md'), ('jsonl', 'livro.jsonl')])
+def test_output_replaced_only_on_success(tmp_path, output_format, name):
+    output = tmp_path / name
+    output.write_text('anterior', encoding='utf-8')
+    with pytest.raises(RuntimeError):
+        with open_writer(output_format, output, 'Livro') as writer:
+            writer.write_page(PAGE)
+            raise RuntimeError('falha no meio')
+    assert output.read_text(encoding='utf-8') == 'anterior'
+    assert [path.name for path in tmp_path.iterdir()] == [name]
+
+    with open_writer(output_format, output, 'Livro') as writer:
+        writer.write_page(PAGE)
+    assert output.read_text(encoding='utf-8') != 'anterior'
+    assert [path.name for path in tmp_path.iterdir()] == [name]
+
+
+def test_markdown_escapes_html(tmp_path):
+    output = tmp_path / 'livro.md'
+    with open_writer('md', output) as writer:
+        writer.write_page(PAGE)
+    text = output.read_text(encoding='utf-8')
+    assert '### Título' in text
+    assert 'A &amp; &lt;b> texto.' in text
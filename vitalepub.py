@@ -5,48 +5,123 @@ Corrige problema com quebras de linha no HTML
 """
 
 import argparse
+import itertools
 import os
 import sys
 import time
 import tempfile
 import json
+import logging
 import re
-import traceback
+from collections import deque, namedtuple
 from pathlib import Path
 from zipfile import ZipFile
 from datetime import datetime
 
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException
-from selenium.webdriver.common.action_chains import ActionChains
-from webdriver_manager.chrome import ChromeDriverManager
-from webdriver_manager.core.os_manager import ChromeType
-
-try:
-    from ebooklib import epub
-    print("📚 ebooklib importado com sucesso")
-except ImportError:
-    print("❌ ebooklib não encontrado, instalando...")
-    os.system("pip install ebooklib")
-    from ebooklib import epub
-    print("✅ ebooklib instalado e importado")
+from fucts import layout, xhtml
+from fucts.epubwriter import COMPRESSION_LEVELS, StreamingEpubWriter, compression_level
+from fucts.headings import HeadingClassifier, load_heading_rules
+from fucts.incremental import (BuildManifest, PreviousBuild, content_hash, document_hash,
+                               manifest_path_for, page_hash)
+from fucts.layout import GLYPHS_KEY
+from fucts.normalize import TextNormalizer, load_normalization_rules
+from fucts.profiling import BuildProfile, page_timer
+from fucts.reflow import CONTINUATION_KEY, break_anchor
+from fucts.writers import OUTPUT_FORMATS, OUTPUT_SUFFIXES, ParsedPage, format_for_path, open_writer
+
+log = logging.getLogger("vitalepub")
+
+# Resultado da formatação de uma página (timings: etapa -> (parede, cpu)).
+# Em builds incrementais page_hash é o hash da entrada; páginas reaproveitadas
+# chegam com body None e o registro original em source. text é o texto limpo
+# dos parágrafos, preenchido só quando o build alimenta um índice de busca.
+# stripped conta os bytes de cabeçalhos/rodapés correntes removidos da página;
+# continues indica que o corpo termina com o início da página seguinte (--reflow).
+# page_text e tags são o resultado das duas etapas de formatação (ver
+# _parse_page), guardados no manifesto; render_key é o hash da entrada com a
+# fingerprint da etapa 'text' e as tags, e identifica o corpo gerado.
+RenderedPage = namedtuple(
+    'RenderedPage',
+    'anchor title body toc_title chapter page_number label paragraphs timings page_hash source text stripped '
+    'continues page_text tags render_key',
+    defaults=(None, None, None, 0, False, None, None, None)
+)
+
+# Etapa 'text' de uma página, a que não depende das regras de título: blocos
+# [tag do layout, texto limpo], bytes de linhas correntes removidos, trecho
+# emendado da página seguinte já limpo (--reflow), se a página é vazia e o
+# início do texto usado no sumário
+PageText = namedtuple('PageText', 'blocks stripped continuation blank head')
+
+# Documento XHTML do EPUB: uma página ou um capítulo inteiro (--group-chapters)
+EpubDocument = namedtuple('EpubDocument', 'file_name title members toc_label nav_id toc_children input_hash')
+
+# Limite de páginas por documento de capítulo; capítulos maiores são divididos
+CHAPTER_MAX_PAGES = 200
+
+# Páginas por tarefa enviada ao pool de formatação (--jobs)
+PAGE_CHUNK_SIZE = 64
+
+# Versão da formatação das páginas; mudar quando o XHTML gerado mudar, para que
+# builds incrementais não reaproveitem páginas formatadas pela versão antiga
+FORMATTER_VERSION = 4
+
+EPUB_STYLE = '''
+body { 
+    font-family: Georgia, serif; 
+    line-height: 1.6; 
+    margin: 1em; 
+    color: #333;
+}
+h1, h2 { 
+    color: #2c3e50; 
+    margin: 1em 0;
+}
+p { 
+    margin: 1em 0; 
+    text-align: justify; 
+}
+.page-info {
+    font-size: 0.9em;
+    color: #666;
+    font-style: italic;
+    margin-bottom: 1em;
+    border-bottom: 1px solid #eee;
+    padding-bottom: 0.5em;
+}
+'''
 
 
 class MinhaBliotecaEpubExtractor:
-    def __init__(self, headless=True):
+    def __init__(self, headless=True, validate=False, heading_rules=None, spill_threshold=None, index_text=False,
+                 normalization_rules=None, running_lines=None, cache_text=False):
         self.driver = None
         self.headless = headless
+        self.validate = validate
+        self.heading_rules = heading_rules
+        self.heading_classifier = HeadingClassifier.from_rules(heading_rules)
+        self.normalization_rules = normalization_rules
+        self.normalizer = TextNormalizer.from_rules(normalization_rules)
+        # Cabeçalhos/rodapés correntes a remover das bordas das páginas (ver fucts/runningheads.py)
+        self.running_lines = running_lines
+        self.index_text = index_text
+        # Guarda o PageText de cada página no RenderedPage (manifesto de build)
+        self.cache_text = cache_text
         self.base_url = "https://dliportal.zbra.com.br"
         self.reader_url = "https://app.minhabiblioteca.com.br"
-        self.book_data = []
+        # Registros compactos das páginas extraídas (words vão para arquivo mapeado
+        # quando o texto passa de spill_threshold bytes)
+        from fucts.pagestore import PageStore
+        self.book_data = PageStore() if spill_threshold is None else PageStore(spill_threshold)
         
     def create_driver(self):
         """Cria driver Chrome otimizado"""
+        from selenium import webdriver
+        from selenium.webdriver.chrome.service import Service
+        from selenium.webdriver.chrome.options import Options
+        from webdriver_manager.chrome import ChromeDriverManager
+        from webdriver_manager.core.os_manager import ChromeType
+
         chrome_options = Options()
         
         if self.headless:
@@ -68,17 +143,23 @@ class MinhaBliotecaEpubExtractor:
             driver_path = ChromeDriverManager(chrome_type=ChromeType.GOOGLE).install()
             service = Service(driver_path)
             self.driver = webdriver.Chrome(service=service, options=chrome_options)
-            print("✅ Driver Chrome criado")
+            log.info("✅ Driver Chrome criado")
         except Exception as e:
             service = Service("/usr/local/bin/chromedriver-working")
             self.driver = webdriver.Chrome(service=service, options=chrome_options)
-            print("✅ Driver local criado")
+            log.info("✅ Driver local criado")
         
         return self.driver
     
     def login_uenp(self, usuario, senha):
         """Login UENP simplificado"""
-        print("🔐 Realizando login UENP...")
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support.ui import WebDriverWait
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.common.exceptions import TimeoutException
+        from selenium.webdriver.common.action_chains import ActionChains
+
+        log.info("🔐 Realizando login UENP...")
         
         login_url = f"{self.base_url}/Login.aspx?key=UENP"
         self.driver.get(login_url)
@@ -118,7 +199,7 @@ class MinhaBliotecaEpubExtractor:
         start_time = time.time()
         while time.time() - start_time < 60:
             if "minhabiblioteca.com.br" in self.driver.current_url:
-                print("   ✅ Login realizado com sucesso")
+                log.info("   ✅ Login realizado com sucesso")
                 time.sleep(3)
                 return
             time.sleep(2)
@@ -127,7 +208,11 @@ class MinhaBliotecaEpubExtractor:
     
     def extract_vst_data_from_page(self, isbn, page_number):
         """Extrai dados do vst-html-javascript de uma página"""
-        print(f"   📄 Extraindo dados VST da página {page_number}...")
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support.ui import WebDriverWait
+        from selenium.webdriver.support import expected_conditions as EC
+
+        log.info("   📄 Extraindo dados VST da página %s...", page_number)
         
         try:
             # Navegar para página
@@ -139,11 +224,8 @@ class MinhaBliotecaEpubExtractor:
             )
             
             # Aguardar carregamento completo
-            print("   ⏰ Aguardando 15 segundos...")
-            for i in range(15, 0, -1):
-                print(f"   ⏳ {i}s...", end=" ", flush=True)
-                time.sleep(1)
-            print("✅")
+            log.info("   ⏰ Aguardando 15 segundos...")
+            time.sleep(15)
             
             # Entrar nos iframes para acessar o script
             try:
@@ -197,249 +279,672 @@ class MinhaBliotecaEpubExtractor:
                     
                     if vst_data:
                         words_length = len(vst_data.get('words', ''))
-                        print(f"   ✅ Dados VST extraídos: {words_length} caracteres")
+                        log.info("   ✅ Dados VST extraídos: %d caracteres", words_length)
                         
                         # Debug: mostrar dados extraídos para análise
                         if words_length > 0:
                             words_preview = vst_data.get('words', '')[:50]
-                            print(f"   📝 Preview: {words_preview}...")
+                            log.debug("   📝 Preview: %s...", words_preview)
                         
                         return vst_data
                     else:
-                        print("   ❌ Dados VST não encontrados")
+                        log.warning("   ❌ Dados VST não encontrados")
                         return None
                 
             except Exception as e:
-                print(f"   ❌ Erro ao acessar iframes: {e}")
+                log.error("   ❌ Erro ao acessar iframes: %s", e)
                 return None
             finally:
                 self.driver.switch_to.default_content()
         
         except Exception as e:
-            print(f"   ❌ Erro na página {page_number}: {e}")
+            log.error("   ❌ Erro na página %s: %s", page_number, e)
             return None
     
-    def clean_text_for_html(self, text):
-        """Limpa texto para uso seguro em HTML"""
-        if not text:
-            return ""
+    def clean_text(self, text):
+        """Remove caracteres problemáticos do texto extraído (sem escapar)
         
-        # Escape HTML entities
-        import html
-        text = html.escape(text)
-        
-        # Remover caracteres problemáticos
-        text = text.replace('\x00', '')  # null bytes
-        text = text.replace('\ufffd', '')  # replacement characters
-        
-        return text.strip()
+        Nulos, ligaduras, espaços incomuns e palavras hifenizadas no fim da linha
+        são resolvidos numa só passada (regras em self.normalizer, ver
+        --normalization-rules).
+        """
+        return self.normalizer.normalize(text)
     
-    def format_text_content(self, words, page_number, glyphs_data=None):
-        """Formata o texto extraído para HTML - CORREÇÃO DE QUEBRAS DE LINHA"""
-        print(f"🔍 DEBUG: Formatando conteúdo da página {page_number}")
+    def clean_text_for_html(self, text):
+        """Limpa texto para uso seguro em HTML (limpeza e escape na mesma passada)"""
+        return xhtml.Markup(self.normalizer.normalize_html(text))
+    
+    def _placeholder_content(self, page_number, message):
+        """Bloco centralizado para páginas sem texto"""
+        return xhtml.element(
+            'div',
+            xhtml.element('p', f'Página {page_number}'),
+            xhtml.element('p', message),
+            style="text-align: center; margin-top: 50%; color: #666; font-style: italic;"
+        )
+    
+    def parse_paragraphs(self, words, page_number, glyphs_data=None):
+        """Quebra o texto da página em blocos (tag, texto) - tag é 'h2' ou 'p'
         
-        # Se não há texto, criar página em branco
-        if not words or len(words.strip()) < 5:
-            print(f"   ⚠️ Página {page_number} considerada vazia")
-            return f'''<div style="text-align: center; margin-top: 50%; color: #666; font-style: italic;">
-                <p>Página {page_number}</p>
-                <p>(Página sem conteúdo textual ou contém apenas imagens)</p>
-            </div>'''
+        Com glyphs_data (e NumPy instalado) os parágrafos e títulos vêm das
+        posições dos glifos; sem eles, da quebra do texto por '\r'.
+        """
+        blocks = self._text_blocks(words, page_number, glyphs_data)
+        return [(tag, text) for tag, (_, text) in zip(self._heading_tags(blocks), blocks)]
+    
+    def _text_blocks(self, words, page_number, glyphs_data=None):
+        """Etapa 'text' de parse_paragraphs: blocos (tag do layout, texto limpo), sem os títulos"""
+        if glyphs_data and layout.available():
+            try:
+                blocks = layout.reconstruct_blocks(glyphs_data)
+            except (ValueError, KeyError, TypeError, IndexError) as e:
+                log.debug("   ⚠️ Glifos inválidos na página %s, usando o texto: %s", page_number, e)
+            else:
+                blocks = [(tag, self.clean_text(text)) for tag, text in blocks]
+                blocks = [(tag, text) for tag, text in blocks if text]
+                if self.running_lines:
+                    running = self.running_lines.running_indexes([text for _, text in blocks])
+                    blocks = [block for i, block in enumerate(blocks) if i not in running]
+                log.debug("   📐 Layout por glifos: %d blocos", len(blocks))
+                return blocks
         
         # Limpar texto
-        text = self.clean_text_for_html(words)
-        print(f"   📝 Texto após limpeza: {len(text)} caracteres")
+        text = self.clean_text(words)
+        log.debug("   📝 Texto após limpeza: %d caracteres", len(text))
         
         # Quebrar em parágrafos
         paragraphs = text.split('\r')
         paragraphs = [p.strip() for p in paragraphs if p.strip()]
-        print(f"   📋 Parágrafos encontrados: {len(paragraphs)}")
-        
-        if not paragraphs:
-            return f'''<div style="text-align: center; margin-top: 50%; color: #666; font-style: italic;">
-                <p>Página {page_number}</p>
-                <p>(Conteúdo não disponível)</p>
-            </div>'''
-        
-        # Converter para HTML - CORREÇÃO: usar quebras de linha reais
-        html_parts = []
-        
-        for i, para in enumerate(paragraphs):
-            if para:
-                # Detectar títulos
-                if (para.isupper() and len(para) < 100) or any(keyword in para for keyword in [
-                    'Dicas de', 'Para Leigos', 'Capítulo', 'Básica', 'PROBLEMAS', 'MATEMÁTICA'
-                ]):
-                    html_parts.append(f"<h2>{para}</h2>")
-                    print(f"      ✅ Parágrafo {i+1} como título")
-                else:
-                    html_parts.append(f"<p>{para}</p>")
-                    print(f"      ✅ Parágrafo {i+1} como texto")
+        log.debug("   📋 Parágrafos encontrados: %d", len(paragraphs))
+        return [('p', para) for para in paragraphs]
+    
+    def _heading_tags(self, blocks):
+        """Etapa 'headings': tag final de cada bloco de _text_blocks
+        
+        Os títulos (regras em self.heading_classifier, ver --heading-rules)
+        viram 'h2'; os demais blocos ficam com a tag do layout.
+        """
+        headings = self.heading_classifier.classify_many([text for _, text in blocks])
+        log.debug("   🏷️ Títulos: %d de %d blocos", sum(headings), len(blocks))
+        return ['h2' if is_heading else tag for (tag, _), is_heading in zip(blocks, headings)]
+    
+    def _page_text(self, page_number, page_data):
+        """Etapa 'text' de uma página: linhas correntes, limpeza e blocos (PageText)
         
-        # Juntar com quebras de linha reais (não literal)
-        final_content = "\\n".join(html_parts)
-        print(f"   📄 Conteúdo HTML final: {len(final_content)} caracteres")
+        Não depende das regras de título; é o que o manifesto de build guarda
+        para a reconstrução incremental (ver fucts/incremental.py).
+        """
+        words = page_data.get('words', '')
+        glyphs_data = page_data.get(GLYPHS_KEY)
+        continuation = page_data.get(CONTINUATION_KEY)
+        
+        stripped = 0
+        if self.running_lines:
+            words, stripped = self.running_lines.strip(words)
+        
+        blank = _blank_page(words, glyphs_data, continuation)
+        blocks = [] if blank else self._text_blocks(words, page_number, glyphs_data)
+        joined = self.clean_text(continuation.get('words')) if continuation else None
+        head = words[:40].strip() if words and len(words) > 50 else ''
+        return PageText(blocks, stripped, joined, blank, head)
+    
+    def _parse_page(self, page_number, page_data, page_text=None, tags=None):
+        """Etapa comum a render_page e parse_page: etapas 'text' e 'headings' e --reflow
         
+        page_text e tags, quando vêm de um build anterior, pulam a etapa
+        correspondente. Devolve (ParsedPage, PageText, tags); as exceções passam
+        adiante, cada chamador decide o que fazer com a página.
+        """
+        page_data = page_data or {}
+        chapter = page_data.get('chapterTitle')
+        if page_text is None:
+            page_text = self._page_text(page_number, page_data)
+        if tags is None:
+            tags = self._heading_tags(page_text.blocks)
+        
+        blocks = [(tag, text) for tag, (_, text) in zip(tags, page_text.blocks)]
+        break_at = None
+        if page_text.continuation is not None:
+            break_at = self._join_continuation(blocks, page_text.continuation, page_data[CONTINUATION_KEY])
+        parsed = ParsedPage(page_number, page_data.get('page', str(page_number)),
+                            self.clean_text(chapter) if chapter is not None else None, blocks,
+                            page_text.stripped, break_at)
+        return parsed, page_text, tags
+    
+    def _page_content(self, parsed, page_text, page_data):
+        """XHTML do conteúdo de uma página a partir dos blocos de _parse_page"""
+        page_number = parsed.page_number
+        page_data = page_data or {}
+        if not parsed.blocks:
+            if page_text.blank:
+                log.debug("   ⚠️ Página %s considerada vazia", page_number)
+                return self._placeholder_content(
+                    page_number, "(Página sem conteúdo textual ou contém apenas imagens)")
+            return self._placeholder_content(page_number, "(Conteúdo não disponível)")
+        
+        # Os blocos vêm de clean_text, que já removeu os caracteres inválidos em
+        # XML, então só falta o escape de &, <, > e aspas
+        elements = [xhtml.element(tag, xhtml.escape_valid(text)) for tag, text in parsed.blocks]
+        if parsed.break_at is not None:
+            # Âncora no ponto do último parágrafo em que a página seguinte começa
+            index, offset = parsed.break_at
+            label = page_data[CONTINUATION_KEY].get('page') or page_number + 1
+            marker = xhtml.element('span', id=break_anchor(page_number + 1), class_='page-break',
+                                   title=f'Página {label}')
+            text = parsed.blocks[index][1]
+            elements[index] = xhtml.element('p', xhtml.escape_valid(text[:offset]), marker,
+                                            xhtml.escape_valid(text[offset:]))
+            log.debug("   🔗 Parágrafo continua na página %s", label)
+        final_content = xhtml.join(elements)
+        log.debug("   📄 Conteúdo HTML final: %d caracteres", len(final_content))
         return final_content
     
-    def create_epub_from_data(self, isbn, output_path, book_title="Livro"):
-        """Cria EPUB com HTML válido"""
-        print(f"📚 INICIANDO CRIAÇÃO DO EPUB: {book_title}")
+    def _join_continuation(self, blocks, text, continuation):
+        """Emenda em `blocks` o início da página seguinte; devolve (índice do bloco, posição da virada)
+        
+        text é o trecho já limpo (PageText.continuation). Se o último bloco não
+        é um parágrafo o trecho vira um parágrafo próprio, e o hífen que o
+        --reflow tirou da virada volta ao fim do bloco.
+        """
+        if blocks and blocks[-1][0] == 'p':
+            last = blocks[-1][1] + continuation.get('separator', ' ')
+            blocks[-1] = ('p', last + text)
+            return len(blocks) - 1, len(last)
+        if blocks and continuation.get('hyphen'):
+            tag, last = blocks[-1]
+            blocks[-1] = (tag, last + continuation['hyphen'])
+        blocks.append(('p', text))
+        return len(blocks) - 1, 0
+    
+    def parse_page(self, page_number, page_data):
+        """Quebra uma página em blocos sem gerar XHTML (saídas txt, md e jsonl)
+        
+        Usa a mesma etapa de render_page (_parse_page); uma página que falha
+        vira uma página sem blocos.
+        """
+        if not page_data:
+            return ParsedPage(page_number, str(page_number), None, [])
+        try:
+            return self._parse_page(page_number, page_data)[0]
+        except Exception as e:
+            log.warning("      ❌ Erro ao processar a página %s: %s", page_number, e)
+            chapter = page_data.get('chapterTitle')
+            return ParsedPage(page_number, page_data.get('page', str(page_number)),
+                              self.clean_text(chapter) if chapter is not None else None, [])
+    
+    def format_text_content(self, words, page_number, glyphs_data=None):
+        """Formata o texto extraído para HTML - CORREÇÃO DE QUEBRAS DE LINHA"""
+        log.debug("🔍 Formatando conteúdo da página %s", page_number)
+        page_data = {'words': words, GLYPHS_KEY: glyphs_data}
+        parsed, page_text, _ = self._parse_page(page_number, page_data)
+        return self._page_content(parsed, page_text, page_data)
+    
+    def render_page(self, page_number, page_data, page_text=None, tags=None):
+        """Formata uma página e devolve um RenderedPage
+        
+        O corpo da página é um <div class="page"> com âncora própria, que pode
+        virar um documento sozinho ou entrar no documento do capítulo. O XHTML
+        sai bem-formado do serializador; o parsing com lxml só é feito quando
+        self.validate está ligado (--validate). page_text e tags (de um build
+        anterior, ver _cached_page) pulam as etapas de formatação já feitas.
+        """
+        log.debug("   📄 Processando página %s", page_number)
+        
+        page_data = page_data or {}
+        chapter = page_data.get('chapterTitle')
+        page_title = page_data.get('page', str(page_number))
+        
+        anchor = f'page_{page_number:03d}'
+        chapter_title = self.clean_text(chapter if chapter is not None else f'Capítulo {page_number}')
+        if chapter is not None:
+            chapter = chapter_title
+        timings = {}
         
         try:
-            # Criar livro EPUB
-            book = epub.EpubBook()
+            # Formatear conteúdo
+            with page_timer(timings, 'format'):
+                parsed, page_text, tags = self._parse_page(page_number, page_data, page_text, tags)
+                content = self._page_content(parsed, page_text, page_data)
+                blocks = parsed.blocks
             
-            # Metadados
-            book.set_identifier(f'isbn-{isbn}')
-            book.set_title(book_title)
-            book.set_language('pt-br')
-            book.add_author('Extraído da Minha Biblioteca')
-            book.add_metadata('DC', 'description', f'Livro extraído do ISBN {isbn}')
+            with page_timer(timings, 'serialize'):
+                page_info = xhtml.element(
+                    'div', xhtml.element('strong', chapter_title), f' - Página {page_title}', class_='page-info'
+                )
+                body = xhtml.element('div', xhtml.join(['', page_info, content, '']), id=anchor, class_='page')
+            title = f'{chapter_title} - Página {page_title}'
+            log.debug("      📝 HTML gerado: %d caracteres", len(body))
             
-            # CSS
-            style = '''
-            body { 
-                font-family: Georgia, serif; 
-                line-height: 1.6; 
-                margin: 1em; 
-                color: #333;
-            }
-            h1, h2 { 
-                color: #2c3e50; 
-                margin: 1em 0;
-            }
-            p { 
-                margin: 1em 0; 
-                text-align: justify; 
-            }
-            .page-info {
-                font-size: 0.9em;
-                color: #666;
-                font-style: italic;
-                margin-bottom: 1em;
-                border-bottom: 1px solid #eee;
-                padding-bottom: 0.5em;
-            }
-            '''
+            if self.validate:
+                with page_timer(timings, 'validate'):
+                    xhtml.validate_document(xhtml.page_document(title, [body]))
+                log.debug("      ✅ HTML válido confirmado")
             
-            nav_css = epub.EpubItem(uid="nav_css", file_name="style/nav.css", media_type="text/css", content=style)
-            book.add_item(nav_css)
+            # TOC
+            toc_title = f"Página {page_title}"
+            if page_text.head:
+                toc_title = f"Pág. {page_title}: {page_text.head}..."
             
-            # Processar páginas
-            spine = ['nav']
-            toc = []
+            text = '\n'.join(block for _, block in blocks) if self.index_text else None
             
-            for i, page_data in enumerate(self.book_data):
-                page_number = i + 1
-                print(f"\\n   📄 Processando página {page_number}")
-                
-                if page_data:
-                    chapter_title = page_data.get('chapterTitle', f'Capítulo {page_number}')
-                    page_title = page_data.get('page', str(page_number))
-                    words = page_data.get('words', '')
-                else:
-                    chapter_title = f'Capítulo {page_number}'
-                    page_title = str(page_number)
-                    words = ''
-                
-                # Formatear conteúdo
-                content = self.format_text_content(words, page_number)
-                
-                # HTML da página - ESTRUTURA MAIS SIMPLES E VÁLIDA
-                html_content = f'''<!DOCTYPE html>
-<html xmlns="http://www.w3.org/1999/xhtml">
-<head>
-    <title>{self.clean_text_for_html(chapter_title)} - Página {page_title}</title>
-    <link rel="stylesheet" type="text/css" href="../style/nav.css"/>
-</head>
-<body>
-    <div class="page-info">
-        <strong>{self.clean_text_for_html(chapter_title)}</strong> - Página {page_title}
-    </div>
-    {content}
-</body>
-</html>'''
-                
-                print(f"      📝 HTML gerado: {len(html_content)} caracteres")
-                
-                # Criar capítulo
-                chapter_file_name = f'page_{page_number:03d}.xhtml'
-                chapter = epub.EpubHtml(
-                    title=f"Página {page_title}",
-                    file_name=chapter_file_name,
-                    lang='pt-br'
-                )
-                
-                # CORREÇÃO CRÍTICA: validar conteúdo antes de atribuir
-                try:
-                    # Teste básico de parsing
-                    from lxml import html as lxml_html
-                    parsed = lxml_html.fromstring(html_content)
-                    print(f"      ✅ HTML válido confirmado")
-                    
-                    chapter.content = html_content
-                    book.add_item(chapter)
-                    spine.append(chapter)
-                    
-                    # TOC
-                    toc_title = f"Página {page_title}"
-                    if words and len(words) > 50:
-                        first_words = words[:40].strip()
-                        if first_words:
-                            toc_title = f"Pág. {page_title}: {first_words}..."
-                    
-                    toc.append(epub.Link(chapter_file_name, toc_title, f'page_{page_number:03d}'))
-                    print(f"      ✅ Capítulo adicionado com sucesso")
-                    
-                except Exception as parse_error:
-                    print(f"      ❌ HTML inválido: {parse_error}")
-                    # Criar versão alternativa mais simples
-                    simple_content = f'''<!DOCTYPE html>
-<html xmlns="http://www.w3.org/1999/xhtml">
-<head>
-    <title>Página {page_title}</title>
-</head>
-<body>
-    <h1>Página {page_title}</h1>
-    <p>Conteúdo desta página não pôde ser processado.</p>
-</body>
-</html>'''
-                    chapter.content = simple_content
-                    book.add_item(chapter)
-                    spine.append(chapter)
-                    toc.append(epub.Link(chapter_file_name, f"Página {page_title} (erro)", f'page_{page_number:03d}'))
-                    print(f"      ⚠️ Capítulo adicionado com conteúdo simplificado")
+            log.debug("      ✅ Capítulo adicionado com sucesso")
+            return RenderedPage(anchor, title, body, toc_title, chapter,
+                                page_number, page_title, len(blocks), timings, text=text, stripped=parsed.stripped,
+                                continues=parsed.break_at is not None,
+                                page_text=page_text if self.cache_text else None, tags=tags)
             
-            # Configurar navegação
-            book.toc = toc
-            book.add_item(epub.EpubNcx())
-            book.add_item(epub.EpubNav())
-            book.spine = spine
-            
-            # Salvar EPUB
+        except Exception as parse_error:
+            # Falha de formatação ou de validação: a página vira um aviso simples
+            log.warning("      ❌ HTML inválido na página %s: %s", page_number, parse_error)
+            body = xhtml.element(
+                'div',
+                xhtml.element('h1', f'Página {page_title}'),
+                xhtml.element('p', 'Conteúdo desta página não pôde ser processado.'),
+                id=anchor, class_='page'
+            )
+            log.debug("      ⚠️ Capítulo adicionado com conteúdo simplificado")
+            return RenderedPage(anchor, f'Página {page_title}', body, f"Página {page_title} (erro)", chapter,
+                                page_number, page_title, 0, timings)
+    
+    def iter_documents(self, rendered_pages, group_chapters=False):
+        """Agrupa páginas renderizadas nos documentos XHTML do EPUB
+        
+        Cada documento leva a lista (rótulo impresso, âncora) das suas páginas,
+        usada no page-list. Sem group_chapters cada página é um documento (page_NNN.xhtml). Com ele,
+        páginas seguidas com o mesmo chapterTitle formam um chapter_NNN.xhtml,
+        com uma entrada de sumário por capítulo e as páginas aninhadas como
+        âncoras. Só o capítulo corrente fica em memória.
+        """
+        if not group_chapters:
+            for rendered in rendered_pages:
+                file_name = f'{rendered.anchor}.xhtml'
+                yield EpubDocument(file_name, rendered.title, [rendered], rendered.toc_title, rendered.anchor, (),
+                                   _document_input_hash(file_name, rendered.title, [rendered]))
+            return
+        
+        group = []
+        chapter = None
+        part = 1
+        documents = 0
+        
+        def flush():
+            nonlocal documents
+            documents += 1
+            nav_id = f'chapter_{documents:03d}'
+            file_name = f'{nav_id}.xhtml'
+            title = chapter or group[0].title
+            if part > 1:
+                title = f'{title} ({part})'
+            children = [(r.anchor, f'{file_name}#{r.anchor}', r.toc_title) for r in group]
+            return EpubDocument(file_name, title, group, title, nav_id, children,
+                                _document_input_hash(file_name, title, group))
+        
+        for rendered in rendered_pages:
+            # Páginas sem chapterTitle (falhas de extração) ficam no capítulo corrente
+            same_chapter = rendered.chapter is None or rendered.chapter == chapter
+            if group and (not same_chapter or len(group) >= CHAPTER_MAX_PAGES):
+                yield flush()
+                part = part + 1 if same_chapter else 1
+                group = []
+            if not group and rendered.chapter is not None:
+                chapter = rendered.chapter
+            group.append(rendered)
+        
+        if group:
+            yield flush()
+    
+    def render_options(self):
+        """Opções de formatação repassadas aos processos do pool"""
+        return {'validate': self.validate, 'heading_rules': self.heading_rules,
+                'normalization_rules': self.normalization_rules, 'running_lines': self.running_lines,
+                'index_text': self.index_text, 'cache_text': self.cache_text}
+    
+    def build_fingerprints(self):
+        """Hash das regras de cada etapa de formatação (ver fucts/incremental.py)
+        
+        'text' cobre tudo que muda os blocos de uma página antes da classificação
+        (inclusive o próprio formatador); 'headings', as regras de título.
+        """
+        text = [FORMATTER_VERSION, self.normalization_rules,
+                self.running_lines.fingerprint() if self.running_lines else None, layout.available()]
+        return {'text': content_hash(json.dumps(text, sort_keys=True, default=str)),
+                'headings': content_hash(json.dumps(self.heading_rules, sort_keys=True, default=str))}
+    
+    def _cached_page(self, page_number, page_data, previous=None):
+        """(hash da entrada, RenderedPage reaproveitado ou None, PageText, tags) do build anterior
+        
+        Com as regras de título alteradas só os blocos salvos são
+        reclassificados; a página é reaproveitada inteira se as tags saem
+        iguais, senão é formatada a partir do PageText. Com as mesmas regras
+        o PageText nem é lido (fica None).
+        """
+        h = page_hash(page_number, page_data)
+        anchor = f'page_{page_number:03d}'
+        entry = previous.reusable_page(anchor, h) if previous is not None else None
+        if entry is None or entry.get('tags') is None:
+            return h, None, None, None
+        page_text = tags = None
+        if previous.same_headings:
+            tags = entry['tags']
+        else:
+            saved = previous.page_text(anchor)
+            if saved is None:
+                return h, None, None, None
+            page_text = PageText(*saved)
+            tags = self._heading_tags(page_text.blocks)
+            if tags != entry['tags']:
+                return h, None, page_text, tags
+        return h, RenderedPage(anchor, entry['title'], None, entry['toc_title'], entry['chapter'],
+                               page_number, entry['label'], entry['paragraphs'], {}, h, page_data,
+                               continues=bool(page_data and page_data.get(CONTINUATION_KEY)),
+                               page_text=page_text, tags=tags), page_text, tags
+    
+    def render_pages(self, pages, jobs=1, chunk_size=PAGE_CHUNK_SIZE, hashes=False, previous=None, start_page=1):
+        """Renderiza as páginas em ordem de spine, opcionalmente num pool de processos
+        
+        Com jobs > 1 as páginas são enviadas em blocos de `chunk_size` e no máximo
+        2 * jobs blocos ficam pendentes, então a memória continua limitada mesmo
+        quando `pages` é um gerador grande. Com hashes (ou um PreviousBuild em
+        `previous`) cada página leva o hash da sua entrada e a chave de
+        renderização, e o que o build anterior já fez não é refeito (ver
+        _cached_page). A numeração começa em start_page (um trecho do livro, ver
+        PageFile.pages).
+        """
+        numbered = enumerate(pages, start=start_page)
+        hashes = hashes or previous is not None
+        text_fingerprint = self.build_fingerprints()['text'] if hashes else None
+        
+        if jobs <= 1:
+            for page_number, page_data in numbered:
+                if not hashes:
+                    yield self.render_page(page_number, page_data)
+                    continue
+                h, reused, page_text, tags = self._cached_page(page_number, page_data, previous)
+                rendered = reused or self.render_page(page_number, page_data, page_text, tags)
+                yield _with_keys(rendered, h, text_fingerprint)
+            return
+        
+        from concurrent.futures import ProcessPoolExecutor
+        
+        def results(prepared, future):
+            rendered = iter(future.result())
+            if prepared is None:
+                yield from rendered
+                return
+            for h, reused, *_ in prepared:
+                yield _with_keys(reused or next(rendered), h, text_fingerprint)
+        
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_render_worker,
+                                 initargs=(self.render_options(), log.getEffectiveLevel())) as pool:
+            pending = deque()
+            while True:
+                chunk = list(itertools.islice(numbered, chunk_size))
+                if not chunk:
+                    break
+                prepared = None
+                if hashes:
+                    # Só as páginas que mudaram vão para o pool, com as etapas já feitas
+                    prepared = [self._cached_page(n, p, previous) for n, p in chunk]
+                    chunk = [(n, p, page_text, tags) for (n, p), (_, reused, page_text, tags) in zip(chunk, prepared)
+                             if reused is None]
+                pending.append((prepared, pool.submit(_render_chunk, chunk)))
+                if len(pending) >= 2 * jobs:
+                    yield from results(*pending.popleft())
+            while pending:
+                yield from results(*pending.popleft())
+    
+    def create_epub_from_data(self, isbn, output_path, book_title="Livro", pages=None, jobs=1,
+                              profile=None, group_chapters=False, previous=None, manifest_path=None,
+                              compresslevel=None, compress_threads=1, search_index=None, running_lines=None,
+                              reflow=False, output_format='epub', start_page=1):
+        """Cria EPUB com HTML válido a partir de self.book_data ou de `pages`
+        
+        As páginas são consumidas uma a uma e cada XHTML vai direto para o ZIP,
+        então `pages` pode ser um gerador (ver iter_pages) e a memória não cresce
+        com o número de páginas. Com jobs > 1 a formatação roda em paralelo.
+        Um BuildProfile em `profile` recebe os tempos por etapa e por página;
+        group_chapters junta as páginas de cada capítulo num só documento.
+        
+        Build incremental: `previous` é o EPUB de um build anterior (com o
+        manifesto de build ao lado); páginas inalteradas não são formatadas e
+        documentos inalterados são copiados já comprimidos. manifest_path grava
+        o manifesto deste build (padrão com previous: SAÍDA.build.json).
+        
+        compresslevel (0-9 ou 'fast'/'max') e compress_threads controlam o deflate
+        das entradas do ZIP (ver fucts/epubwriter.py). Com um SearchIndex em
+        search_index o texto de cada página é indexado no mesmo passo.
+        running_lines (de detect_running_lines, numa passada anterior pelas
+        mesmas páginas) remove os cabeçalhos e rodapés correntes. reflow junta os
+        parágrafos cortados na virada de página (ver fucts/reflow.py).
+        
+        output_format diferente de 'epub' (txt, md, jsonl, jsonl-paragraphs)
+        grava o mesmo fluxo de parágrafos com um writer de fucts/writers.py, sem
+        gerar XHTML nem ZIP (ver export_pages).
+        
+        start_page é o número da primeira página de `pages`, quando o build é só
+        um trecho do livro (--pages, --chapter): âncoras e page-list seguem a
+        numeração do livro inteiro.
+        """
+        if pages is None:
+            pages = self.book_data
+        if profile is None:
+            profile = BuildProfile()
+        if running_lines is not None:
+            self.running_lines = running_lines or None
+        
+        if output_format != 'epub':
+            if previous is not None or manifest_path:
+                log.warning("⚠️ Build incremental só vale para EPUB; gerando %s inteiro", output_format)
+            return self.export_pages(isbn, output_path, book_title, pages, output_format, profile=profile,
+                                     search_index=search_index, reflow=reflow, start_page=start_page)
+        
+        log.info("📚 INICIANDO CRIAÇÃO DO EPUB: %s", book_title)
+        
+        previous_build = None
+        try:
             epub_path = Path(output_path)
             epub_path.parent.mkdir(parents=True, exist_ok=True)
             
-            print(f"\\n💾 Salvando EPUB...")
-            epub.write_epub(str(epub_path), book, {})
+            fingerprints = self.build_fingerprints()
+            level = compression_level(compresslevel)
+            if previous is not None:
+                manifest_path = manifest_path or manifest_path_for(epub_path)
+                try:
+                    previous_build = PreviousBuild.open(previous, fingerprints, level)
+                except (OSError, ValueError) as e:
+                    log.warning("⚠️ Build anterior não pode ser reaproveitado (%s); gerando tudo", e)
+            manifest = BuildManifest(fingerprints, compresslevel=level) if manifest_path else None
+            reused = previous_build is not None
+            copied = 0
+            reflow_stats = {}
+            # Páginas cujo início ficou no documento anterior (--reflow): número -> href da âncora
+            break_targets = {}
+            
+            self.index_text = search_index is not None
+            self.cache_text = manifest is not None
+            if search_index is not None:
+                search_index.begin_book(isbn, book_title, str(epub_path))
+            
+            with StreamingEpubWriter(
+                epub_path,
+                identifier=f'isbn-{isbn}',
+                title=book_title,
+                language='pt-br',
+                author='Extraído da Minha Biblioteca',
+                description=f'Livro extraído do ISBN {isbn}',
+                compresslevel=compresslevel,
+                threads=compress_threads
+            ) as writer:
+                writer.add_item("nav_css", "style/nav.css", "text/css", EPUB_STYLE)
+                
+                pages = profile.timed_iter('load', pages)
+                if reflow:
+                    from fucts.reflow import reflow_pages
+                    pages = profile.timed_iter('reflow', reflow_pages(pages, self.running_lines, reflow_stats))
+                rendered_pages = self.render_pages(pages, jobs, hashes=manifest is not None,
+                                                   previous=previous_build, start_page=start_page)
+                rendered_pages = _record_pages(profile.timed_iter('render', rendered_pages), profile)
+                if search_index is not None:
+                    rendered_pages = self._index_pages(rendered_pages, search_index)
+                for document in self.iter_documents(rendered_pages, group_chapters):
+                    with profile.stage('write'):
+                        raw = content = output_hash = None
+                        if previous_build is not None:
+                            raw = previous_build.raw_document(document.file_name, input_hash=document.input_hash)
+                        if raw is None:
+                            content = xhtml.page_document(document.title, self._document_bodies(document),
+                                                          stylesheet='style/nav.css').encode('utf-8')
+                            if manifest is not None:
+                                output_hash = content_hash(content)
+                            if previous_build is not None:
+                                raw = previous_build.raw_document(document.file_name, output_hash=output_hash)
+                        else:
+                            output_hash = previous_build.output_hash(document.file_name)
+                        copied += raw is not None
+                        
+                        writer.add_document(document.file_name, content, document.toc_label,
+                                            document.nav_id, document.toc_children, raw=raw)
+                        for member in document.members:
+                            href = break_targets.pop(member.page_number, f'{document.file_name}#{member.anchor}')
+                            writer.add_page_target(member.label, href)
+                            if member.continues:
+                                break_targets[member.page_number + 1] = (
+                                    f'{document.file_name}#{break_anchor(member.page_number + 1)}')
+                        if manifest is not None:
+                            _record_manifest(manifest, document, output_hash, previous_build)
+                
+                log.debug("💾 Salvando EPUB...")
+                page_count = writer.document_count
+                # Todas as entradas reaproveitadas já foram copiadas; o EPUB anterior
+                # é fechado antes de o novo tomar o lugar dele (--previous = --output)
+                if previous_build is not None:
+                    previous_build.close()
+                    previous_build = None
+                with profile.stage('write'):
+                    writer.close()
+                profile.bytes_produced = writer.bytes_written
+            
+            if reflow:
+                profile.extra['reflow_joined'] = reflow_stats.get('joined', 0)
+                log.info("🔗 Parágrafos juntados na virada de página: %d", profile.extra['reflow_joined'])
+            if self.running_lines:
+                stripped = profile.extra.get('running_lines', {})
+                log.info("🧹 Cabeçalhos/rodapés removidos: %d bytes em %d páginas",
+                         stripped.get('removed_bytes', 0), stripped.get('pages', 0))
+            if search_index is not None:
+                indexed = search_index.end_book()
+                log.info("🔎 Páginas indexadas para busca: %d", indexed)
+            if manifest is not None:
+                manifest.save(manifest_path)
+                log.debug("🧾 Manifesto de build salvo em %s", manifest_path)
+            if reused:
+                profile.extra['copied_documents'] = copied
+                log.info("♻️ Documentos reaproveitados do build anterior: %d de %d", copied, page_count)
             
             if epub_path.exists():
-                size_mb = epub_path.stat().st_size / 1024 / 1024
-                print(f"✅ EPUB criado com sucesso: {epub_path}")
-                print(f"📏 Tamanho: {size_mb:.2f} MB")
-                print(f"📊 Páginas: {len(self.book_data)}")
+                profile.output_size = epub_path.stat().st_size
+                size_mb = profile.output_size / 1024 / 1024
+                log.info("✅ EPUB criado com sucesso: %s", epub_path)
+                log.info("📏 Tamanho: %.2f MB", size_mb)
+                log.info("📊 Páginas: %d (%d documentos)", profile.pages, page_count)
                 return True
             else:
-                print(f"❌ Arquivo não foi criado")
+                log.error("❌ Arquivo não foi criado")
                 return False
                 
         except Exception as e:
-            print(f"💥 ERRO na criação do EPUB: {e}")
-            traceback.print_exc()
+            log.exception("💥 ERRO na criação do EPUB: %s", e)
+            if search_index is not None:
+                search_index.abort_book()
             return False
+        finally:
+            if previous_build is not None:
+                previous_build.close()
     
-    def extract_book(self, isbn, output_path, usuario=None, senha=None, start_page=1, end_page=None):
+    def export_pages(self, isbn, output_path, book_title, pages, output_format, profile=None, search_index=None,
+                     reflow=False, start_page=1):
+        """Grava as páginas em txt, Markdown ou JSONL (writers de fucts/writers.py)
+        
+        Cada página é quebrada em parágrafos com parse_page e vai direto para o
+        writer, sem XHTML nem ZIP, então a memória fica constante.
+        """
+        log.info("📝 Exportando %s: %s", output_format, book_title)
+        if profile is None:
+            profile = BuildProfile()
+        if search_index is not None:
+            search_index.begin_book(isbn, book_title, str(output_path))
+        
+        try:
+            output_path = Path(output_path)
+            output_path.parent.mkdir(parents=True, exist_ok=True)
+            reflow_stats = {}
+            pages = profile.timed_iter('load', pages)
+            if reflow:
+                from fucts.reflow import reflow_pages
+                pages = profile.timed_iter('reflow', reflow_pages(pages, self.running_lines, reflow_stats))
+            
+            with open_writer(output_format, output_path, book_title) as writer:
+                for page_number, page_data in enumerate(pages, start=start_page):
+                    with profile.stage('export'):
+                        parsed = self.parse_page(page_number, page_data)
+                        writer.write_page(parsed)
+                    profile.add_page(page_number, parsed.label, len(parsed.blocks), {})
+                    _record_stripped(profile, parsed.stripped)
+                    if search_index is not None:
+                        search_index.add_page(page_number, parsed.label, parsed.chapter,
+                                              '\n'.join(text for _, text in parsed.blocks))
+            
+            if search_index is not None:
+                log.info("🔎 Páginas indexadas para busca: %d", search_index.end_book())
+            if reflow:
+                profile.extra['reflow_joined'] = reflow_stats.get('joined', 0)
+            profile.output_size = profile.bytes_produced = output_path.stat().st_size
+            log.info("✅ %s criado com sucesso: %s", output_format, output_path)
+            log.info("📏 Tamanho: %.2f MB", profile.output_size / 1024 / 1024)
+            log.info("📊 Páginas: %d (%d parágrafos)", writer.pages, writer.paragraphs)
+            return True
+        
+        except Exception as e:
+            log.exception("💥 ERRO na exportação: %s", e)
+            if search_index is not None:
+                search_index.abort_book()
+            return False
+    
+    def _index_pages(self, rendered_pages, search_index):
+        """Repassa as páginas renderizadas alimentando o índice de busca"""
+        for rendered in rendered_pages:
+            text = rendered.text
+            if text is None and rendered.source:
+                # Página reaproveitada de um build anterior: não passou pelo formatador
+                text = '\n'.join(para for _, para in self.parse_paragraphs(
+                    rendered.source.get('words', ''), rendered.page_number, rendered.source.get(GLYPHS_KEY)))
+            search_index.add_page(rendered.page_number, rendered.label, rendered.chapter, text)
+            yield rendered
+    
+    def _document_bodies(self, document):
+        """Corpos das páginas do documento; páginas reaproveitadas são formatadas aqui
+        
+        Só acontece quando o documento mudou mas algumas páginas não (por exemplo,
+        um capítulo com uma página editada).
+        """
+        return [member.body if member.body is not None
+                else self.render_page(member.page_number, member.source, member.page_text, member.tags).body
+                for member in document.members]
+    
+    def guess_book_title(self, pages, default="Livro Digital Extraído"):
+        """Determina o título do livro a partir da primeira página"""
+        book_title = default
+        first_page = pages[0] if pages else None
+        if first_page:
+            book_title = first_page.get('chapterTitle', book_title)
+            if 'words' in first_page:
+                words = first_page['words'][:200]
+                if 'Matemática' in words:
+                    book_title = "1.001 Problemas de Matemática Básica e Pré-Álgebra Para Leigos"
+        return book_title
+    
+    def extract_book(self, isbn, output_path, usuario=None, senha=None, start_page=1, end_page=None,
+                     pages_output=None):
         """Extrai livro completo como EPUB"""
         try:
             if not self.driver:
@@ -451,52 +956,731 @@ class MinhaBliotecaEpubExtractor:
             if not end_page:
                 end_page = 5  # Teste com 5 páginas
             
-            print(f"📖 Extraindo páginas {start_page}-{end_page} do ISBN {isbn}")
+            log.info("📖 Extraindo páginas %s-%s do ISBN %s", start_page, end_page, isbn)
             
             # Extrair dados de cada página
             for page_number in range(start_page, end_page + 1):
-                print(f"📄 === PÁGINA {page_number} ===")
+                log.info("📄 === PÁGINA %s ===", page_number)
                 
                 page_data = self.extract_vst_data_from_page(isbn, page_number)
                 self.book_data.append(page_data)
                 
                 time.sleep(2)
             
+            # Salvar registros das páginas para reconstruções offline (subcomando build)
+            if pages_output:
+                save_pages(self.book_data, pages_output)
+                log.info("💾 Páginas salvas em %s", pages_output)
+            
             # Determinar título do livro
-            book_title = "Livro Digital Extraído"
-            if self.book_data and self.book_data[0]:
-                first_page = self.book_data[0]
-                if first_page:
-                    book_title = first_page.get('chapterTitle', book_title)
-                    if 'words' in first_page:
-                        words = first_page['words'][:200]
-                        if 'Matemática' in words:
-                            book_title = "1.001 Problemas de Matemática Básica e Pré-Álgebra Para Leigos"
+            book_title = self.guess_book_title(self.book_data)
             
             # Criar EPUB
-            success = self.create_epub_from_data(isbn, output_path, book_title)
+            success = self.create_epub_from_data(isbn, output_path, book_title, start_page=start_page)
             
             if success:
-                print("🎉 Extração concluída com sucesso!")
+                log.info("🎉 Extração concluída com sucesso!")
             else:
-                print("⚠️ Extração falhou")
+                log.warning("⚠️ Extração falhou")
             
         except Exception as e:
-            print(f"💥 Erro fatal: {e}")
-            traceback.print_exc()
+            log.exception("💥 Erro fatal: %s", e)
             raise
         finally:
             self.close()
     
     def close(self):
-        """Finaliza driver"""
+        """Finaliza driver e libera o arquivo temporário das páginas"""
         if self.driver:
             self.driver.quit()
-            print("🔒 Driver finalizado")
+            log.info("🔒 Driver finalizado")
+        self.book_data.close()
+
+
+# Extrator usado pelos processos do pool de formatação (um por processo)
+_worker_extractor = None
+
+
+def _init_render_worker(options, log_level=logging.WARNING):
+    """Cria o extrator do processo com as mesmas opções do processo principal"""
+    global _worker_extractor
+    configure_logging(log_level)
+    _worker_extractor = MinhaBliotecaEpubExtractor(**options)
+
+
+def _render_chunk(chunk):
+    """Renderiza um bloco de (número, página[, PageText, tags]) dentro de um processo do pool"""
+    return [_worker_extractor.render_page(*item) for item in chunk]
 
 
-def main():
-    parser = argparse.ArgumentParser(description="Minha Biblioteca EPUB Extractor - HTML CORRIGIDO")
+def _blank_page(words, glyphs_data=None, continuation=None):
+    """Página sem texto que valha formatar (nem glifos, nem trecho emendado da seguinte)"""
+    return (not words or len(words.strip()) < 5) and not glyphs_data and not continuation
+
+
+def _detect_running_lines(path, pages=None, headings=None):
+    """Primeira passada do --strip-running-lines pelo arquivo de páginas (ou por `pages`)
+    
+    headings é o HeadingClassifier do extractor: linhas de título só são
+    removidas quando o texto exato se repete (ver fucts/runningheads.py).
+    """
+    from fucts.runningheads import detect_running_lines
+    
+    running_lines = detect_running_lines(iter_pages(path) if pages is None else pages, headings=headings)
+    log.info("🧹 Cabeçalhos/rodapés correntes detectados: %d (em %d páginas)", len(running_lines),
+             running_lines.pages)
+    return running_lines
+
+
+def _document_input_hash(file_name, title, members):
+    """Hash da entrada do documento, se todas as páginas têm chave de renderização (build incremental)"""
+    if any(member.render_key is None for member in members):
+        return None
+    return document_hash(file_name, title, [member.render_key for member in members])
+
+
+def _with_keys(rendered, h, text_fingerprint):
+    """RenderedPage com o hash da entrada e a chave de renderização (entrada, etapa 'text' e tags)"""
+    tags = ' '.join(rendered.tags) if rendered.tags is not None else None
+    return rendered._replace(page_hash=h, render_key=content_hash(f'{h}:{text_fingerprint}:{tags}'))
+
+
+def _record_manifest(manifest, document, output_hash, previous=None):
+    """Registra o documento e as suas páginas no manifesto de build
+    
+    O PageText de uma página com a mesma entrada e a mesma etapa 'text' é a
+    linha do manifesto anterior, copiada sem passar pelo JSON de novo.
+    """
+    manifest.add_document(document.file_name, document.input_hash, output_hash)
+    for member in document.members:
+        text = previous.text_line(member.anchor, member.page_hash) if previous is not None else None
+        if text is None:
+            text = member.page_text
+        manifest.add_page(member.anchor, member.page_hash, text, title=member.title, toc_title=member.toc_title,
+                          chapter=member.chapter, label=member.label, paragraphs=member.paragraphs,
+                          tags=member.tags)
+
+
+def _record_pages(rendered_pages, profile):
+    """Repassa as páginas renderizadas registrando suas métricas no BuildProfile"""
+    for rendered in rendered_pages:
+        profile.add_page(rendered.page_number, rendered.label, rendered.paragraphs, rendered.timings)
+        _record_stripped(profile, rendered.stripped)
+        yield rendered
+
+
+def _record_stripped(profile, stripped):
+    """Soma no BuildProfile os bytes de linhas correntes removidos de uma página"""
+    if stripped:
+        stats = profile.extra.setdefault('running_lines', {'pages': 0, 'removed_bytes': 0})
+        stats['pages'] += 1
+        stats['removed_bytes'] += stripped
+
+
+def configure_logging(level=logging.WARNING):
+    """Configura o log do programa (silencioso por padrão: só avisos e erros)"""
+    logging.basicConfig(format="%(message)s")
+    log.setLevel(level)
+
+
+def _verbosity_level(args):
+    """Converte -v/-q da linha de comando em nível de log"""
+    if args.quiet:
+        return logging.ERROR
+    return {0: logging.WARNING, 1: logging.INFO}.get(args.verbose, logging.DEBUG)
+
+
+def _add_logging_arguments(parser):
+    parser.add_argument("-v", "--verbose", action="count", default=0,
+                        help="Mostra o progresso (-v) ou detalhes por página e parágrafo (-vv)")
+    parser.add_argument("-q", "--quiet", action="store_true", help="Mostra apenas erros")
+
+
+def _compress_level_argument(value):
+    try:
+        return compression_level(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def iter_pages(path):
+    """Itera registros de página (words, chapterTitle, page) de um arquivo JSON ou JSONL
+    
+    JSONL é lido linha a linha, sem carregar o arquivo inteiro; JSON pode ser
+    uma lista de páginas ou {"pages": [...]}.
+    """
+    path = Path(path)
+    with open(path, encoding='utf-8') as f:
+        if path.suffix.lower() == '.jsonl':
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+            return
+        data = json.load(f)
+    
+    if isinstance(data, dict):
+        data = data.get('pages', [])
+    if not isinstance(data, list):
+        raise ValueError(f"Formato de páginas inválido em {path}")
+    yield from data
+
+
+def load_pages(path):
+    """Carrega todos os registros de página de um arquivo JSON ou JSONL"""
+    return list(iter_pages(path))
+
+
+def save_pages(pages, path):
+    """Salva registros de página em JSONL (uma página por linha, null para falhas)
+    
+    O índice de offsets (PÁGINAS.jsonl.idx, ver fucts/pagefile.py) é gravado
+    na mesma passada, para o build poder ler só um trecho do arquivo.
+    """
+    from fucts.pagefile import IndexBuilder
+    
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    index = IndexBuilder()
+    offset = 0
+    with open(path, 'wb') as f:
+        for page_data in pages:
+            line = (json.dumps(page_data, ensure_ascii=False) + '\n').encode('utf-8')
+            index.add(offset, line)
+            f.write(line)
+            offset += len(line)
+    index.write(path, offset)
+
+
+def _peek_book_title(extractor, pages, title=None):
+    """(título, páginas): espia a primeira página para deduzir o título sem materializar o livro
+    
+    ValueError se não há nenhuma página.
+    """
+    pages = iter(pages)
+    for first_page in pages:
+        break
+    else:
+        raise ValueError("nenhuma página no arquivo")
+    return title or extractor.guess_book_title([first_page]), itertools.chain([first_page], pages)
+
+
+def _parse_page_range(value):
+    """Argumento --pages: INÍCIO-FIM, INÍCIO- ou uma página só (numeração de 1)"""
+    start, sep, end = value.partition('-')
+    try:
+        start = int(start) if start.strip() else 1
+        end = (int(end) if end.strip() else None) if sep else start
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"intervalo de páginas inválido: {value!r} (use INÍCIO-FIM)")
+    if start < 1 or (end is not None and end < start):
+        raise argparse.ArgumentTypeError(f"intervalo de páginas inválido: {value!r}")
+    return start, end
+
+
+def main_build(argv):
+    """Subcomando build: cria o EPUB a partir de páginas salvas, sem navegador"""
+    parser = argparse.ArgumentParser(
+        prog="vitalepub.py build",
+        description="Cria o EPUB a partir de registros de página salvos (JSON/JSONL), sem Selenium"
+    )
+    parser.add_argument("--input", required=True, help="Arquivo JSON/JSONL com as páginas")
+    parser.add_argument("--output", required=True, help="Caminho do EPUB de saída")
+    parser.add_argument("--isbn", default="offline", help="ISBN do livro")
+    parser.add_argument("--title", help="Título do livro (padrão: deduzido da primeira página)")
+    selection = parser.add_mutually_exclusive_group()
+    selection.add_argument("--pages", type=_parse_page_range, metavar="INÍCIO-FIM",
+                           help="Monta só as páginas INÍCIO-FIM (de 1, inclusivo) de um JSONL; só essas linhas "
+                                "são lidas, pelo índice PÁGINAS.jsonl.idx (criado se faltar)")
+    selection.add_argument("--chapter", metavar="NOME",
+                           help="Monta só as páginas do capítulo com esse chapterTitle (JSONL)")
+    parser.add_argument("--validate", action="store_true",
+                        help="Confere cada página com lxml antes de gravar (mais lento)")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="Processos para formatar as páginas em paralelo (padrão: 1)")
+    parser.add_argument("--group-chapters", action="store_true",
+                        help="Um documento XHTML por capítulo (páginas viram âncoras) e sumário aninhado")
+    parser.add_argument("--heading-rules", metavar="ARQUIVO",
+                        help="JSON com as regras de detecção de títulos (keywords, uppercase_max_length)")
+    parser.add_argument("--normalization-rules", metavar="ARQUIVO",
+                        help="JSON com as regras de limpeza do texto (remove, replace, dehyphenate)")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS,
+                        help="Formato da saída (padrão: pela extensão de --output, ou epub); txt, md e jsonl "
+                             "gravam só o texto, sem montar o EPUB")
+    parser.add_argument("--strip-running-lines", action="store_true",
+                        help="Remove cabeçalhos e rodapés correntes (linhas repetidas no início ou no fim das "
+                             "páginas); faz uma passada a mais pelo arquivo de páginas")
+    parser.add_argument("--reflow", action="store_true",
+                        help="Junta o parágrafo cortado na virada de página ao início da página seguinte "
+                             "(deixa uma âncora onde a página impressa começa)")
+    parser.add_argument("--previous", metavar="EPUB",
+                        help="EPUB de um build anterior (com EPUB.build.json ao lado): só as páginas "
+                             "alteradas são formatadas e os documentos iguais são copiados já comprimidos")
+    parser.add_argument("--manifest", action="store_true",
+                        help="Grava SAÍDA.build.json com os hashes das páginas, para builds incrementais "
+                             "(automático com --previous)")
+    parser.add_argument("--compress-level", type=_compress_level_argument, default=None, metavar="NÍVEL",
+                        help="Compressão do ZIP: 0-9 ou " + "/".join(COMPRESSION_LEVELS) +
+                             " (fast para rascunhos, max para arquivamento; padrão: default)")
+    parser.add_argument("--compress-threads", type=int, default=1, metavar="N",
+                        help="Threads para comprimir as entradas do ZIP em paralelo (padrão: 1)")
+    parser.add_argument("--index", metavar="ARQUIVO",
+                        help="Índice de busca SQLite (FTS5) onde o texto do livro é gravado; "
+                             "pode ser compartilhado por vários livros (ver o subcomando search)")
+    parser.add_argument("--profile", metavar="ARQUIVO",
+                        help="Grava relatório JSON com tempo por etapa, contagens e páginas mais lentas")
+    parser.add_argument("--cprofile", metavar="ARQUIVO",
+                        help="Roda o build sob cProfile e grava as estatísticas (pstats)")
+    _add_logging_arguments(parser)
+    
+    args = parser.parse_args(argv)
+    if Path(args.output).resolve() == Path(args.input).resolve():
+        parser.error("--output não pode ser o próprio arquivo de páginas (--input)")
+    configure_logging(_verbosity_level(args))
+    
+    heading_rules = load_heading_rules(args.heading_rules) if args.heading_rules else None
+    normalization_rules = load_normalization_rules(args.normalization_rules) if args.normalization_rules else None
+    extractor = MinhaBliotecaEpubExtractor(validate=args.validate, heading_rules=heading_rules,
+                                           normalization_rules=normalization_rules)
+    
+    page_file = None
+    start_page = 1
+    try:
+        if args.pages or args.chapter:
+            from fucts.pagefile import PageFile
+            try:
+                page_file = PageFile(args.input)
+                if args.chapter:
+                    start_page, end_page = page_file.chapter_range(args.chapter)
+                else:
+                    start_page, end_page = page_file.page_range(*args.pages)
+            except KeyError:
+                parser.error(f"capítulo não encontrado em {args.input}: {args.chapter!r}")
+            except (ValueError, IndexError) as e:
+                parser.error(str(e))
+            log.info("📑 Páginas %d-%d de %d", start_page, end_page, len(page_file))
+            running_lines = (_detect_running_lines(args.input, page_file.pages(start_page, end_page),
+                                                   extractor.heading_classifier)
+                             if args.strip_running_lines else None)
+            pages = page_file.pages(start_page, end_page)
+            # O título vem da primeira página do livro, não do trecho
+            book_title = args.title or extractor.guess_book_title(page_file[:1])
+        else:
+            running_lines = (_detect_running_lines(args.input, headings=extractor.heading_classifier)
+                             if args.strip_running_lines else None)
+            try:
+                book_title, pages = _peek_book_title(extractor, iter_pages(args.input), args.title)
+            except ValueError as e:
+                log.error("❌ %s: %s", args.input, e)
+                sys.exit(1)
+        
+        profile = BuildProfile()
+        profiler = None
+        if args.cprofile:
+            import cProfile
+            profiler = cProfile.Profile()
+            profiler.enable()
+        
+        search_index = None
+        if args.index:
+            from fucts.search import SearchIndex
+            search_index = SearchIndex(args.index)
+        try:
+            success = extractor.create_epub_from_data(
+                args.isbn, args.output, book_title, pages=pages, jobs=args.jobs, profile=profile,
+                group_chapters=args.group_chapters, previous=args.previous,
+                manifest_path=manifest_path_for(args.output) if args.manifest else None,
+                compresslevel=args.compress_level, compress_threads=args.compress_threads,
+                search_index=search_index, running_lines=running_lines, reflow=args.reflow,
+                output_format=args.format or format_for_path(args.output), start_page=start_page
+            )
+        finally:
+            if search_index is not None:
+                search_index.close()
+    finally:
+        # Também quando parser.error ou sys.exit saem no meio
+        if page_file is not None:
+            page_file.close()
+    
+    if profiler:
+        profiler.disable()
+        profiler.dump_stats(args.cprofile)
+        profile.extra['cprofile'] = args.cprofile
+    if args.profile:
+        profile.write(args.profile)
+        log.info("⏱️ Relatório de desempenho salvo em %s", args.profile)
+    
+    if not success:
+        sys.exit(1)
+
+
+# Relatório do batch (padrão: na pasta de saída); nunca é lido como dump
+BATCH_REPORT_NAME = 'batch-report.json'
+
+
+def _looks_like_dump(path):
+    """Confere o primeiro caractere: lista ou objeto em JSON, registro ou null em JSONL"""
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(1024).lstrip(b'\xef\xbb\xbf \t\r\n')
+    except OSError:
+        return False
+    first = head[:1]
+    if Path(path).suffix.lower() == '.jsonl':
+        return first in (b'{', b'n')
+    return first in (b'[', b'{')
+
+
+def _dump_isbn(path):
+    """ISBN deduzido do nome do dump (9788535...jsonl -> 9788535...)"""
+    return Path(path).stem
+
+
+def load_batch_tasks(source, output_dir=None, output_format='epub', exclude=()):
+    """Lista de livros do batch: um diretório de dumps ou um manifesto JSON/JSONL
+
+    O manifesto é uma lista (ou {"books": [...]}) de caminhos ou de objetos com
+    input e, opcionalmente, output, isbn e title; caminhos relativos partem da
+    pasta do manifesto. Sem output o EPUB (ou a saída em output_format) vai para
+    output_dir (ou para a pasta do dump) com o mesmo nome do dump.
+    
+    Na pasta ficam de fora as saídas geradas, o relatório do batch, os
+    arquivos em `exclude` e o que não parece um dump (ver _looks_like_dump).
+    """
+    source = Path(source)
+    if source.is_dir():
+        generated = ('.build.json', *OUTPUT_SUFFIXES.values())
+        excluded = {Path(path).resolve() for path in exclude}
+        entries = []
+        for path in sorted(source.iterdir()):
+            if (path.suffix.lower() not in ('.json', '.jsonl') or path.name.endswith(generated)
+                    or path.name == BATCH_REPORT_NAME or path.resolve() in excluded):
+                continue
+            if not _looks_like_dump(path):
+                log.info("⏭️ Ignorando %s: não parece um dump de páginas", path.name)
+                continue
+            entries.append({'input': path.name})
+        base = source
+    else:
+        with open(source, encoding='utf-8') as f:
+            if source.suffix.lower() == '.jsonl':
+                entries = [json.loads(line) for line in f if line.strip()]
+            else:
+                entries = json.load(f)
+        if isinstance(entries, dict):
+            entries = entries.get('books', [])
+        base = source.parent
+
+    tasks = []
+    for entry in entries:
+        if isinstance(entry, str):
+            entry = {'input': entry}
+        input_path = base / entry['input']
+        if entry.get('output'):
+            output_path = base / entry['output']
+        else:
+            suffix = OUTPUT_SUFFIXES[output_format]
+            output_path = Path(output_dir or input_path.parent) / f'{input_path.stem}{suffix}'
+        tasks.append({
+            'input': str(input_path),
+            'output': str(output_path),
+            'isbn': str(entry.get('isbn') or _dump_isbn(input_path)),
+            'title': entry.get('title'),
+        })
+    return tasks
+
+
+def _init_batch_worker(log_level=logging.WARNING, memory_limit=None):
+    """Configura o processo do batch; memory_limit (bytes) limita o espaço de endereços"""
+    configure_logging(log_level)
+    if memory_limit:
+        try:
+            import resource
+        except ImportError:  # pragma: no cover - Windows
+            return
+        _, hard = resource.getrlimit(resource.RLIMIT_AS)
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, hard))
+
+
+def _build_book(task, options):
+    """Converte um livro do batch; qualquer erro vira status 'failed' só deste livro"""
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    result = {**task, 'status': 'failed', 'error': None, 'pages': 0, 'output_size': 0}
+    search_index = None
+    try:
+        extractor = MinhaBliotecaEpubExtractor(validate=options['validate'], heading_rules=options['heading_rules'],
+                                               normalization_rules=options['normalization_rules'])
+        running_lines = (_detect_running_lines(task['input'], headings=extractor.heading_classifier)
+                         if options['strip_running_lines'] else None)
+        book_title, pages = _peek_book_title(extractor, iter_pages(task['input']), task['title'])
+
+        if task.get('index'):
+            from fucts.search import SearchIndex
+            search_index = SearchIndex(task['index'])
+        profile = BuildProfile()
+        success = extractor.create_epub_from_data(
+            task['isbn'], task['output'], book_title, pages=pages, profile=profile,
+            group_chapters=options['group_chapters'], compresslevel=options['compresslevel'],
+            search_index=search_index, running_lines=running_lines, reflow=options['reflow'],
+            output_format=options['output_format']
+        )
+        result.update(title=book_title, pages=profile.pages, output_size=profile.output_size or 0)
+        if success:
+            result['status'] = 'ok'
+        else:
+            result['error'] = "create_epub_from_data falhou (ver o log)"
+    except Exception as e:
+        result['error'] = f'{type(e).__name__}: {e}'
+    finally:
+        if search_index is not None:
+            search_index.close()
+    result['wall_s'] = round(time.perf_counter() - start, 3)
+    result['cpu_s'] = round(time.process_time() - cpu_start, 3)
+    return result
+
+
+def _build_book_isolated(task, options, log_level, memory_limit):
+    """Converte um livro sozinho num pool de um processo (BrokenProcessPool se o processo morrer)"""
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=1, initializer=_init_batch_worker,
+                             initargs=(log_level, memory_limit)) as pool:
+        return pool.submit(_build_book, task, options).result()
+
+
+def run_batch(tasks, jobs=None, memory_limit=None, options=None, index_path=None, progress=None):
+    """Converte os livros num único pool de processos e devolve o relatório
+
+    Os livros maiores são enviados primeiro, para os processos terminarem
+    juntos. memory_limit é o teto total (bytes), dividido entre os processos.
+    Se um processo morrer (por exemplo, sem memória), o pool inteiro quebra e
+    todos os livros pendentes voltam sem resultado; cada um deles é refeito
+    sozinho num processo novo (até `jobs` ao mesmo tempo), e só o livro cujo
+    processo morre de novo conta como falha.
+    Com index_path cada livro é indexado num arquivo próprio e o processo
+    principal junta tudo no índice de busca.
+    """
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+    from concurrent.futures.process import BrokenProcessPool
+
+    jobs = jobs or os.cpu_count() or 1
+    options = {'validate': False, 'heading_rules': None, 'normalization_rules': None, 'group_chapters': False,
+               'compresslevel': None, 'strip_running_lines': False, 'reflow': False, 'output_format': 'epub',
+               **(options or {})}
+    worker_limit = memory_limit // jobs if memory_limit else None
+    start = time.perf_counter()
+
+    index_dir = tempfile.TemporaryDirectory(prefix='vitalepub-index-') if index_path else None
+    queue = sorted(tasks, key=lambda task: os.path.getsize(task['input']) if os.path.exists(task['input']) else 0,
+                   reverse=True)
+    for number, task in enumerate(queue):
+        Path(task['output']).parent.mkdir(parents=True, exist_ok=True)
+        if index_dir is not None:
+            task['index'] = os.path.join(index_dir.name, f'book-{number}.sqlite')
+
+    results = []
+
+    def finish(result):
+        results.append(result)
+        if progress:
+            progress(result, len(results), len(tasks))
+
+    try:
+        suspects = []
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_batch_worker,
+                                 initargs=(log.getEffectiveLevel(), worker_limit)) as pool:
+            futures = {pool.submit(_build_book, task, options): task for task in queue}
+            for future in as_completed(futures):
+                try:
+                    finish(future.result())
+                except BrokenProcessPool:
+                    suspects.append(futures[future])
+
+        if suspects:
+            log.warning("⚠️ Um processo do batch terminou de forma anormal; refazendo %d livros, "
+                        "um por processo", len(suspects))
+            with ThreadPoolExecutor(max_workers=jobs) as threads:
+                futures = {threads.submit(_build_book_isolated, task, options, log.getEffectiveLevel(),
+                                          worker_limit): task
+                           for task in suspects}
+                for future in as_completed(futures):
+                    try:
+                        result = future.result()
+                    except BrokenProcessPool:
+                        result = {**futures[future], 'status': 'failed',
+                                  'error': 'processo do batch terminou de forma anormal',
+                                  'pages': 0, 'output_size': 0, 'wall_s': None, 'cpu_s': None}
+                    finish(result)
+
+        if index_path:
+            from fucts.search import SearchIndex
+            with SearchIndex(index_path) as search_index:
+                for result in results:
+                    if result['status'] == 'ok' and os.path.exists(result['index']):
+                        search_index.merge(result['index'])
+    finally:
+        if index_dir is not None:
+            index_dir.cleanup()
+
+    wall = time.perf_counter() - start
+    cpu = sum(result['cpu_s'] or 0 for result in results)
+    for result in results:
+        result.pop('index', None)
+    order = {task['input']: position for position, task in enumerate(tasks)}
+    results.sort(key=lambda result: order.get(result['input'], 0))
+    return {
+        'books': len(results),
+        'ok': sum(result['status'] == 'ok' for result in results),
+        'failed': sum(result['status'] != 'ok' for result in results),
+        'jobs': jobs,
+        'memory_limit': memory_limit,
+        'wall_s': round(wall, 3),
+        'cpu_s': round(cpu, 3),
+        # Fração do tempo dos núcleos usada pelos builds (1.0 = todos ocupados o tempo todo)
+        'core_utilization': round(cpu / (wall * jobs), 3) if wall else None,
+        'pages': sum(result['pages'] for result in results),
+        'output_size': sum(result['output_size'] for result in results),
+        'results': results,
+    }
+
+
+def main_batch(argv):
+    """Subcomando batch: converte vários dumps de páginas num único pool de processos"""
+    parser = argparse.ArgumentParser(
+        prog="vitalepub.py batch",
+        description="Cria os EPUBs de vários dumps de páginas (JSON/JSONL) de uma vez"
+    )
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--input-dir", help="Pasta com os dumps (*.json, *.jsonl); o ISBN é o nome do arquivo")
+    source.add_argument("--manifest", help="JSON/JSONL com a lista de livros (input, output, isbn, title)")
+    parser.add_argument("--output-dir", help="Pasta dos EPUBs (padrão: a pasta de cada dump)")
+    parser.add_argument("--jobs", type=int, help="Livros convertidos ao mesmo tempo (padrão: núcleos da máquina)")
+    parser.add_argument("--max-memory", type=float, metavar="MB",
+                        help="Teto de memória somando todos os processos (dividido igualmente entre eles)")
+    parser.add_argument("--skip-existing", action="store_true",
+                        help="Pula livros cujo EPUB já existe e é mais novo que o dump")
+    parser.add_argument("--validate", action="store_true", help="Confere cada página com lxml")
+    parser.add_argument("--group-chapters", action="store_true", help="Um documento XHTML por capítulo")
+    parser.add_argument("--heading-rules", metavar="ARQUIVO", help="JSON com as regras de detecção de títulos")
+    parser.add_argument("--normalization-rules", metavar="ARQUIVO", help="JSON com as regras de limpeza do texto")
+    parser.add_argument("--strip-running-lines", action="store_true", help="Remove cabeçalhos e rodapés correntes")
+    parser.add_argument("--reflow", action="store_true", help="Junta parágrafos cortados na virada de página")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default='epub',
+                        help="Formato das saídas (padrão: epub)")
+    parser.add_argument("--compress-level", type=_compress_level_argument, default=None, metavar="NÍVEL",
+                        help="Compressão do ZIP: 0-9 ou " + "/".join(COMPRESSION_LEVELS))
+    parser.add_argument("--index", metavar="ARQUIVO", help="Índice de busca SQLite onde todos os livros entram")
+    parser.add_argument("--report", metavar="ARQUIVO",
+                        help=f"Relatório JSON com tempo e tamanho por livro (padrão: {BATCH_REPORT_NAME} "
+                             "na pasta de saída)")
+    _add_logging_arguments(parser)
+
+    args = parser.parse_args(argv)
+    configure_logging(_verbosity_level(args))
+
+    report_path = args.report or Path(args.output_dir or '.') / BATCH_REPORT_NAME
+    tasks = load_batch_tasks(args.input_dir or args.manifest, args.output_dir, output_format=args.format,
+                             exclude=[report_path])
+    if args.skip_existing:
+        tasks = [task for task in tasks
+                 if not (os.path.exists(task['output'])
+                         and os.path.getmtime(task['output']) >= os.path.getmtime(task['input']))]
+    if not tasks:
+        log.warning("⚠️ Nenhum livro para converter")
+        return
+
+    options = {
+        'validate': args.validate,
+        'heading_rules': load_heading_rules(args.heading_rules) if args.heading_rules else None,
+        'normalization_rules': (load_normalization_rules(args.normalization_rules)
+                                if args.normalization_rules else None),
+        'group_chapters': args.group_chapters,
+        'compresslevel': args.compress_level,
+        'strip_running_lines': args.strip_running_lines,
+        'reflow': args.reflow,
+        'output_format': args.format,
+    }
+    memory_limit = int(args.max_memory * 1024 * 1024) if args.max_memory else None
+
+    def progress(result, done, total):
+        if result['status'] == 'ok':
+            log.info("✅ [%d/%d] %s: %d páginas, %.2f MB em %.1f s", done, total, result['isbn'],
+                     result['pages'], result['output_size'] / 1024 / 1024, result['wall_s'])
+        else:
+            log.error("❌ [%d/%d] %s: %s", done, total, result['isbn'], result['error'])
+
+    log.info("📚 Convertendo %d livros", len(tasks))
+    report = run_batch(tasks, args.jobs, memory_limit, options, args.index, progress)
+
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    log.warning("📊 %d livros: %d ok, %d com falha em %.1f s (uso dos núcleos: %.0f%%); relatório em %s",
+                report['books'], report['ok'], report['failed'], report['wall_s'],
+                (report['core_utilization'] or 0) * 100, report_path)
+
+    if report['failed']:
+        sys.exit(1)
+
+
+def main_search(argv):
+    """Subcomando search: procura um termo no índice de busca, sem abrir os EPUBs"""
+    parser = argparse.ArgumentParser(
+        prog="vitalepub.py search",
+        description="Procura termos nos livros indexados com 'build --index' (sintaxe FTS5: "
+                    "\"frase exata\", termo*, A OR B, NEAR(a b))"
+    )
+    parser.add_argument("query", nargs="*", help="Termos a procurar")
+    parser.add_argument("--index", required=True, help="Índice de busca SQLite")
+    parser.add_argument("--isbn", help="Restringe a busca a um livro")
+    parser.add_argument("--limit", type=int, default=20, help="Máximo de resultados (padrão: 20)")
+    parser.add_argument("--books", action="store_true", help="Lista os livros indexados")
+    _add_logging_arguments(parser)
+    
+    args = parser.parse_args(argv)
+    configure_logging(_verbosity_level(args))
+    if not args.books and not args.query:
+        parser.error("informe os termos da busca ou --books")
+    if not Path(args.index).exists():
+        parser.error(f"índice não encontrado: {args.index}")
+    
+    from fucts.search import SearchIndex
+    with SearchIndex(args.index) as index:
+        if args.books:
+            for isbn, title, page_count, indexed_at in index.books():
+                print(f"{isbn}\t{page_count} páginas\t{indexed_at}\t{title}")
+            return
+        
+        start = time.perf_counter()
+        hits = index.search(' '.join(args.query), limit=args.limit, isbn=args.isbn)
+        log.info("🔎 %d resultado(s) em %.1f ms", len(hits), (time.perf_counter() - start) * 1000)
+    
+    for hit in hits:
+        chapter = f" - {hit.chapter}" if hit.chapter else ""
+        print(f"{hit.isbn}  pág. {hit.label}{chapter}  ({hit.title})")
+        print(f"    {hit.snippet.replace(chr(10), ' ')}")
+    if not hits:
+        sys.exit(1)
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    
+    if argv and argv[0] == "build":
+        return main_build(argv[1:])
+    if argv and argv[0] == "search":
+        return main_search(argv[1:])
+    if argv and argv[0] == "batch":
+        return main_batch(argv[1:])
+    if argv and argv[0] == "extract":
+        argv = argv[1:]
+    
+    parser = argparse.ArgumentParser(
+        description="Minha Biblioteca EPUB Extractor - HTML CORRIGIDO",
+        epilog="Use 'vitalepub.py build --help' para criar o EPUB a partir de páginas salvas "
+               "(ou 'vitalepub.py batch --help' para vários livros) e 'vitalepub.py search --help' "
+               "para procurar nos livros indexados."
+    )
     parser.add_argument("--isbn", required=True, help="ISBN do livro")
     parser.add_argument("--output", required=True, help="Caminho do EPUB de saída")
     parser.add_argument("--usuario", help="Usuário UENP")
@@ -504,10 +1688,16 @@ def main():
     parser.add_argument("--start-page", type=int, default=1, help="Página inicial")
     parser.add_argument("--end-page", type=int, help="Página final")
     parser.add_argument("--headless", action="store_true", default=True, help="Modo headless")
+    parser.add_argument("--save-pages", help="Salva os registros das páginas em JSONL para o subcomando build")
+    parser.add_argument("--spill-mb", type=float, metavar="MB",
+                        help="Texto das páginas mantido em memória antes de ir para um arquivo mapeado (padrão: 64)")
+    _add_logging_arguments(parser)
     
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    configure_logging(_verbosity_level(args))
     
-    extractor = MinhaBliotecaEpubExtractor(headless=args.headless)
+    spill_threshold = int(args.spill_mb * 1024 * 1024) if args.spill_mb is not None else None
+    extractor = MinhaBliotecaEpubExtractor(headless=args.headless, spill_threshold=spill_threshold)
     
     try:
         extractor.extract_book(
@@ -516,13 +1706,14 @@ def main():
             usuario=args.usuario,
             senha=args.senha,
             start_page=args.start_page,
-            end_page=args.end_page
+            end_page=args.end_page,
+            pages_output=args.save_pages
         )
         
-        print("✨ Processo finalizado!")
+        log.info("✨ Processo finalizado!")
         
     except Exception as e:
-        print(f"🚨 Erro: {e}")
+        log.error("🚨 Erro: %s", e)
         sys.exit(1)
 
 